@@ -0,0 +1,259 @@
+import copy
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import torch
+
+from parallel_eval import JobCancelled
+
+# decoupled actor/learner training (see ActorLearner)
+AGENT_ACTOR_BATCH_SIZE = int(os.getenv("AGENT_ACTOR_BATCH_SIZE", "64"))          # transitions per batch sent by an actor
+AGENT_EXPERIENCE_QUEUE_SIZE = int(os.getenv("AGENT_EXPERIENCE_QUEUE_SIZE", "64"))  # batches waiting for the learner
+AGENT_WEIGHT_SYNC_INTERVAL = int(os.getenv("AGENT_WEIGHT_SYNC_INTERVAL", "100"))  # learner updates between actor weight syncs
+
+# fields of a batch of transitions, each an array with one row per transition
+EXPERIENCE_FIELDS = ("observations", "actions", "rewards", "next_observations", "terminated", "truncated")
+
+
+def make_batch(observations, actions, rewards, next_observations, terminated, truncated=None) -> dict:
+    """Batch of transitions as numpy arrays; checks that every field has the same number of rows."""
+    batch = {
+        "observations": np.asarray(observations, dtype=np.float32),
+        "actions": np.asarray(actions, dtype=np.int64).reshape(-1),
+        "rewards": np.asarray(rewards, dtype=np.float32).reshape(-1),
+        "next_observations": np.asarray(next_observations, dtype=np.float32),
+        "terminated": np.asarray(terminated, dtype=bool).reshape(-1),
+        "truncated": np.zeros(len(rewards), dtype=bool) if truncated is None else np.asarray(truncated, dtype=bool).reshape(-1)
+    }
+    sizes = {field: len(batch[field]) for field in EXPERIENCE_FIELDS}
+    if len(set(sizes.values())) != 1:
+        raise ValueError(f"All fields of a batch need the same number of transitions, got {sizes}")
+    return batch
+
+
+class ActorLearner:
+    """
+    Trains a DQN model with the environment steps and the gradient updates decoupled.
+
+    Actor threads step their own env with an epsilon-greedy copy of the Q-network and send
+    the transitions in batches to a local queue; more batches can come from actors on other
+    machines through remote_queue (see POST /agents/{agent_id}/experience). The learner, on
+    the calling thread, moves the batches into the model's replay buffer and keeps running
+    gradient updates, at most replay_ratio updates per transition (None: no limit). The actors
+    pick up the learner's weights every sync_interval updates. Progress (steps, loss and the
+    rewards of the actors' episodes) goes to progress, if given, and the learner lets the
+    checkpointer (checkpoints.Checkpointer) checkpoint the model between updates.
+
+    Training ends once total_timesteps transitions have been received, counting those of a
+    model resumed from a checkpoint.
+    """
+    def __init__(self, model, envs: list, total_timesteps: int, remote_queue=None, replay_ratio: float = 0.25,
+                 batch_size: int = AGENT_ACTOR_BATCH_SIZE, sync_interval: int = AGENT_WEIGHT_SYNC_INTERVAL,
+                 progress=None, checkpointer=None, cancel_event=None):
+        self.model = model
+        self.envs = envs
+        self.total_timesteps = total_timesteps
+        self.remote_queue = remote_queue
+        self.replay_ratio = replay_ratio
+        self.batch_size = batch_size
+        self.sync_interval = sync_interval
+        self.progress = progress  # job_events.ProgressReporter
+        self.checkpointer = checkpointer
+        self.cancel_event = cancel_event
+        self.local_queue = queue.Queue(maxsize=AGENT_EXPERIENCE_QUEUE_SIZE)
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.weights = None
+        self.weights_version = 0
+        self.updates = 0
+        self.start_timesteps = 0  # timesteps of the model when run() started, > 0 when resumed
+        self.local_transitions = 0
+        self.remote_transitions = 0
+        self.rejected_batches = 0
+        self.episodes = 0
+
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def _publish_weights(self):
+        weights = {name: tensor.detach().clone() for name, tensor in self.model.q_net.state_dict().items()}
+        with self.lock:
+            self.weights = weights
+            self.weights_version += 1
+
+    def _actor(self, env, q_net):
+        version = 0
+        rng = np.random.default_rng()
+        batch = []
+        episode_reward = 0.0
+        obs, _ = env.reset()
+        while not self.stop.is_set():
+            if version != self.weights_version:
+                with self.lock:
+                    q_net.load_state_dict(self.weights)
+                    version = self.weights_version
+
+            if rng.random() < self.model.exploration_rate:
+                action = int(env.action_space.sample())
+            else:
+                with torch.no_grad():
+                    action = int(q_net._predict(torch.as_tensor(obs[None], device=self.model.device), deterministic=True)[0])
+            next_obs, reward, terminated, truncated, _ = env.step(action)
+            batch.append((obs, action, reward, next_obs, terminated, truncated))
+            episode_reward += reward
+            if terminated or truncated:
+                if self.progress is not None:
+                    self.progress.episode(episode_reward)
+                episode_reward = 0.0
+                obs, _ = env.reset()
+            else:
+                obs = next_obs
+
+            if len(batch) >= self.batch_size:
+                self._send(make_batch(*zip(*batch)))
+                batch = []
+
+    def _send(self, batch: dict):
+        # blocks while the learner is behind, so the actors never run far ahead of it
+        while not self.stop.is_set():
+            try:
+                self.local_queue.put(batch, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _run_actor(self, env, q_net, errors: list):
+        try:
+            self._actor(env, q_net)
+        except Exception as e:
+            errors.append(e)
+            self.stop.set()
+
+    def _add(self, batch: dict) -> int:
+        """Store a batch in the replay buffer and advance the model's step counters (exploration, target updates)."""
+        model = self.model
+        n = min(len(batch["rewards"]), self.total_timesteps - model.num_timesteps)
+        for i in range(n):
+            terminated, truncated = batch["terminated"][i], batch["truncated"][i]
+            # truncated transitions are stored as timeouts, their next state is not treated as terminal
+            model.replay_buffer.add(batch["observations"][i:i + 1], batch["next_observations"][i:i + 1],
+                                    batch["actions"][i:i + 1], batch["rewards"][i:i + 1],
+                                    np.array([terminated or truncated]), [{"TimeLimit.truncated": bool(truncated)}])
+            model.num_timesteps += 1
+            self.episodes += bool(terminated or truncated)
+            model._update_current_progress_remaining(model.num_timesteps, self.total_timesteps)
+            model._on_step()
+        return n
+
+    def _valid(self, batch: dict) -> bool:
+        # remote batches are only checked for their shapes by the API, a bad one must not stop the training
+        shape = self.model.observation_space.shape
+        actions = batch["actions"]
+        return (batch["observations"].shape[1:] == shape and batch["next_observations"].shape[1:] == shape
+                and bool(np.all((actions >= 0) & (actions < self.model.action_space.n))))
+
+    def _ingest(self, block: bool, max_batches: int = None) -> int:
+        """
+        Move up to max_batches waiting batches (None: all of them) into the replay buffer;
+        waits briefly for a local one if block is set.
+        """
+        ingested = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            try:
+                batch = self.local_queue.get(timeout=0.05) if block and not batches else self.local_queue.get_nowait()
+            except queue.Empty:
+                break
+            n = self._add(batch)
+            self.local_transitions += n
+            ingested += n
+            batches += 1
+        if self.remote_queue is not None:
+            # remote batches go through the manager process, every get is a round trip to it
+            while max_batches is None or batches < max_batches:
+                try:
+                    batch = self.remote_queue.get_nowait()
+                except queue.Empty:
+                    break
+                batches += 1
+                if not self._valid(batch):
+                    self.rejected_batches += 1
+                    continue
+                n = self._add(batch)
+                self.remote_transitions += n
+                ingested += n
+        return ingested
+
+    def _can_update(self) -> bool:
+        model = self.model
+        # a resumed model is past learning_starts with an empty replay buffer (buffers aren't checkpointed)
+        if model.num_timesteps <= model.learning_starts or model.replay_buffer.size() < model.batch_size:
+            return False
+        return self.replay_ratio is None or self.updates < self.replay_ratio * (model.num_timesteps - self.start_timesteps)
+
+    def run(self) -> dict:
+        model = self.model
+        # a model resumed from a checkpoint keeps its step count (and exploration schedule)
+        model._setup_learn(self.total_timesteps - model.num_timesteps, reset_num_timesteps=model.num_timesteps == 0)
+        self.start_timesteps = model.num_timesteps
+        self._publish_weights()
+
+        errors = []
+        threads = []
+        for env in self.envs:
+            q_net = copy.deepcopy(model.q_net)
+            q_net.set_training_mode(False)
+            threads.append(threading.Thread(target=self._run_actor, args=(env, q_net, errors), daemon=True))
+        for thread in threads:
+            thread.start()
+
+        start = time.perf_counter()
+        last_poll = 0.0
+        try:
+            while model.num_timesteps < self.total_timesteps:
+                if self.cancelled():
+                    raise JobCancelled("Training cancelled")
+                if errors:
+                    raise errors[0]
+
+                now = time.perf_counter()
+                if self._can_update():
+                    if self.replay_ratio is None and now - last_poll > 0.01:
+                        # no ratio to keep: take in whatever arrived, without polling on every update
+                        self._ingest(block=False)
+                        last_poll = now
+                    model.train(gradient_steps=1, batch_size=model.batch_size)
+                    self.updates += 1
+                    if self.updates % self.sync_interval == 0:
+                        self._publish_weights()
+                    if self.progress is not None:
+                        self.progress.update(model.num_timesteps, model.logger.name_to_value.get("train/loss"))
+                else:
+                    # waiting for experience, to start learning or because the updates caught up with
+                    # replay_ratio; one batch at a time then, the full queue holds the actors back
+                    self._ingest(block=True, max_batches=None if self.replay_ratio is None else 1)
+                    last_poll = now
+                    if self.progress is not None:
+                        self.progress.update(model.num_timesteps)
+                if self.checkpointer is not None:
+                    self.checkpointer.maybe_save(model)
+        finally:
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+        elapsed = time.perf_counter() - start
+        return {
+            "transitions": model.num_timesteps - self.start_timesteps,
+            "local_transitions": self.local_transitions,
+            "remote_transitions": self.remote_transitions,
+            "rejected_batches": self.rejected_batches,
+            "episodes": self.episodes,
+            "updates": self.updates,
+            "elapsed": elapsed,
+            "transitions_per_second": (model.num_timesteps - self.start_timesteps) / elapsed if elapsed else 0.0,
+            "updates_per_second": self.updates / elapsed if elapsed else 0.0
+        }
@@ -1,49 +1,180 @@
 import uuid
 import datetime
+import numpy as np
 from stable_baselines3 import DQN, PPO
+from stable_baselines3.common.callbacks import BaseCallback
 from stable_baselines3.common.evaluation import evaluate_policy
 from stable_baselines3.common.monitor import Monitor
-from simulator_wrapper import LunarLanderSimulatorWrapper
+from stable_baselines3.common.vec_env import VecMonitor
+from actor_learner import ActorLearner
+from checkpoints import (AGENT_CHECKPOINT_INTERVAL_SECONDS, AGENT_CHECKPOINT_INTERVAL_STEPS, AGENT_CHECKPOINT_KEEP,
+                         CheckpointCallback, Checkpointer, check_run_path, find_checkpoint, snapshot_model, write_snapshot)
+from job_events import ProgressCallback
+from model_cache import model_cache
+from parallel_eval import JobCancelled, delete_simulators, evaluate_in_parallel, fetch_seed_set, provision_simulators
+from simulator_wrapper import LunarLanderSimulatorWrapper, is_local_url
+from vec_simulator_wrapper import LunarLanderVecSimulatorWrapper
+
+def make_wrapper(simulator_id: str, simulator_environment: str, api_url: str, action_repeat: int = 1, vectorized: bool = False,
+                 wire_format: str = "json", transport: str = "http", profiler=None):
+    """
+    Create the env for a simulator; a VecEnv when simulator_id refers to a vector simulator.
+    A profiler (profiling.JobProfiler) times the env calls of non-vector envs.
+    """
+    if simulator_environment != "LunarLander-v3":
+        raise ValueError(f"Unknown simulator environment: {simulator_environment}")
+
+    if vectorized:
+        if action_repeat != 1:
+            raise ValueError("action_repeat is not supported with vector simulators")
+        if transport != "http" or is_local_url(api_url):
+            raise ValueError("Vector simulators are only reachable over http")
+        return LunarLanderVecSimulatorWrapper(api_url=api_url, simulator_id=simulator_id, wire_format=wire_format)
+
+    return LunarLanderSimulatorWrapper(
+        api_url=api_url,
+        simulator_id=simulator_id,
+        action_repeat=action_repeat,
+        wire_format=wire_format,
+        transport=transport,
+        profiler=profiler
+    )
+
+def add_extra_wrappers(wrappers: list, provisioned: list, count: int, simulator_id: str, simulator_ids: list,
+                       simulator_environment: str, api_url: str, action_repeat: int, wire_format: str, transport: str,
+                       profiler=None):
+    """
+    Append count wrappers for the simulators in simulator_ids; missing ones are created with the config
+    of simulator_id and their ids appended to provisioned. local:// wrappers each run their own env.
+    """
+    extra_ids = list(simulator_ids or [])[:count]
+    if is_local_url(api_url):
+        extra_ids = [simulator_id] * count
+    elif len(extra_ids) < count:
+        created = provision_simulators(api_url, simulator_id, count - len(extra_ids))
+        provisioned.extend(created)
+        extra_ids += created
+    for extra_id in extra_ids:
+        wrappers.append(make_wrapper(extra_id, simulator_environment, api_url, action_repeat, False, wire_format, transport,
+                                     profiler))
+
+class StopOnEvent(BaseCallback):
+    """Stops model.learn() once the cancel event of the job is set."""
+    def __init__(self, cancel_event):
+        super().__init__()
+        self.cancel_event = cancel_event
+
+    def _on_step(self) -> bool:
+        return not self.cancel_event.is_set()
+
+def raise_on_event(cancel_event):
+    """evaluate_policy callback that aborts the evaluation once the cancel event is set."""
+    def callback(locals_, globals_):
+        if cancel_event.is_set():
+            raise JobCancelled("Prediction cancelled")
+    return callback
 
 class Agent:
     def __init__(self):
         self.id = str(uuid.uuid4())
         self.model = None
+        self.model_path = None # file of the last trained model, used when the model is not in memory
         self.status = "idle" # This state management is now perfect
         self.status_timestamp = datetime.datetime.now()
         self.result_message = None  # result message for train/predict if successful, need to be reset before each call
         self.error_message = None   # error message for train/predict if failed, need to be reset before each call
 
-    def train(self, simulator_id: str, simulator_environment: str, api_url: str, total_timesteps: int = 20000, filename: str = None):
+    def train(self, simulator_id: str, simulator_environment: str, api_url: str, total_timesteps: int = 20000, filename: str = None,
+              action_repeat: int = 1, vectorized: bool = False, wire_format: str = "json",
+              transport: str = "http", actor_learner: bool = False, actors: int = 1, simulator_ids: list = None,
+              replay_ratio: float = 0.25, checkpoint_interval_steps: int = None, checkpoint_interval_seconds: float = None,
+              keep_checkpoints: int = None, resume_from: str = None, experience_queue=None, progress=None, profiler=None,
+              cancel_event=None):
+        """
+        Train a DQN model for total_timesteps environment steps. The model is checkpointed along the
+        way (see checkpoints.py) under the run name filename; with resume_from the model and its step
+        count are loaded from a checkpoint and training continues up to total_timesteps. With actor_learner, the steps are
+        collected by `actors` threads, each on its own simulator with the config of simulator_id (those
+        in simulator_ids first, the rest is created for the run and deleted afterwards), and by any
+        remote actors sending batches through experience_queue, while the gradient updates run on
+        their own (see actor_learner.py). The progress (a job_events.ProgressReporter) gets the step
+        count, the loss and the episode rewards along the way; the profiler (a profiling.JobProfiler)
+        times the env calls.
+        """
         wrapper = None
+        extra_wrappers = []
+        provisioned = []
+        checkpointer = None
         self.error_message = None
         self.result_message = None
         try:
+            # the model is saved as, and checkpointed under, filename
+            model_name = "DQN"
+            timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+            env_name = "LunarLander-V3"
+            if filename is None:
+                # a resumed run carries on under its run name
+                filename = resume_from.split("/")[0] if resume_from else f"{timestamp}_{model_name}_{env_name}"
+            check_run_path(filename, "filename")
+
+            if actor_learner and vectorized:
+                raise ValueError("actor_learner is not supported with vector simulators")
+            if actors < 0:
+                raise ValueError(f"actors must be >= 0, got {actors}")
+
             # set up the corresponding wrapper
-            if simulator_environment == "LunarLander-v3":
-                wrapper = LunarLanderSimulatorWrapper(
-                    api_url=api_url, 
-                    simulator_id=simulator_id
-                )
-            else:
-                raise ValueError(f"Unknown simulator environment: {simulator_environment}")
+            wrapper = make_wrapper(simulator_id, simulator_environment, api_url, action_repeat, vectorized, wire_format, transport,
+                                   profiler)
             
-            # create the model
-            self.model = DQN("MlpPolicy", wrapper, verbose=1)
+            # create the model, or load it from a checkpoint
+            if resume_from:
+                checkpoint = find_checkpoint(resume_from)
+                self.model = DQN.load(checkpoint, env=wrapper, verbose=1)
+                if self.model.num_timesteps >= total_timesteps:
+                    raise ValueError(f"Checkpoint {checkpoint} already has {self.model.num_timesteps} of the "
+                                     f"{total_timesteps} timesteps")
+                # the env is reset below, the observation stored with the checkpoint is stale
+                self.model._last_obs = None
+                print(f"Agent {self.id} resumes from {checkpoint} at {self.model.num_timesteps} timesteps")
+            else:
+                self.model = DQN("MlpPolicy", wrapper, verbose=1)
             wrapper.reset() # reset the env before training
+
+            if checkpoint_interval_steps is None:
+                checkpoint_interval_steps = AGENT_CHECKPOINT_INTERVAL_STEPS
+            if checkpoint_interval_seconds is None:
+                checkpoint_interval_seconds = AGENT_CHECKPOINT_INTERVAL_SECONDS
+            if checkpoint_interval_steps > 0 or checkpoint_interval_seconds > 0:
+                checkpointer = Checkpointer(filename, checkpoint_interval_steps, checkpoint_interval_seconds,
+                                            AGENT_CHECKPOINT_KEEP if keep_checkpoints is None else keep_checkpoints)
             print(f"Agent {self.id} start training...")
-            self.model.learn(total_timesteps=total_timesteps, progress_bar=True)
+            if actor_learner:
+                add_extra_wrappers(extra_wrappers, provisioned, max(actors - 1, 0), simulator_id, simulator_ids,
+                                   simulator_environment, api_url, action_repeat, wire_format, transport, profiler)
+                envs = [wrapper] + extra_wrappers if actors > 0 else []
+                stats = ActorLearner(self.model, envs, total_timesteps, remote_queue=experience_queue,
+                                     replay_ratio=replay_ratio, progress=progress, checkpointer=checkpointer,
+                                     cancel_event=cancel_event).run()
+                print(f"Agent {self.id} actor/learner stats: {stats}")
+            else:
+                callbacks = []
+                if cancel_event is not None:
+                    callbacks.append(StopOnEvent(cancel_event))
+                if progress is not None:
+                    callbacks.append(ProgressCallback(progress))
+                if checkpointer is not None:
+                    callbacks.append(CheckpointCallback(checkpointer))
+                # a resumed model keeps its step count, learn() runs the remaining steps
+                self.model.learn(total_timesteps=total_timesteps - self.model.num_timesteps, progress_bar=True,
+                                 callback=callbacks, reset_num_timesteps=self.model.num_timesteps == 0)
+            if cancel_event is not None and cancel_event.is_set():
+                raise JobCancelled("Training cancelled")
             print(f"Agent {self.id} finished training.")
             
-            # save model
-            model_name = "DQN"
-            timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-            env_name = "LunarLander-V3"
-            if filename is None:
-                filename = f"{timestamp}_{model_name}_{env_name}"
-
+            # save model, atomically so a crash mid-write never leaves a truncated file behind
             file_path = f"trained_models/{filename}.zip"
-            self.model.save(file_path) # Save the model
+            write_snapshot(snapshot_model(self.model), file_path)
+            self.model_path = file_path
             print(f"Agent {self.id} model saved.")
             self.result_message = f"Model saved as {filename}"
 
@@ -52,43 +183,84 @@ class Agent:
             self.error_message = str(e)
         finally:
             # clean up
+            if checkpointer is not None:
+                checkpointer.close()
+                print(f"Agent {self.id} checkpoints: {checkpointer.stats()}")
             if wrapper:
                 wrapper.close()
+            for extra_wrapper in extra_wrappers:
+                extra_wrapper.close()
+            if provisioned:
+                delete_simulators(api_url, provisioned)
             self.update_status("idle")
 
-    def predict(self, simulator_id: str, simulator_environment: str, api_url: str, eval_episodes: int = 10, save_filename: str = None):
+    def predict(self, simulator_id: str, simulator_environment: str, api_url: str, eval_episodes: int = 10, save_filename: str = None,
+                action_repeat: int = 1, vectorized: bool = False, wire_format: str = "json",
+                transport: str = "http", parallelism: int = 1, simulator_ids: list = None, seed: int = None,
+                seed_set: str = None, profiler=None, cancel_event=None):
+        """
+        Evaluate the model for eval_episodes episodes. With parallelism > 1 the episodes are spread
+        over that many simulators with the config of simulator_id: the ones in simulator_ids first,
+        the rest is created for this evaluation and deleted afterwards. With a seed, episode i is
+        reset with seed + i, so results are reproducible whatever the parallelism. With a seed_set
+        (stored on the simulator server) there is one episode per seed of the set instead.
+        """
         wrapper = None # use a local variable
+        extra_wrappers = []
+        provisioned = []
         self.error_message = None
         self.result_message = None
         try:
+            if parallelism < 1:
+                raise ValueError(f"parallelism must be >= 1, got {parallelism}")
+            if vectorized and (parallelism > 1 or seed is not None or seed_set is not None):
+                raise ValueError("parallelism and seeded episodes are not supported with vector simulators")
+
             # 1. set up the corresponding wrapper
-            if simulator_environment == "LunarLander-v3":
-                wrapper = LunarLanderSimulatorWrapper(
-                    api_url=api_url, 
-                    simulator_id=simulator_id
-                )
-                wrapper = Monitor(wrapper) # for the evaluate_policy 
-            else:
-                raise ValueError(f"Unknown simulator environment: {simulator_environment}")
+            wrapper = make_wrapper(simulator_id, simulator_environment, api_url, action_repeat, vectorized, wire_format, transport,
+                                   profiler)
+            wrapper = VecMonitor(wrapper) if vectorized else Monitor(wrapper) # for the evaluate_policy 
                 
             # 2. load the model (if specified)
             model_to_use = self.model
             if save_filename:
                 print(f"Loading model from {save_filename}...")
                 load_path = f"./trained_models/{save_filename}.zip"
-                model_to_use = DQN.load(load_path, env=wrapper)
+                model_to_use = model_cache.load(load_path, env=wrapper)
+            elif model_to_use is None and self.model_path:
+                # trained in another process (see job_scheduler.py), only the file is shared
+                model_to_use = model_cache.load(self.model_path, env=wrapper)
 
             if model_to_use is None:
                 raise ValueError("Agent has no trained model. Either train or load a model.")
 
-            wrapper.reset() # reset the env before predicting
             print(f"Agent {self.id} start predicting...")
-            mean_reward, std_reward = evaluate_policy(
-                model_to_use, 
-                wrapper, 
-                n_eval_episodes=eval_episodes, 
-                deterministic=True
-            )
+            if parallelism > 1 or seed is not None or seed_set is not None:
+                if seed_set is not None:
+                    if is_local_url(api_url):
+                        raise ValueError("Seed sets are stored on the simulator server, they can't be used with local://")
+                    seeds = fetch_seed_set(api_url, seed_set)
+                elif seed is not None:
+                    seeds = [seed + i for i in range(eval_episodes)]
+                else:
+                    seeds = [None] * eval_episodes
+
+                # 3. one more wrapper per extra simulator
+                add_extra_wrappers(extra_wrappers, provisioned, parallelism - 1, simulator_id, simulator_ids,
+                                   simulator_environment, api_url, action_repeat, wire_format, transport, profiler)
+
+                episode_rewards = evaluate_in_parallel(model_to_use, [wrapper] + extra_wrappers, seeds,
+                                                       deterministic=True, cancel_event=cancel_event)
+                mean_reward, std_reward = float(np.mean(episode_rewards)), float(np.std(episode_rewards))
+            else:
+                wrapper.reset() # reset the env before predicting
+                mean_reward, std_reward = evaluate_policy(
+                    model_to_use, 
+                    wrapper, 
+                    n_eval_episodes=eval_episodes, 
+                    deterministic=True,
+                    callback=raise_on_event(cancel_event) if cancel_event is not None else None
+                )
             print(f"Agent {self.id} finished predicting.")
             print(f"Mean reward: {mean_reward} +/- {std_reward}")
             self.result_message = f"Mean reward: {mean_reward} +/- {std_reward}"
@@ -99,8 +271,18 @@ class Agent:
             # clean up
             if wrapper:
                 wrapper.close()
+            for extra_wrapper in extra_wrappers:
+                extra_wrapper.close()
+            if provisioned:
+                delete_simulators(api_url, provisioned)
             self.update_status("idle")
 
+    def __getstate__(self):
+        # agents are sent to the job worker processes without their model, it is reloaded from model_path
+        state = self.__dict__.copy()
+        state["model"] = None
+        return state
+
     def update_status(self, new_status: str):
         self.status = new_status
         self.status_timestamp = datetime.datetime.now()
\ No newline at end of file
@@ -1,16 +1,53 @@
+import asyncio
 import datetime
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import json
+import queue
+import uuid
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 import uvicorn
-from typing import Optional
-import asyncio 
+from typing import List, Optional
+from contextlib import asynccontextmanager
+from prometheus_client import Gauge
 
+from actor_learner import make_batch
 from agent import Agent 
+from checkpoints import check_run_path
+from job_scheduler import Job, JobScheduler, QueueFullError, TRAIN, PREDICT
+from model_cache import model_cache
+from inference import InferenceServer
+from metrics import RouteMetricsMiddleware, metrics_response
+from tracing import TracingMiddleware, current_trace_id
+import wire
 import os
 
 SIMULATOR_API_URL = os.getenv("SIMULATOR_API_URL")
 
-app = FastAPI()
+# limits of the job scheduler (see job_scheduler.py)
+AGENT_MAX_TRAIN_JOBS = int(os.getenv("AGENT_MAX_TRAIN_JOBS", "2"))      # training jobs running at the same time
+AGENT_MAX_PREDICT_JOBS = int(os.getenv("AGENT_MAX_PREDICT_JOBS", "2"))  # prediction jobs running at the same time
+AGENT_MAX_QUEUED_JOBS = int(os.getenv("AGENT_MAX_QUEUED_JOBS", "64"))   # jobs waiting for a slot, beyond that requests get 429
+AGENT_TORCH_THREADS = int(os.getenv("AGENT_TORCH_THREADS", "1"))        # torch threads per job process
+AGENT_EVENTS_KEEPALIVE = float(os.getenv("AGENT_EVENTS_KEEPALIVE", "15"))  # seconds between keep-alive comments of a quiet event stream
+
+# global job scheduler, runs train/predict jobs in worker processes
+scheduler = None
+
+# global online inference server, micro-batches act requests
+inference_server = InferenceServer()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global scheduler
+    scheduler = JobScheduler(AGENT_MAX_TRAIN_JOBS, AGENT_MAX_PREDICT_JOBS, AGENT_MAX_QUEUED_JOBS, AGENT_TORCH_THREADS)
+    scheduler.start()
+    yield
+    scheduler.close()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RouteMetricsMiddleware)
 
 @app.get("/")
 def read_root():
@@ -18,47 +55,18 @@ def read_root():
 
 # global variables to hold the current simulator env and state
 agents_list = {}
+Gauge("agent_agents", "Agents currently registered").set_function(lambda: len(agents_list))
 
-# This helper function wraps the blocking "train" call
-async def run_training_in_background(agent: Agent, simulator_id: str, simulator_environment: str, api_url: str, total_timesteps: int = 20000, filename: str = None):
-    """
-    Wrapper to run the blocking train() in a separate thread
-    so it doesn't block the main asyncio event loop.
-    """
-    try:
-        agent.update_status("training")
-        await asyncio.to_thread(
-            agent.train, 
-            simulator_id, 
-            simulator_environment, 
-            api_url,
-            total_timesteps,
-            filename
-        )
-    except Exception as e:
-        print(f"Training task for agent {agent.id} failed: {e}")
-        agent.update_status("idle")
-
-# This helper function wraps the blocking "predict" call
-async def run_prediction_in_background(agent: Agent, simulator_id: str, 
-                                       simulator_environment: str, 
-                                       api_url: str, 
-                                       eval_episodes: int = 10, 
-                                       save_filename: Optional[str] = None):
-    """Wrapper to run the blocking predict() in a separate thread."""
+def submit_job(agent: Agent, kind: str, priority: int, job_kwargs: dict, profile: bool = False) -> Job:
+    if agent.status != "idle":
+        raise HTTPException(status_code=400, detail="Agent is currently busy. Please wait until it is idle.")
+    # a traced request (X-Trace-Id) is profiled under its trace id, "profile" starts a new trace
+    trace_id = current_trace_id() or (str(uuid.uuid4()) if profile else None)
     try:
-        agent.update_status("predicting")
-        await asyncio.to_thread(
-            agent.predict,
-            simulator_id,
-            simulator_environment,
-            api_url,
-            eval_episodes,
-            save_filename
-        )
-    except Exception as e:
-        print(f"Prediction task for agent {agent.id} failed: {e}")
-        agent.update_status("idle")
+        job = scheduler.submit(agent, kind, job_kwargs, priority, trace_id)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return job
 
 
 @app.post("/agents")
@@ -71,11 +79,14 @@ async def create_agent():
 async def list_agents():
     return {"agents": list(agents_list.keys())}
 
+def agent_json(agent: Agent) -> dict:
+    return {"agent_id": agent.id, "status": agent.status,"elapsed_time": str(datetime.datetime.now() - agent.status_timestamp),"result_message": agent.result_message, "error_message": agent.error_message}
+
 @app.get("/agents/{agent_id}")
 async def get_agent(agent_id: str):
     agent = agents_list.get(agent_id)
     if agent:
-        return {"agent_id": agent.id, "status": agent.status,"elapsed_time": str(datetime.datetime.now() - agent.status_timestamp),"result_message": agent.result_message, "error_message": agent.error_message}
+        return agent_json(agent)
     else:
         raise HTTPException(status_code=404, detail="Agent not found")
     
@@ -88,6 +99,7 @@ async def delete_agent(agent_id: str):
             raise HTTPException(status_code=400, detail="Cannot delete an agent that is busy. Please wait until it is idle.")
         
         del agents_list[agent_id]
+        scheduler.broker.publish({"type": "deleted", "agent_id": agent_id})
         return {"message": f"Deleted agent {agent_id}"}
     else:
         raise HTTPException(status_code=404, detail="Agent not found")
@@ -99,25 +111,61 @@ class TrainRequest(BaseModel):
     api_url: Optional[str] = SIMULATOR_API_URL
     total_timesteps: Optional[int] = 20000
     filename: Optional[str] = None
+    action_repeat: Optional[int] = 1        # frame skip: repeat each action this many times on the simulator
+    vectorized: Optional[bool] = False      # simulator_id refers to a vector simulator
+    wire_format: Optional[str] = "json"     # "json" or "binary" encoding of simulator responses
+    transport: Optional[str] = "http"       # "http", "websocket" or "shm" connection to the simulator
+    actor_learner: Optional[bool] = False   # collect experience and train on it in separate threads
+    actors: Optional[int] = 1               # actor threads of an actor_learner run, each on its own simulator
+    simulator_ids: Optional[List[str]] = None # simulators of the actors, missing ones are created with the config of simulator_id
+    replay_ratio: Optional[float] = 0.25    # gradient updates per received transition, null for no limit
+    checkpoint_interval_steps: Optional[int] = None     # timesteps between checkpoints, 0 for none; null: AGENT_CHECKPOINT_INTERVAL_STEPS
+    checkpoint_interval_seconds: Optional[float] = None # seconds between checkpoints, 0 for none; null: AGENT_CHECKPOINT_INTERVAL_SECONDS
+    keep_checkpoints: Optional[int] = None  # checkpoints kept for the run; null: AGENT_CHECKPOINT_KEEP
+    resume_from: Optional[str] = None       # run name (filename) or checkpoint to continue training from
+    profile: Optional[bool] = False         # time the phases of the env calls and sample stacks, see GET /agents/{agent_id}/profile
+    priority: Optional[int] = 0             # queued jobs with a higher priority start first
 
 @app.post("/agents/{agent_id}/train")
 async def train_agent(agent_id: str, request_body: TrainRequest):
     agent = agents_list.get(agent_id)
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
+    try:
+        for field in ("filename", "resume_from"):
+            if getattr(request_body, field) is not None:
+                check_run_path(getattr(request_body, field), field)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # the agent is "queued" until a training slot is free
+    job = submit_job(agent, TRAIN, request_body.priority, request_body.model_dump(exclude={"agent_id", "priority", "profile"}),
+                     request_body.profile)
+    return {"message": f"Agent {agent_id} training started.", "job_id": job.id, "trace_id": job.trace_id}
 
-    if agent.status != "idle":
-        raise HTTPException(status_code=400, detail="Agent is currently busy. Please wait until it is idle.")
-    
-    asyncio.create_task(run_training_in_background(
-        agent, 
-        request_body.simulator_id, 
-        request_body.simulator_environment, 
-        request_body.api_url,
-        request_body.total_timesteps,
-        request_body.filename
-    ))
-    return {"message": f"Agent {agent_id} training started."}
+
+class ExperienceRequest(BaseModel):
+    observations: List[List[float]]         # one row per transition
+    actions: List[int]
+    rewards: List[float]
+    next_observations: List[List[float]]
+    terminated: List[bool]                  # the episode ended in a terminal state
+    truncated: Optional[List[bool]] = None  # the episode was cut off (time limit), default all false
+
+@app.post("/agents/{agent_id}/experience")
+async def add_experience(agent_id: str, request_body: ExperienceRequest):
+    if agent_id not in agents_list:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    try:
+        batch = make_batch(**request_body.model_dump())
+        scheduler.add_experience(agent_id, batch)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=409, detail="Agent has no actor/learner training job")
+    except queue.Full:
+        raise HTTPException(status_code=429, detail="Experience queue is full, the learner is behind")
+    return {"message": f"Added {len(batch['rewards'])} transitions", "transitions": len(batch["rewards"])}
 
 
 class PredictRequest(BaseModel):
@@ -127,25 +175,174 @@ class PredictRequest(BaseModel):
     api_url: Optional[str] = SIMULATOR_API_URL
     eval_episodes: Optional[int] = 10
     save_filename: Optional[str] = None
+    action_repeat: Optional[int] = 1        # frame skip: repeat each action this many times on the simulator
+    vectorized: Optional[bool] = False      # simulator_id refers to a vector simulator
+    wire_format: Optional[str] = "json"     # "json" or "binary" encoding of simulator responses
+    transport: Optional[str] = "http"       # "http", "websocket" or "shm" connection to the simulator
+    parallelism: Optional[int] = 1          # simulators the episodes are spread over
+    simulator_ids: Optional[List[str]] = None # extra simulators to use, missing ones are created with the config of simulator_id
+    seed: Optional[int] = Field(None, ge=0, le=wire.MAX_SEED) # episode i is reset with seed + i
+    seed_set: Optional[str] = None          # named seed set of the simulator server, one episode per seed
+    profile: Optional[bool] = False         # time the phases of the env calls and sample stacks, see GET /agents/{agent_id}/profile
+    priority: Optional[int] = 0             # queued jobs with a higher priority start first
 
 @app.post("/agents/{agent_id}/predict")
 async def predict_agent(agent_id: str, request_body: PredictRequest):
     agent = agents_list.get(agent_id)
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
-    if agent.status != "idle":
-        raise HTTPException(status_code=400, detail="Agent is currently busy. Please wait until it is idle.")
-    
-    asyncio.create_task(run_prediction_in_background(
-        agent, 
-        request_body.simulator_id, 
-        request_body.simulator_environment, 
-        request_body.api_url, 
-        request_body.eval_episodes, 
-        request_body.save_filename
-    ))
-    
-    return {"message": f"Agent {agent_id} prediction started."}
+    if (request_body.seed is not None and request_body.seed_set is None
+            and request_body.seed + max(request_body.eval_episodes or 0, 1) - 1 > wire.MAX_SEED):
+        # the last episodes would fail on reset, halfway through the evaluation
+        raise HTTPException(status_code=400, detail=f"seed + eval_episodes - 1 must be at most {wire.MAX_SEED}")
+
+    job = submit_job(agent, PREDICT, request_body.priority, request_body.model_dump(exclude={"agent_id", "priority", "profile"}),
+                     request_body.profile)
+    return {"message": f"Agent {agent_id} prediction started.", "job_id": job.id, "trace_id": job.trace_id}
+
+
+@app.get("/agents/{agent_id}/profile")
+async def get_agent_profile(agent_id: str, format: str = "json"):
+    """Where the wall time of the agent's last profiled job went; format=folded returns its stack samples."""
+    if agent_id not in agents_list:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    job = scheduler.latest_profile(agent_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Agent has no profiled job, train or predict with \"profile\": true")
+    if job.profile is None:
+        raise HTTPException(status_code=404, detail=f"Profiled job {job.id} has not reported yet")
+    if format == "folded":
+        if "folded_stacks" not in job.profile:
+            raise HTTPException(status_code=404, detail="Stack samples are available once the job has finished")
+        return PlainTextResponse(job.profile["folded_stacks"])
+    profile = {key: value for key, value in job.profile.items() if key != "folded_stacks"}
+    return {"job_id": job.id, "kind": job.kind, "status": job.status, **profile}
+
+
+def sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+async def event_stream(agent_ids: Optional[List[str]]):
+    """
+    Server-Sent Events of some agents (all if agent_ids is None): first their current status and
+    unfinished jobs, then every job status change and progress event as it comes.
+    """
+    subscription = scheduler.broker.subscribe(agent_ids)
+    try:
+        agents = [agents_list[agent_id] for agent_id in agent_ids if agent_id in agents_list] if agent_ids is not None \
+            else list(agents_list.values())
+        for agent in agents:
+            yield sse({"type": "agent", **agent_json(agent)})
+        for job in list(scheduler.jobs.values()):
+            if job.finished_at is None and (agent_ids is None or job.agent.id in agent_ids):
+                yield sse({"type": "job", **job.to_json()})
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), AGENT_EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                # keeps proxies from closing the connection while no job runs
+                yield ": keep-alive\n\n"
+                continue
+            yield sse(event)
+            if event["type"] == "deleted" and agent_ids is not None and len(agent_ids) == 1:
+                return
+    finally:
+        scheduler.broker.unsubscribe(subscription)
+
+def event_response(agent_ids: Optional[List[str]]) -> StreamingResponse:
+    return StreamingResponse(event_stream(agent_ids), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/agents/{agent_id}/events")
+async def agent_events(agent_id: str):
+    """Progress and status changes of an agent's jobs as Server-Sent Events, instead of polling GET /agents/{agent_id}."""
+    if agent_id not in agents_list:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return event_response([agent_id])
+
+@app.get("/events")
+async def events(agent_id: Optional[List[str]] = Query(None)):
+    """The events of several agents (repeat agent_id) or of all of them over one connection."""
+    return event_response(agent_id)
+
+
+@app.get("/jobs")
+async def list_jobs():
+    return {"jobs": [job.to_json() for job in scheduler.jobs.values()]}
+
+@app.get("/jobs/stats")
+async def job_stats():
+    return scheduler.stats()
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = scheduler.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_json()
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    try:
+        job = scheduler.cancel(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"message": f"Cancelling job {job_id}", "status": job.status}
+
+
+class ActRequest(BaseModel):
+    observation: List[float]
+    save_filename: Optional[str] = None # model file to act with, default is the agent's last trained model
+    deterministic: Optional[bool] = True
+
+class ActBatchRequest(BaseModel):
+    observations: List[List[float]]     # one observation per row
+    save_filename: Optional[str] = None
+    deterministic: Optional[bool] = True
+
+async def act(agent_id: str, observations, save_filename: Optional[str], deterministic: bool):
+    agent = agents_list.get(agent_id)
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    model_path = f"trained_models/{save_filename}.zip" if save_filename else agent.model_path
+    if model_path is None:
+        raise HTTPException(status_code=400, detail="Agent has no trained model. Either train or load a model.")
+    try:
+        return await inference_server.act(model_path, observations, deterministic)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Model file not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/agents/{agent_id}/act")
+async def act_agent(agent_id: str, request_body: ActRequest):
+    actions = await act(agent_id, [request_body.observation], request_body.save_filename, request_body.deterministic)
+    return {"action": actions[0].item()}
+
+@app.post("/agents/{agent_id}/act_batch")
+async def act_batch_agent(agent_id: str, request_body: ActBatchRequest):
+    actions = await act(agent_id, request_body.observations, request_body.save_filename, request_body.deterministic)
+    return {"actions": actions.tolist()}
+
+@app.get("/inference/stats")
+async def inference_stats():
+    return inference_server.stats()
+
+
+@app.get("/models/cache")
+async def model_cache_stats():
+    # every process has its own cache; workers report theirs with each finished job
+    processes = {"api": model_cache.stats(), **{f"worker-{pid}": stats for pid, stats in scheduler.worker_cache_stats.items()}}
+    total = {key: sum(stats[key] for stats in processes.values())
+             for key in ("models", "bytes", "hits", "misses", "evictions", "invalidations")}
+    lookups = total["hits"] + total["misses"]
+    total["hit_rate"] = total["hits"] / lookups if lookups else 0.0
+    return {"total": total, "processes": processes}
+
+
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
 
 
 @app.get("/health")
@@ -0,0 +1,191 @@
+import collections
+import copy
+import glob
+import os
+import threading
+import time
+
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.save_util import save_to_zip_file
+
+# periodic checkpoints of training jobs, see Checkpointer
+AGENT_CHECKPOINT_DIR = os.getenv("AGENT_CHECKPOINT_DIR", "trained_models/checkpoints")
+AGENT_CHECKPOINT_INTERVAL_STEPS = int(os.getenv("AGENT_CHECKPOINT_INTERVAL_STEPS", "10000"))    # 0: no step interval
+AGENT_CHECKPOINT_INTERVAL_SECONDS = float(os.getenv("AGENT_CHECKPOINT_INTERVAL_SECONDS", "0"))  # 0: no time interval
+AGENT_CHECKPOINT_KEEP = int(os.getenv("AGENT_CHECKPOINT_KEEP", "3"))                            # checkpoints kept per run
+
+
+def snapshot_model(model) -> dict:
+    """
+    In-memory copy of everything model.save() writes, taken on the training thread. Only the
+    network and optimizer tensors are copied; the other attributes are scalars or objects
+    training doesn't mutate, except a few containers that are copied shallowly.
+    """
+    data = model.__dict__.copy()
+    exclude = set(model._excluded_save_params())
+    state_dicts_names, torch_variable_names = model._get_torch_save_params()
+    for name in state_dicts_names + torch_variable_names:
+        exclude.add(name.split(".")[0])
+    for name in exclude:
+        data.pop(name, None)
+    for name, value in data.items():
+        # e.g. ep_info_buffer, appended to by the training thread while the writer serializes it
+        if isinstance(value, (collections.deque, list, dict)):
+            data[name] = copy.copy(value)
+
+    pytorch_variables = None
+    if torch_variable_names:
+        pytorch_variables = {name: copy.deepcopy(_getattr(model, name)) for name in torch_variable_names}
+    return {"data": data, "params": copy.deepcopy(model.get_parameters()), "pytorch_variables": pytorch_variables}
+
+
+def _getattr(obj, name: str):
+    for part in name.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+
+def write_snapshot(snapshot: dict, path: str):
+    """Write a snapshot as a zip model.load() reads, atomically: to a temporary file renamed into place."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        save_to_zip_file(file, data=snapshot["data"], params=snapshot["params"],
+                         pytorch_variables=snapshot["pytorch_variables"])
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def check_run_path(value: str, field: str):
+    """
+    Run names (filename) and resume_from are paths below AGENT_CHECKPOINT_DIR: raise a ValueError
+    for absolute paths and .. components, which would load or write files anywhere on disk.
+    """
+    root = os.path.realpath(AGENT_CHECKPOINT_DIR)
+    if (not value or os.path.isabs(value) or ".." in value.replace("\\", "/").split("/")
+            or os.path.commonpath([root, os.path.realpath(os.path.join(root, value))]) != root):
+        raise ValueError(f"{field} must be a relative path without '..', got {value!r}")
+
+
+def checkpoint_path(run: str, timesteps: int) -> str:
+    return os.path.join(AGENT_CHECKPOINT_DIR, run, f"step_{timesteps:012d}.zip")
+
+
+def list_checkpoints(run: str) -> list:
+    """Checkpoint files of a run, in the order they were written (a run restarted from scratch writes lower steps)."""
+    checkpoints = []
+    for path in glob.glob(os.path.join(AGENT_CHECKPOINT_DIR, run, "step_*.zip")):
+        try:
+            checkpoints.append((os.stat(path).st_mtime_ns, path))
+        except FileNotFoundError:
+            pass  # pruned in the meantime
+    return [path for _, path in sorted(checkpoints)]
+
+
+def find_checkpoint(resume_from: str) -> str:
+    """
+    Checkpoint file to resume from: the last one written for a run (resume_from is the run name,
+    the filename of the interrupted training), or one of its files ("run/step_000000050000").
+    """
+    check_run_path(resume_from, "resume_from")
+    if os.path.isfile(os.path.join(AGENT_CHECKPOINT_DIR, f"{resume_from}.zip")):
+        return os.path.join(AGENT_CHECKPOINT_DIR, f"{resume_from}.zip")
+    checkpoints = list_checkpoints(resume_from)
+    if not checkpoints:
+        raise ValueError(f"No checkpoint found for {resume_from} in {AGENT_CHECKPOINT_DIR}")
+    return checkpoints[-1]
+
+
+class Checkpointer:
+    """
+    Periodic checkpoints of one training run, every interval_steps timesteps and/or every
+    interval_seconds (0 disables either). keep <= 0 keeps every checkpoint.
+
+    The training thread only takes an in-memory snapshot of the model (snapshot_model); a
+    background thread zips it to AGENT_CHECKPOINT_DIR/<run>/step_<timesteps>.zip with an
+    atomic rename and deletes all but the `keep` latest checkpoints of the run. If the writer
+    is still busy when the next snapshot comes, the pending one is replaced: the newest wins.
+    """
+    def __init__(self, run: str, interval_steps: int = AGENT_CHECKPOINT_INTERVAL_STEPS,
+                 interval_seconds: float = AGENT_CHECKPOINT_INTERVAL_SECONDS, keep: int = AGENT_CHECKPOINT_KEEP):
+        self.run = run
+        self.interval_steps = interval_steps
+        self.interval_seconds = interval_seconds
+        self.keep = keep
+        self.last_timesteps = None
+        self.last_time = time.monotonic()
+        self.written = []      # paths written, oldest first
+        self.errors = []
+        self._pending = None   # (path, snapshot) waiting for the writer
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._write_loop, name=f"checkpoint-writer-{run}", daemon=True)
+        self._thread.start()
+
+    def maybe_save(self, model):
+        """Checkpoint the model if an interval has passed since the last checkpoint (or the start of the run)."""
+        if self.last_timesteps is None:
+            # the run starts here, a resumed one at the timesteps of its checkpoint
+            self.last_timesteps = model.num_timesteps
+        # at every multiple of interval_steps, wherever the run started
+        due_steps = (self.interval_steps > 0
+                     and model.num_timesteps // self.interval_steps > self.last_timesteps // self.interval_steps)
+        due_time = self.interval_seconds > 0 and time.monotonic() - self.last_time >= self.interval_seconds
+        if due_steps or due_time:
+            self.save(model)
+
+    def save(self, model):
+        self.last_timesteps = model.num_timesteps
+        self.last_time = time.monotonic()
+        snapshot = snapshot_model(model)
+        with self._cond:
+            self._pending = (checkpoint_path(self.run, model.num_timesteps), snapshot)
+            self._cond.notify()
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                path, snapshot = self._pending
+                self._pending = None
+            try:
+                write_snapshot(snapshot, path)
+                self.written.append(path)
+                self._prune()
+            except Exception as e:
+                # a failed checkpoint must not stop the training
+                print(f"Writing checkpoint {path} failed: {e}")
+                self.errors.append(str(e))
+
+    def _prune(self):
+        for path in list_checkpoints(self.run)[:-self.keep] if self.keep > 0 else []:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        """Write the pending checkpoint, if any, and stop the writer."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def stats(self) -> dict:
+        return {"run": self.run, "checkpoints": len(self.written), "last": self.written[-1] if self.written else None,
+                "errors": len(self.errors)}
+
+
+class CheckpointCallback(BaseCallback):
+    """Lets a Checkpointer checkpoint the model from model.learn()."""
+    def __init__(self, checkpointer: Checkpointer):
+        super().__init__()
+        self.checkpointer = checkpointer
+
+    def _on_step(self) -> bool:
+        self.checkpointer.maybe_save(self.model)
+        return True
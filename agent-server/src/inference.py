@@ -0,0 +1,128 @@
+import asyncio
+import os
+
+import numpy as np
+import torch
+from prometheus_client import Histogram
+
+from model_cache import model_cache
+
+# micro-batching of online inference requests (see MicroBatcher)
+AGENT_ACT_MAX_BATCH = int(os.getenv("AGENT_ACT_MAX_BATCH", "256"))          # observations per forward pass
+AGENT_ACT_MAX_DELAY_MS = float(os.getenv("AGENT_ACT_MAX_DELAY_MS", "0"))    # extra wait for a batch to fill up
+
+BATCH_SIZE = Histogram("agent_inference_batch_size", "Observations per forward pass of the act micro-batcher",
+                       buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+
+
+class MicroBatcher:
+    """
+    Collects the observations of concurrent act requests for one model and answers them
+    with a single forward pass. A batch is flushed on the next event loop iteration after
+    its first request (plus max_delay, if set) or as soon as it holds max_batch observations.
+    The forward pass runs on the event loop: for the small MLP policies it is cheaper than
+    the hop to a thread.
+    """
+    def __init__(self, model, deterministic: bool, max_batch: int, max_delay: float):
+        self.model = model
+        self.deterministic = deterministic
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pending = []  # (observations, future)
+        self.size = 0
+        self.flush_handle = None
+        self.batches = 0
+        self.observations = 0
+
+    def submit(self, observations: np.ndarray) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((observations, future))
+        self.size += len(observations)
+        if self.size >= self.max_batch:
+            self.flush()
+        elif self.flush_handle is None:
+            if self.max_delay > 0:
+                self.flush_handle = loop.call_later(self.max_delay, self.flush)
+            else:
+                self.flush_handle = loop.call_soon(self.flush)
+        return future
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        pending, self.pending, self.size = self.pending, [], 0
+        if not pending:
+            return
+
+        try:
+            batch = np.concatenate([observations for observations, _ in pending])
+            with torch.inference_mode():
+                actions, _ = self.model.predict(batch, deterministic=self.deterministic)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.observations += len(batch)
+        BATCH_SIZE.observe(len(batch))
+        start = 0
+        for observations, future in pending:
+            if not future.done():
+                future.set_result(actions[start:start + len(observations)])
+            start += len(observations)
+
+
+class InferenceServer:
+    """
+    One MicroBatcher per (model file, deterministic); models come from the process-wide model cache.
+    A batcher holds its model, so batchers of models the cache evicted or reloaded are dropped.
+    """
+    def __init__(self, max_batch: int = AGENT_ACT_MAX_BATCH, max_delay_ms: float = AGENT_ACT_MAX_DELAY_MS):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.batchers = {}
+
+    async def _batcher(self, model_path: str, deterministic: bool) -> MicroBatcher:
+        # a cached model is looked up on the event loop, a miss (DQN.load) is loaded in a thread
+        model = model_cache.cached(model_path)
+        if model is None:
+            model = await asyncio.to_thread(model_cache.load, model_path)
+        key = (os.path.abspath(model_path), deterministic)
+        batcher = self.batchers.get(key)
+        if batcher is None or batcher.model is not model:
+            # first request for this model, or the file changed and the cache reloaded it
+            batcher = MicroBatcher(model, deterministic, self.max_batch, self.max_delay)
+            self.batchers[key] = batcher
+            self._drop_stale()
+        return batcher
+
+    def _drop_stale(self):
+        # models only leave the cache when another one is loaded, which is when this runs
+        for key, batcher in list(self.batchers.items()):
+            if not model_cache.holds(key[0], batcher.model):
+                batcher.flush()
+                del self.batchers[key]
+
+    async def act(self, model_path: str, observations, deterministic: bool = True) -> np.ndarray:
+        """Actions for a (n, obs_dim) batch of observations."""
+        batcher = await self._batcher(model_path, deterministic)
+        observations = np.asarray(observations, dtype=np.float32)
+        expected = batcher.model.observation_space.shape
+        if observations.ndim != 2 or observations.shape[1:] != expected:
+            raise ValueError(f"Expected observations of shape (n, {', '.join(map(str, expected))}), got {observations.shape}")
+        return await batcher.submit(observations)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_delay_ms": self.max_delay * 1000,
+            "models": [
+                {"model_path": path, "deterministic": deterministic, "batches": b.batches, "observations": b.observations,
+                 "mean_batch_size": b.observations / b.batches if b.batches else 0.0}
+                for (path, deterministic), b in self.batchers.items()
+            ]
+        }
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from stable_baselines3.common.callbacks import BaseCallback
+
+# Events sent by the job worker processes to the API process over a manager queue
+# (see JobScheduler.events). Workers send at most one progress event per interval, so
+# the channel costs one queue put per second and job, whatever the step rate.
+
+AGENT_PROGRESS_INTERVAL = float(os.getenv("AGENT_PROGRESS_INTERVAL", "1.0"))  # seconds between progress events of a job
+AGENT_EVENTS_BUFFER = int(os.getenv("AGENT_EVENTS_BUFFER", "256"))  # events buffered per event stream, the oldest are dropped beyond
+
+TRAIN_STEPS = Counter("agent_train_steps", "Environment steps taken by training jobs")
+TRAIN_STEPS_PER_SECOND = Gauge("agent_train_steps_per_second", "Step rate of the running training jobs", ["agent_id"])
+TRAIN_LOSS = Gauge("agent_train_loss", "Last DQN loss of the running training jobs", ["agent_id"])
+EVENT_STREAMS = Gauge("agent_event_streams", "Open event streams (GET /agents/{agent_id}/events and /events)")
+EVENTS_DROPPED = Counter("agent_events_dropped", "Events dropped for event stream clients reading too slowly")
+EPISODE_REWARD = Histogram("agent_train_episode_reward", "Total reward of the episodes finished during training",
+                           buckets=(-400, -300, -200, -150, -100, -50, 0, 50, 100, 150, 200, 250, 300))
+
+
+class ProgressReporter:
+    """Worker side: collects the progress of one training job and sends it every `interval` seconds."""
+    def __init__(self, events, agent_id: str, job_id: str, interval: float = AGENT_PROGRESS_INTERVAL, profiler=None):
+        self.events = events
+        self.profiler = profiler  # the job's profiling.JobProfiler, its report goes with every event
+        self.agent_id = agent_id
+        self.job_id = job_id
+        self.interval = interval
+        self.last_time = time.perf_counter()
+        self.last_timesteps = 0
+        self.timesteps = 0
+        self.loss = None
+        self.episode_rewards = []
+
+    def episode(self, reward: float):
+        self.episode_rewards.append(float(reward))
+
+    def update(self, timesteps: int, loss: float = None):
+        self.timesteps = timesteps
+        if loss is not None:
+            self.loss = float(loss)
+        if time.perf_counter() - self.last_time >= self.interval:
+            self.send()
+
+    def send(self):
+        now = time.perf_counter()
+        timesteps = self.timesteps
+        rewards, self.episode_rewards = self.episode_rewards, []
+        self.events.put({
+            "type": "progress",
+            "agent_id": self.agent_id,
+            "job_id": self.job_id,
+            "timesteps": timesteps,
+            "steps": timesteps - self.last_timesteps,
+            "steps_per_second": (timesteps - self.last_timesteps) / (now - self.last_time),
+            "loss": self.loss,
+            "episode_rewards": rewards,
+            "profile": self.profiler.report() if self.profiler is not None else None
+        })
+        self.last_time = now
+        self.last_timesteps = timesteps
+
+    def close(self):
+        """Send what is left and mark the job as finished."""
+        if self.timesteps > self.last_timesteps or self.episode_rewards:
+            self.send()
+        self.events.put({"type": "finished", "agent_id": self.agent_id, "job_id": self.job_id})
+
+
+class ProgressCallback(BaseCallback):
+    """Feeds a ProgressReporter from model.learn(): the finished episodes (Monitor infos) and the last loss."""
+    def __init__(self, progress: ProgressReporter):
+        super().__init__()
+        self.progress = progress
+
+    def _on_step(self) -> bool:
+        for info in self.locals.get("infos", ()):
+            if "episode" in info:
+                self.progress.episode(info["episode"]["r"])
+        self.progress.update(self.num_timesteps, self.model.logger.name_to_value.get("train/loss"))
+        return True
+
+
+def apply_event(event: dict):
+    """API process side: update the metrics with an event from a worker."""
+    agent_id = event["agent_id"]
+    if event["type"] == "progress":
+        TRAIN_STEPS.inc(event["steps"])
+        TRAIN_STEPS_PER_SECOND.labels(agent_id).set(event["steps_per_second"])
+        if event["loss"] is not None:
+            TRAIN_LOSS.labels(agent_id).set(event["loss"])
+        for reward in event["episode_rewards"]:
+            EPISODE_REWARD.observe(reward)
+    elif event["type"] == "finished":
+        # the per-agent series only exist while the agent trains
+        for gauge in (TRAIN_STEPS_PER_SECOND, TRAIN_LOSS):
+            try:
+                gauge.remove(agent_id)
+            except KeyError:
+                pass
+
+
+class Subscription:
+    """The events of some agents (all if agent_ids is None) buffered for one event stream."""
+    def __init__(self, agent_ids, size: int):
+        self.agent_ids = agent_ids
+        self.queue = asyncio.Queue(maxsize=size)
+        self.dropped = 0
+
+    def put(self, event: dict):
+        if self.agent_ids is not None and event["agent_id"] not in self.agent_ids:
+            return
+        if self.queue.full():
+            # a slow reader misses the oldest events rather than holding up the others
+            self.queue.get_nowait()
+            self.dropped += 1
+            EVENTS_DROPPED.inc()
+        self.queue.put_nowait(event)
+
+
+class EventBroker:
+    """
+    API process side: fans the job events out to the open event streams. Publishing only
+    appends to the bounded queue of each matching stream, so it never waits for a client.
+    """
+    def __init__(self, buffer: int = AGENT_EVENTS_BUFFER):
+        self.buffer = buffer
+        self.subscriptions = set()
+        self.loop = None
+        EVENT_STREAMS.set_function(lambda: len(self.subscriptions))
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Bind to the event loop the streams are served on; publish_threadsafe hands events over to it."""
+        self.loop = loop
+
+    def subscribe(self, agent_ids=None) -> Subscription:
+        subscription = Subscription(set(agent_ids) if agent_ids is not None else None, self.buffer)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.discard(subscription)
+
+    def publish(self, event: dict):
+        """Called on the event loop."""
+        for subscription in self.subscriptions:
+            subscription.put(event)
+
+    def publish_threadsafe(self, event: dict):
+        """Called from another thread, e.g. the one consuming the worker events."""
+        if self.loop is not None and self.subscriptions:
+            self.loop.call_soon_threadsafe(self.publish, event)
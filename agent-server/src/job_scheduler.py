@@ -0,0 +1,320 @@
+import asyncio
+import collections
+import datetime
+import heapq
+import itertools
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from prometheus_client import Counter, Gauge, Histogram
+
+from actor_learner import AGENT_EXPERIENCE_QUEUE_SIZE
+from agent import Agent
+from job_events import EventBroker, ProgressReporter, apply_event
+from model_cache import model_cache
+from profiling import JobProfiler
+
+# kinds of jobs, each with its own queue and concurrency limit
+TRAIN = "train"
+PREDICT = "predict"
+
+# agent status while a job of that kind runs
+_RUNNING_STATUS = {TRAIN: "training", PREDICT: "predicting"}
+
+# finished jobs kept around for GET /jobs/{job_id}
+MAX_FINISHED_JOBS = 1000
+
+
+JOBS_RUNNING = Gauge("agent_jobs_running", "Jobs running in the worker processes", ["kind"])
+JOBS_QUEUED = Gauge("agent_jobs_queued", "Jobs waiting for a slot", ["kind"])
+JOBS_FINISHED = Counter("agent_jobs_finished", "Jobs finished", ["kind", "status"])
+JOB_WAIT = Histogram("agent_job_wait_seconds", "Time jobs spent in the queue", ["kind"],
+                     buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def _init_worker(torch_threads: int):
+    # every job has its own process, so keep torch from spreading each one over all cores
+    import torch
+    torch.set_num_threads(torch_threads)
+
+
+def _run_job(agent: Agent, kind: str, kwargs: dict, cancel_event, events, job_id: str, trace_id: str = None) -> dict:
+    """Entry point in the worker process: run Agent.train/predict on a copy of the agent; profiled if traced."""
+    profiler = JobProfiler(trace_id) if trace_id is not None else None
+    if profiler is not None:
+        profiler.start()
+    try:
+        if kind == TRAIN:
+            progress = ProgressReporter(events, agent.id, job_id, profiler=profiler)
+            try:
+                agent.train(**kwargs, progress=progress, profiler=profiler, cancel_event=cancel_event)
+            finally:
+                progress.close()
+        else:
+            agent.predict(**kwargs, profiler=profiler, cancel_event=cancel_event)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    return {"result_message": agent.result_message, "error_message": agent.error_message, "model_path": agent.model_path,
+            "worker": os.getpid(), "model_cache": model_cache.stats(),
+            "profile": profiler.report(folded=True) if profiler is not None else None}
+
+
+class Job:
+    def __init__(self, agent: Agent, kind: str, priority: int, kwargs: dict, cancel_event, trace_id: str = None):
+        self.id = str(uuid.uuid4())
+        self.agent = agent
+        self.kind = kind
+        self.priority = priority
+        self.kwargs = kwargs
+        self.cancel_event = cancel_event
+        self.experience_queue = None  # batches of transitions for an actor/learner training job
+        self.trace_id = trace_id      # set for traced jobs, which are profiled
+        self.profile = None           # last profile report of a traced job (see profiling.py)
+        self.status = "queued"  # queued -> running -> done | failed | cancelled
+        self.submitted_at = datetime.datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.error_message = None
+
+    @property
+    def wait_time(self) -> float:
+        end = self.started_at or self.finished_at or datetime.datetime.now()
+        return (end - self.submitted_at).total_seconds()
+
+    def to_json(self) -> dict:
+        return {
+            "job_id": self.id,
+            "agent_id": self.agent.id,
+            "kind": self.kind,
+            "priority": self.priority,
+            "status": self.status,
+            "submitted_at": self.submitted_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "wait_time": self.wait_time,
+            "trace_id": self.trace_id,
+            "error_message": self.error_message
+        }
+
+
+class JobScheduler:
+    """
+    Runs train/predict jobs in a pool of worker processes, so the DQN updates of
+    different agents run in parallel instead of sharing the GIL.
+
+    Jobs wait in one priority queue per kind (higher priority first, FIFO within a
+    priority) and start once fewer than max_jobs[kind] jobs of that kind are running.
+    The agent's model stays in the file written by training; the worker processes get
+    a copy of the agent without it and the results are applied to the agent here.
+    """
+    def __init__(self, max_train_jobs: int, max_predict_jobs: int, max_queued_jobs: int, torch_threads: int = 1):
+        self.max_jobs = {TRAIN: max_train_jobs, PREDICT: max_predict_jobs}
+        self.max_queued_jobs = max_queued_jobs
+        self.torch_threads = torch_threads
+        self.queues = {TRAIN: [], PREDICT: []}  # heaps of (-priority, seq, job)
+        self.running = {TRAIN: 0, PREDICT: 0}
+        self.jobs = collections.OrderedDict()   # job id -> job, in submission order
+        self.wait_times = {TRAIN: collections.deque(maxlen=1000), PREDICT: collections.deque(maxlen=1000)}
+        self.finished = collections.Counter()
+        self.worker_cache_stats = {}  # worker pid -> model cache stats reported with its last job
+        self._seq = itertools.count()
+        self._tasks = set()
+        self.manager = None
+        self.pool = None
+        self.events = None  # job events from the workers (see job_events.py)
+        self.broker = EventBroker()  # worker events and job status changes, for the event streams
+        self._events_thread = None
+        for kind in (TRAIN, PREDICT):
+            JOBS_RUNNING.labels(kind).set_function(lambda kind=kind: self.running[kind])
+            JOBS_QUEUED.labels(kind).set_function(lambda kind=kind: len(self.queues[kind]))
+
+    def start(self):
+        # spawn: torch and the event loop's threads don't survive a fork
+        self.broker.attach(asyncio.get_running_loop())
+        ctx = multiprocessing.get_context("spawn")
+        # cancel events are shared with the workers through a manager, plain Events can't be sent to a pool
+        self.manager = ctx.Manager()
+        self.events = self.manager.Queue()
+        self._events_thread = threading.Thread(target=self._consume_events, name="job-events", daemon=True)
+        self._events_thread.start()
+        self.pool = ProcessPoolExecutor(max_workers=sum(self.max_jobs.values()), mp_context=ctx,
+                                        initializer=_init_worker, initargs=(self.torch_threads,))
+
+    def _consume_events(self):
+        while True:
+            try:
+                event = self.events.get()
+            except (EOFError, OSError):
+                return  # the manager is gone
+            if event is None:
+                return
+            try:
+                apply_event(event)
+                job = self.jobs.get(event["job_id"])
+                if job is not None and event.get("profile") is not None:
+                    job.profile = event["profile"]
+                # profiles are fetched from GET /agents/{agent_id}/profile, not streamed
+                self.broker.publish_threadsafe({key: value for key, value in event.items() if key != "profile"})
+            except Exception as e:
+                print(f"Could not apply job event {event}: {e}")
+
+    def queued(self, kind: str = None) -> int:
+        kinds = [kind] if kind else self.queues
+        return sum(len(self.queues[k]) for k in kinds)
+
+    def submit(self, agent: Agent, kind: str, kwargs: dict, priority: int = 0, trace_id: str = None) -> Job:
+        if self.queued() >= self.max_queued_jobs:
+            raise QueueFullError(f"Job queue is full ({self.max_queued_jobs} jobs waiting)")
+
+        job = Job(agent, kind, priority, kwargs, self.manager.Event(), trace_id)
+        if kind == TRAIN and kwargs.get("actor_learner"):
+            # filled by POST /agents/{agent_id}/experience, drained by the learner in the worker
+            job.experience_queue = self.manager.Queue(maxsize=AGENT_EXPERIENCE_QUEUE_SIZE)
+            job.kwargs = {**kwargs, "experience_queue": job.experience_queue}
+        self.jobs[job.id] = job
+        heapq.heappush(self.queues[kind], (-priority, next(self._seq), job))
+        agent.update_status("queued")
+        self._publish(job)
+        self._dispatch()
+        return job
+
+    def cancel(self, job_id: str) -> Job:
+        """Cancel a queued job right away; a running job stops at its next env step."""
+        job = self.jobs[job_id]
+        if job.status == "queued":
+            queue = self.queues[job.kind]
+            queue[:] = [entry for entry in queue if entry[2] is not job]
+            heapq.heapify(queue)
+            self._finish(job, "cancelled")
+            job.agent.update_status("idle")
+        elif job.status == "running":
+            job.cancel_event.set()
+        return job
+
+    def _publish(self, job: Job):
+        event = {"type": "job", **job.to_json()}
+        if job.status == "done":
+            event["result_message"] = job.agent.result_message
+        self.broker.publish(event)
+
+    def latest_profile(self, agent_id: str):
+        """The profiled job of an agent submitted last, None if it has none."""
+        for job in reversed(self.jobs.values()):
+            if job.agent.id == agent_id and job.trace_id is not None:
+                return job
+        return None
+
+    def add_experience(self, agent_id: str, batch: dict) -> Job:
+        """
+        Hand a batch of transitions to the queued or running actor/learner training job of an agent.
+        Raises KeyError if there is none and queue.Full while the learner is behind.
+        """
+        for job in self.jobs.values():
+            if job.agent.id == agent_id and job.status in ("queued", "running") and job.experience_queue is not None:
+                job.experience_queue.put_nowait(batch)
+                return job
+        raise KeyError(agent_id)
+
+    def _dispatch(self):
+        for kind, queue in self.queues.items():
+            while queue and self.running[kind] < self.max_jobs[kind]:
+                _, _, job = heapq.heappop(queue)
+                self.running[kind] += 1
+                task = asyncio.get_running_loop().create_task(self._run(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        job.started_at = datetime.datetime.now()
+        self.wait_times[job.kind].append(job.wait_time)
+        JOB_WAIT.labels(job.kind).observe(job.wait_time)
+        agent = job.agent
+        agent.update_status(_RUNNING_STATUS[job.kind])
+        self._publish(job)
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.pool, _run_job, agent, job.kind, job.kwargs, job.cancel_event, self.events, job.id, job.trace_id)
+            self.worker_cache_stats[result["worker"]] = result["model_cache"]
+            if result["profile"] is not None:
+                job.profile = result["profile"]
+            agent.result_message = result["result_message"]
+            agent.error_message = result["error_message"]
+            if job.kind == TRAIN and result["error_message"] is None:
+                # the new model lives in its file; drop any older in-memory model
+                agent.model = None
+                agent.model_path = result["model_path"]
+
+            if job.cancel_event.is_set():
+                self._finish(job, "cancelled", result["error_message"])
+            elif result["error_message"] is not None:
+                self._finish(job, "failed", result["error_message"])
+            else:
+                self._finish(job, "done")
+        except Exception as e:
+            print(f"Job {job.id} of agent {agent.id} failed: {e}")
+            agent.error_message = str(e)
+            self._finish(job, "failed", str(e))
+        finally:
+            self.running[job.kind] -= 1
+            agent.update_status("idle")
+            self._dispatch()
+
+    def _finish(self, job: Job, status: str, error_message: str = None):
+        job.status = status
+        job.error_message = error_message
+        job.finished_at = datetime.datetime.now()
+        self.finished[status] += 1
+        JOBS_FINISHED.labels(job.kind, status).inc()
+        self._publish(job)
+
+        # forget the oldest finished jobs
+        finished = [job_id for job_id, j in self.jobs.items() if j.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def stats(self) -> dict:
+        now = datetime.datetime.now()
+        stats = {}
+        for kind in (TRAIN, PREDICT):
+            waits = np.array(self.wait_times[kind]) if self.wait_times[kind] else np.zeros(1)
+            queue = self.queues[kind]
+            stats[kind] = {
+                "max_running": self.max_jobs[kind],
+                "running": self.running[kind],
+                "queued": len(queue),
+                "oldest_queued_wait": max(((now - job.submitted_at).total_seconds() for _, _, job in queue), default=0.0),
+                # over the last 1000 started jobs
+                "wait_time_mean": float(waits.mean()),
+                "wait_time_p50": float(np.percentile(waits, 50)),
+                "wait_time_p95": float(np.percentile(waits, 95)),
+                "wait_time_max": float(waits.max())
+            }
+        return {"max_queued": self.max_queued_jobs, "finished": dict(self.finished), **stats}
+
+    def close(self):
+        # queued jobs are cancelled the way cancel() does it
+        for kind in (TRAIN, PREDICT):
+            queue, self.queues[kind] = self.queues[kind], []
+            for _, _, job in queue:
+                self._finish(job, "cancelled")
+                job.agent.update_status("idle")
+        for job in self.jobs.values():
+            if job.status == "running":
+                job.cancel_event.set()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+        if self._events_thread is not None:
+            self.events.put(None)
+            self._events_thread.join()
+        if self.manager is not None:
+            self.manager.shutdown()
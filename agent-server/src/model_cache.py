@@ -0,0 +1,114 @@
+import collections
+import os
+import threading
+
+from stable_baselines3 import DQN
+from stable_baselines3.common.utils import check_for_correct_spaces
+
+# bounds of the process-wide cache of loaded models
+AGENT_MODEL_CACHE_SIZE = int(os.getenv("AGENT_MODEL_CACHE_SIZE", "8"))       # models kept loaded
+AGENT_MODEL_CACHE_MB = float(os.getenv("AGENT_MODEL_CACHE_MB", "512"))       # parameter memory kept loaded
+
+
+def model_nbytes(model) -> int:
+    return sum(p.numel() * p.element_size() for p in model.policy.parameters())
+
+
+class ModelCache:
+    """
+    Loaded models keyed by file path and mtime, evicted least recently used first
+    once more than max_models are loaded or their parameters take more than max_bytes.
+
+    A file that changed on disk (new mtime or size) is reloaded and the old entry dropped.
+    Cached models are shared by every agent of the process, so they must only be used
+    for inference, never trained further.
+    """
+    def __init__(self, max_models: int, max_bytes: int):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()  # path -> (mtime_ns, size, model, nbytes)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def cached(self, path: str):
+        """The model saved at path if it is loaded and the file unchanged, None otherwise; never loads."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or entry[:2] != (stat.st_mtime_ns, stat.st_size):
+                return None
+            self.entries.move_to_end(path)
+            self.hits += 1
+            return entry[2]
+
+    def holds(self, path: str, model) -> bool:
+        """Whether model is still the cached model of path (it may have been evicted or reloaded)."""
+        with self.lock:
+            entry = self.entries.get(os.path.abspath(path))
+            return entry is not None and entry[2] is model
+
+    def load(self, path: str, env=None):
+        """Return the model saved at path, loading it on a miss; checks its spaces against env if given."""
+        model = self.cached(path)
+        if model is None:
+            path = os.path.abspath(path)
+            stat = os.stat(path)
+            # loaded without the lock, so lookups of other models don't wait for it
+            loaded = DQN.load(path)
+            with self.lock:
+                entry = self.entries.get(path)
+                if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+                    # another thread loaded the same file meanwhile
+                    self.entries.move_to_end(path)
+                    self.hits += 1
+                    model = entry[2]
+                else:
+                    if entry is not None:
+                        self._drop(path)
+                        self.invalidations += 1
+                    self.misses += 1
+                    model = loaded
+                    nbytes = model_nbytes(model)
+                    self.entries[path] = (stat.st_mtime_ns, stat.st_size, model, nbytes)
+                    self.nbytes += nbytes
+                    self._evict()
+
+        if env is not None:
+            check_for_correct_spaces(env, model.observation_space, model.action_space)
+        return model
+
+    def _drop(self, path: str):
+        self.nbytes -= self.entries.pop(path)[3]
+
+    def _evict(self):
+        # never evict the entry that was just loaded
+        while len(self.entries) > 1 and (len(self.entries) > self.max_models or self.nbytes > self.max_bytes):
+            self._drop(next(iter(self.entries)))
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "models": len(self.entries),
+                "bytes": self.nbytes,
+                "max_models": self.max_models,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+# shared by all agents of this process (the API process and every job worker have their own)
+model_cache = ModelCache(AGENT_MODEL_CACHE_SIZE, int(AGENT_MODEL_CACHE_MB * 1024 * 1024))
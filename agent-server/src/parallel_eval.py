@@ -0,0 +1,93 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def provision_simulators(api_url: str, simulator_id: str, count: int) -> list:
+    """Create `count` simulators with the same environment and config as simulator_id; returns their ids."""
+    with httpx.Client(base_url=api_url) as client:
+        response = client.get(f"/simulators/{simulator_id}")
+        response.raise_for_status()
+        simulator = response.json()
+        simulator_ids = []
+        try:
+            for _ in range(count):
+                response = client.post("/simulators", json={"environment": simulator["environment"],
+                                                            "config": simulator["config"]})
+                response.raise_for_status()
+                simulator_ids.append(response.json()["simulator_id"])
+        except Exception:
+            delete_simulators(api_url, simulator_ids)
+            raise
+    return simulator_ids
+
+
+def delete_simulators(api_url: str, simulator_ids: list):
+    with httpx.Client(base_url=api_url) as client:
+        for simulator_id in simulator_ids:
+            try:
+                client.delete(f"/simulators/{simulator_id}")
+            except httpx.HTTPError as e:
+                print(f"Could not delete simulator {simulator_id}: {e}")
+
+
+def fetch_seed_set(api_url: str, name: str) -> list:
+    """Seeds of a named seed set stored on the simulator server."""
+    with httpx.Client(base_url=api_url) as client:
+        response = client.get(f"/seed_sets/{name}")
+        if response.status_code == 404:
+            raise ValueError(f"Unknown seed set: {name}")
+        response.raise_for_status()
+        return response.json()["seeds"]
+
+
+def evaluate_in_parallel(model, envs: list, seeds: list, deterministic: bool = True, cancel_event=None) -> np.ndarray:
+    """
+    Run one episode per entry of seeds (None for an unseeded reset), spread over envs with
+    one thread per env, and return the total reward of every episode in order.
+
+    Every episode is reset with its own seed, so the results don't depend on which env
+    ran an episode or on the number of envs.
+    """
+    rewards = np.zeros(len(seeds))
+    next_episode = iter(range(len(seeds)))
+    lock = threading.Lock()
+    failed = threading.Event()  # stops the other threads once one of them raised
+
+    def run_episodes(env):
+        while not failed.is_set():
+            with lock:
+                episode = next(next_episode, None)
+            if episode is None:
+                return
+            obs, _ = env.reset(seed=seeds[episode])
+            total, done = 0.0, False
+            while not done:
+                if failed.is_set():
+                    return
+                if cancel_event is not None and cancel_event.is_set():
+                    raise JobCancelled("Prediction cancelled")
+                action, _ = model.predict(obs, deterministic=deterministic)
+                obs, reward, terminated, truncated, _ = env.step(action)
+                total += reward
+                done = terminated or truncated
+            rewards[episode] = total
+
+    def run(env):
+        try:
+            run_episodes(env)
+        except Exception:
+            failed.set()
+            raise
+
+    # the threads mostly wait on the simulators, so they overlap despite the GIL
+    with ThreadPoolExecutor(max_workers=len(envs)) as pool:
+        for future in [pool.submit(run, env) for env in envs]:
+            future.result()
+    return rewards
@@ -0,0 +1,136 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+# profiling of train/predict jobs started with "profile": true or an X-Trace-Id header
+AGENT_PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("AGENT_PROFILE_SAMPLE_INTERVAL_MS", "10"))  # 0 disables the stack sampler
+
+# entries of the top lists in a profile report
+TOP_ENTRIES = 20
+
+
+def _idle(frame) -> bool:
+    return frame.f_code.co_name == "wait" and os.path.basename(frame.f_code.co_filename) == "threading.py"
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of the thread that started it and of the threads it starts
+    afterwards (e.g. the parallel evaluation or actor threads) every `interval` seconds.
+
+    The samples are counted as folded stacks, one line "thread (name);func (file:line);... count"
+    per distinct stack: the raw format of py-spy, which flamegraph.pl and speedscope read.
+    Like py-spy, threads idle in a threading wait (e.g. the tqdm monitor) are left out.
+    """
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.counts = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+        self._ignored = set()
+
+    def start(self):
+        self._target = threading.get_ident()
+        # threads that were already running (other than the caller) belong to something else
+        self._ignored = {t.ident for t in threading.enumerate() if t.ident != self._target}
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        self._ignored.add(self._thread.ident)
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident in self._ignored or _idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(f"thread ({names.get(ident, ident)})")
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.counts.most_common())
+
+    def top_functions(self, n: int = TOP_ENTRIES) -> list:
+        """Functions the sampled threads were running (the leaf of the stack), by share of the samples."""
+        functions = collections.Counter()
+        for stack, count in self.counts.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            functions[leaf.rsplit(":", 1)[0] + ")"] += count
+        total = sum(functions.values()) or 1
+        return [{"function": function, "samples": count, "share": count / total} for function, count in functions.most_common(n)]
+
+
+class JobProfiler:
+    """
+    Profile of one train/predict job: where the wall time of the env calls went, phase by
+    phase (see LunarLanderSimulatorWrapper), the time spent outside of them (policy and
+    learning) and, if enabled, the samples of a StackSampler.
+
+    With several env threads (parallelism, actors) the phase times add up over the threads.
+    """
+    def __init__(self, trace_id: str, sample_interval_ms: float = AGENT_PROFILE_SAMPLE_INTERVAL_MS):
+        self.trace_id = trace_id
+        self.phases = collections.Counter()
+        self.env_calls = 0
+        self.env_time = 0.0
+        self.lock = threading.Lock()
+        self.sampler = StackSampler(sample_interval_ms / 1000) if sample_interval_ms > 0 else None
+        self.started_at = None
+        self.stopped_at = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        if self.sampler is not None:
+            self.sampler.start()
+
+    def stop(self):
+        self.stopped_at = time.perf_counter()
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    def record(self, wall_time: float, phases: dict):
+        """One env call (reset/step/step_many) that took wall_time, with the phases measured in it."""
+        with self.lock:
+            self.env_calls += 1
+            self.env_time += wall_time
+            self.phases.update(phases)
+            # whatever the transport did not account for: numpy conversions in the wrapper
+            self.phases["agent_convert"] += max(wall_time - sum(phases.values()), 0.0)
+
+    def report(self, folded: bool = False) -> dict:
+        wall_time = (self.stopped_at or time.perf_counter()) - self.started_at if self.started_at else 0.0
+        with self.lock:
+            phases = dict(self.phases)
+            env_calls, env_time = self.env_calls, self.env_time
+        phases["agent_policy_and_learning"] = max(wall_time - env_time, 0.0)
+        total = sum(phases.values()) or 1.0
+        report = {
+            "trace_id": self.trace_id,
+            "wall_time": wall_time,
+            "env_calls": env_calls,
+            "phases": {
+                name: {"seconds": seconds, "share": seconds / total,
+                       "per_env_call_ms": seconds / env_calls * 1000 if env_calls else 0.0}
+                for name, seconds in sorted(phases.items(), key=lambda item: -item[1])
+            }
+        }
+        if self.sampler is not None:
+            report["samples"] = self.sampler.samples
+            report["top_functions"] = self.sampler.top_functions()
+            if folded:
+                report["folded_stacks"] = self.sampler.folded()
+        return report
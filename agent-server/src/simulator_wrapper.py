@@ -1,49 +1,323 @@
+import json
+import time
 import gymnasium as gym
 from gymnasium import spaces
 import httpx
 import numpy as np
+from urllib.parse import urlsplit, parse_qsl
+from websockets.sync.client import connect as ws_connect
+
+import wire
+from shm_ring import ShmRingClient
+from tracing import SERVER_TIMING_HEADER, TRACE_HEADER, parse_server_timing
+
+WIRE_FORMATS = ("json", "binary")
+TRANSPORTS = ("http", "websocket", "shm")
+
+# api_url scheme that selects the in-process transport
+LOCAL_SCHEME = "local://"
+
+def decode_response(response: httpx.Response) -> dict:
+    """Decode a simulator response, JSON or binary frame depending on its content type."""
+    response.raise_for_status()
+    if response.headers.get("content-type", "").startswith(wire.MEDIA_TYPE):
+        return wire.decode_frame(response.content)
+    return response.json()
+
+def make_client(api_url: str, wire_format: str, trace_id: str = None) -> httpx.Client:
+    if wire_format not in WIRE_FORMATS:
+        raise ValueError(f"Unknown wire format: {wire_format}")
+    headers = {"accept": wire.MEDIA_TYPE} if wire_format == "binary" else {}
+    if trace_id is not None:
+        headers[TRACE_HEADER] = trace_id
+    return httpx.Client(base_url=api_url, headers=headers)
+
+
+# Every transport has a `phases` attribute: None, or a dict the transport adds the time of
+# the phases of each call to (seconds by phase name), set by a profiling wrapper. Transports
+# that don't break their calls down name the one phase a whole call counts as in `call_phase`.
+
+class HttpTransport:
+    """Request/response transport: one HTTP call per reset/step."""
+    call_phase = None
+    def __init__(self, api_url: str, simulator_id: str, wire_format: str = "json", trace_id: str = None):
+        self.client = make_client(api_url, wire_format, trace_id)
+        self.simulator_id = simulator_id
+        self.phases = None
+
+    def _post(self, path: str, body) -> dict:
+        phases = self.phases
+        if phases is None:
+            return decode_response(self.client.post(path, json=body))
+
+        start = time.perf_counter()
+        content = json.dumps(body).encode() if body is not None else None
+        sent = time.perf_counter()
+        response = self.client.post(path, content=content, headers={"content-type": "application/json"} if content else None)
+        received = time.perf_counter()
+        data = decode_response(response)
+        phases["agent_serialize"] = sent - start
+        phases["agent_parse"] = time.perf_counter() - received
+        # the simulator reports its side of a traced request in Server-Timing, the rest of the round trip is the network
+        server = parse_server_timing(response.headers.get(SERVER_TIMING_HEADER, ""))
+        total = server.pop("total", 0.0)
+        phases["network"] = max(received - sent - total, 0.0)
+        for name, seconds in server.items():
+            phases[f"simulator_{name}"] = seconds
+        phases["simulator_other"] = max(total - sum(server.values()), 0.0)  # routing, body parsing, validation
+        return data
+
+    def reset(self, seed: int = None) -> dict:
+        body = {"seed": seed} if seed is not None else None
+        return self._post(f"/simulators/{self.simulator_id}/reset", body)
+
+    def step(self, action: int) -> dict:
+        return self._post(f"/simulators/{self.simulator_id}/step", {"action": action})
+
+    def step_many(self, actions) -> dict:
+        return self._post(f"/simulators/{self.simulator_id}/steps", {"actions": actions})
+
+    def close(self):
+        self.client.close()
+
+
+class WebSocketTransport:
+    """Streaming transport: commands and binary frames over one long-lived WebSocket."""
+    call_phase = None
+    def __init__(self, api_url: str, simulator_id: str):
+        ws_url = api_url.replace("https://", "wss://", 1).replace("http://", "ws://", 1).rstrip("/")
+        self.connection = ws_connect(f"{ws_url}/simulators/{simulator_id}/ws", compression=None)
+        self.simulator_id = simulator_id
+        self.phases = None
+
+    def _call(self, op: int, actions=()) -> dict:
+        phases = self.phases
+        if phases is None:
+            self.connection.send(wire.pack_command(op, actions))
+            return wire.decode_frame(self.connection.recv())
+
+        # no headers per message, so the simulator's side is part of the round trip
+        start = time.perf_counter()
+        command = wire.pack_command(op, actions)
+        sent = time.perf_counter()
+        self.connection.send(command)
+        frame = self.connection.recv()
+        received = time.perf_counter()
+        data = wire.decode_frame(frame)
+        phases["agent_serialize"] = sent - start
+        phases["round_trip"] = received - sent
+        phases["agent_parse"] = time.perf_counter() - received
+        return data
+
+    def reset(self, seed: int = None) -> dict:
+        return self._call(wire.OP_RESET, (seed,) if seed is not None else ())
+
+    def step(self, action: int) -> dict:
+        return self._call(wire.OP_STEP, (action,))
+
+    def step_many(self, actions) -> dict:
+        return self._call(wire.OP_STEPS, actions)
+
+    def close(self):
+        self.connection.close()
+
+
+class ShmTransport:
+    """
+    Shared-memory transport for simulators created with config {"transport": "shm"} on the same host.
+    Only the lookup of the segment name goes over HTTP; actions and transitions go through the ring buffer.
+    """
+    call_phase = "round_trip"
+    def __init__(self, api_url: str, simulator_id: str):
+        with httpx.Client(base_url=api_url) as client:
+            response = client.get(f"/simulators/{simulator_id}")
+            response.raise_for_status()
+            shm_name = response.json().get("shm_name")
+        if shm_name is None:
+            raise ValueError(f"Simulator {simulator_id} was not created with the shm transport")
+        self.channel = ShmRingClient(shm_name)
+        self.simulator_id = simulator_id
+        self.phases = None
+
+    def reset(self, seed: int = None) -> dict:
+        return {"state": self.channel.reset(seed), "info": {}}
+
+    def step(self, action: int) -> dict:
+        slot = self.channel.step_many([action])[0]
+        return {"state": slot["state"], "reward": slot["reward"], "terminated": slot["terminated"],
+                "truncated": slot["truncated"], "info": {}}
+
+    def step_many(self, actions) -> dict:
+        slots = self.channel.step_many(actions)
+        return {"states": slots["state"], "rewards": slots["reward"], "terminated": slots["terminated"],
+                "truncated": slots["truncated"], "infos": [{} for _ in range(len(slots))]}
+
+    def close(self):
+        self.channel.close()
+
+
+class LocalTransport:
+    """
+    In-process transport: runs a LunarLanderSimulator directly, without the simulator server.
+    The env config comes from the query string of the api_url, e.g.
+    local://?gravity=-9.8&enable_wind=true&wind_power=10
+    Requires the simulator-server sources (simulator.py) on the PYTHONPATH.
+    """
+    call_phase = "simulator_env"
+    def __init__(self, api_url: str, simulator_id: str):
+        try:
+            from simulator import LunarLanderSimulator
+        except ImportError as e:
+            raise ImportError("The local:// transport needs simulator-server/src on the PYTHONPATH") from e
+
+        config = dict(parse_qsl(urlsplit(api_url).query))
+        self.simulator = LunarLanderSimulator(
+            _parse_bool(config.get("continuous", "false")),
+            float(config.get("gravity", -10.0)),
+            _parse_bool(config.get("enable_wind", "false")),
+            float(config.get("wind_power", 15.0)),
+            float(config.get("turbulence_power", 1.5))
+        )
+        self.simulator_id = simulator_id
+        self.phases = None
+
+    def reset(self, seed: int = None) -> dict:
+        state, info = self.simulator.reset(seed)
+        return {"state": state, "info": info}
+
+    def step(self, action: int) -> dict:
+        state, reward, terminated, truncated, info = self.simulator.step(action)
+        return {"state": state, "reward": reward, "terminated": terminated, "truncated": truncated, "info": info}
+
+    def step_many(self, actions) -> dict:
+        states, rewards, terminated, truncated, infos = self.simulator.step_many(actions)
+        return {"states": states, "rewards": rewards, "terminated": terminated, "truncated": truncated, "infos": infos}
+
+    def close(self):
+        self.simulator.close()
+
+
+def _parse_bool(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+
+def is_local_url(api_url: str) -> bool:
+    return api_url is not None and api_url.startswith(LOCAL_SCHEME)
+
+
+def make_transport(api_url: str, simulator_id: str, transport: str = "http", wire_format: str = "json",
+                   trace_id: str = None):
+    # local:// always runs the simulator in-process, whatever transport was asked for
+    if is_local_url(api_url):
+        return LocalTransport(api_url, simulator_id)
+    if transport == "http":
+        return HttpTransport(api_url, simulator_id, wire_format, trace_id)
+    if transport == "websocket":
+        # the step channel always uses binary frames
+        return WebSocketTransport(api_url, simulator_id)
+    if transport == "shm":
+        return ShmTransport(api_url, simulator_id)
+    raise ValueError(f"Unknown transport: {transport}")
+
 
 class LunarLanderSimulatorWrapper(gym.Env):
     """
     A custom Gym environment that interacts with the Simulator Server API.
+
+    With action_repeat > 1 every call to step() applies the action that many times
+    on the server (frame skip) in a single round-trip and returns the summed reward.
+    With wire_format="binary" observations are transferred as raw float32 buffers.
+    With transport="websocket" all calls go over one persistent WebSocket instead of HTTP.
+    With transport="shm" they go through a shared-memory ring buffer (simulator on the same host).
+    An api_url of the form local://?<config> runs the simulator in-process (see LocalTransport).
+    With a profiler (profiling.JobProfiler) every call is timed phase by phase and HTTP requests
+    carry its trace id.
     """
-    def __init__(self, api_url: str, simulator_id: str):
-        super(LunarLanderSimulatorWrapper, self).__init__() 
-        
-        self.client = httpx.Client(base_url=api_url)
+    def __init__(self, api_url: str, simulator_id: str, action_repeat: int = 1, wire_format: str = "json",
+                 transport: str = "http", profiler=None):
+        super(LunarLanderSimulatorWrapper, self).__init__()
+
+        if action_repeat < 1:
+            raise ValueError(f"action_repeat must be >= 1, got {action_repeat}")
+
+        trace_id = profiler.trace_id if profiler is not None else None
+        self.transport = make_transport(api_url, simulator_id, transport, wire_format, trace_id)
         self.simulator_id = simulator_id
-        
+        self.action_repeat = action_repeat
+        self.profiler = profiler
+
         # Define action and observation space for LunarLander
         self.action_space = spaces.Discrete(4)
         self.observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(8,), dtype=np.float32)
 
+    def _profiled(self, method, *args):
+        phases = self.transport.phases = {}
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self.transport.phases = None
+            wall_time = time.perf_counter() - start
+            if self.transport.call_phase is not None:
+                phases[self.transport.call_phase] = wall_time
+            self.profiler.record(wall_time, phases)
+
     def step(self, action):
-        response = self.client.post(
-            f"/simulators/{self.simulator_id}/step",
-            json={"action": int(action)}
-        )
-        response.raise_for_status()
-        data = response.json()
+        if self.profiler is not None:
+            return self._profiled(self._step, action)
+        return self._step(action)
 
-        state = np.array(data["state"], dtype=np.float32)
-        reward = data["reward"]
-        terminated = data["terminated"]
-        truncated = data["truncated"]
+    def _step(self, action):
+        if self.action_repeat > 1:
+            return self._repeat_step(int(action))
+
+        data = self.transport.step(int(action))
+
+        state = np.asarray(data["state"], dtype=np.float32)
+        reward = float(data["reward"])
+        terminated = bool(data["terminated"])
+        truncated = bool(data["truncated"])
         info = data["info"]
-        
+
         return state, reward, terminated, truncated, info
 
+    def step_many(self, actions):
+        """
+        Apply a sequence of actions in one round-trip. The rollout stops early when the
+        episode ends, so the returned arrays may be shorter than `actions`.
+        Returns (states, rewards, terminated, truncated, infos).
+        """
+        if self.profiler is not None:
+            return self._profiled(self._step_many, actions)
+        return self._step_many(actions)
+
+    def _step_many(self, actions):
+        data = self.transport.step_many([int(a) for a in actions])
+
+        states = np.asarray(data["states"], dtype=np.float32)
+        rewards = np.asarray(data["rewards"], dtype=np.float64)
+        terminated = np.asarray(data["terminated"], dtype=bool)
+        truncated = np.asarray(data["truncated"], dtype=bool)
+        return states, rewards, terminated, truncated, data["infos"]
+
+    def _repeat_step(self, action: int):
+        states, rewards, terminated, truncated, infos = self._step_many([action] * self.action_repeat)
+        return states[-1], float(rewards.sum()), bool(terminated[-1]), bool(truncated[-1]), infos[-1]
+
     def reset(self, seed=None, options=None):
-        # This will now work
-        response = self.client.post(f"/simulators/{self.simulator_id}/reset")
-        response.raise_for_status()
-        data = response.json()
+        super(LunarLanderSimulatorWrapper, self).reset(seed=seed)
+        if self.profiler is not None:
+            return self._profiled(self._reset, seed)
+        return self._reset(seed)
 
-        state = np.array(data["state"], dtype=np.float32)
+    def _reset(self, seed):
+        data = self.transport.reset(seed)
+
+        state = np.asarray(data["state"], dtype=np.float32)
         info = data["info"]
-        
+
         return state, info
 
     def close(self):
-        # Close the HTTP client
-        self.client.close()
\ No newline at end of file
+        # Close the connection to the simulator server
+        self.transport.close()
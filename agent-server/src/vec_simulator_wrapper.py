@@ -0,0 +1,88 @@
+from gymnasium import spaces
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+import wire
+from simulator_wrapper import decode_response, make_client
+
+class LunarLanderVecSimulatorWrapper(VecEnv):
+    """
+    A SB3 VecEnv backed by a vector simulator on the Simulator Server API.
+    One HTTP round-trip steps all num_envs sub-envs; sub-envs auto-reset on the server.
+
+    Seeds set with seed() (e.g. by DQN(seed=...)) are sent with the next reset. The sub-envs
+    live on the server, so get_attr only returns attributes of this wrapper, and set_attr and
+    env_method are not supported: they raise NotImplementedError.
+    """
+    def __init__(self, api_url: str, simulator_id: str, wire_format: str = "json"):
+        self.client = make_client(api_url, wire_format)
+        self.simulator_id = simulator_id
+
+        response = self.client.get(f"/vector_simulators/{self.simulator_id}")
+        response.raise_for_status()
+        num_envs = response.json()["num_envs"]
+
+        # Define action and observation space for LunarLander
+        action_space = spaces.Discrete(4)
+        observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(8,), dtype=np.float32)
+        self._actions = None
+        # nothing is rendered locally; VecEnv.__init__ reads it through get_attr
+        self.render_mode = None
+
+        super(LunarLanderVecSimulatorWrapper, self).__init__(num_envs, observation_space, action_space)
+
+    def reset(self):
+        body = None
+        if any(seed is not None for seed in self._seeds):
+            # VecEnv.seed() may draw seeds up to 2**32, the server takes them up to wire.MAX_SEED
+            body = {"seeds": [None if seed is None else seed % (wire.MAX_SEED + 1) for seed in self._seeds]}
+        response = self.client.post(f"/vector_simulators/{self.simulator_id}/reset", json=body)
+        data = decode_response(response)
+        self._reset_seeds()
+        self._reset_options()
+        return np.asarray(data["states"], dtype=np.float32)
+
+    def step_async(self, actions):
+        self._actions = actions
+
+    def step_wait(self):
+        response = self.client.post(
+            f"/vector_simulators/{self.simulator_id}/step",
+            json={"actions": [int(a) for a in self._actions]}
+        )
+        data = decode_response(response)
+
+        states = np.asarray(data["states"], dtype=np.float32)
+        rewards = np.asarray(data["rewards"], dtype=np.float32)
+        terminated = np.asarray(data["terminated"], dtype=bool)
+        truncated = np.asarray(data["truncated"], dtype=bool)
+        dones = terminated | truncated
+
+        # SB3 expects the last observation of a finished episode under "terminal_observation"
+        infos = [{} for _ in range(self.num_envs)]
+        for i, final_state in enumerate(data["final_states"]):
+            infos[i]["TimeLimit.truncated"] = bool(truncated[i] and not terminated[i])
+            if final_state is not None:
+                infos[i]["terminal_observation"] = np.array(final_state, dtype=np.float32)
+
+        return states, rewards, dones, infos
+
+    def close(self):
+        # Close the HTTP client
+        self.client.close()
+
+    def get_attr(self, attr_name, indices=None):
+        # the sub-envs live on the server, only attributes of this wrapper are available
+        if not hasattr(self, attr_name):
+            raise AttributeError(f"Sub-env attribute {attr_name!r} is not available on a remote vector simulator")
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    # set_attr and env_method are abstract in VecEnv, see the class docstring
+    def set_attr(self, attr_name, value, indices=None):
+        raise NotImplementedError("Sub-env attributes of a remote vector simulator cannot be set")
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        raise NotImplementedError("Sub-env methods of a remote vector simulator cannot be called")
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
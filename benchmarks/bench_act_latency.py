@@ -0,0 +1,135 @@
+"""
+Latency and throughput of the online inference endpoints of the agent-server.
+
+    python benchmarks/bench_act_latency.py --requests 2000 --concurrency 32
+
+Starts an agent-server process in a scratch directory, trains a small model on an
+in-process (local://) simulator and then measures:
+  * the forward pass per observation in-process (model.predict under inference_mode),
+  * in-process throughput of concurrent single-observation requests through the micro-batcher,
+  * sequential POST /agents/{id}/act round-trips (p50/p99),
+  * throughput of concurrent act requests, which the server micro-batches,
+  * throughput of POST /agents/{id}/act_batch.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+import numpy as np
+import torch
+
+import common
+from inference import InferenceServer
+from model_cache import ModelCache
+
+
+def wait_for_job(api_url: str, job_id: str) -> dict:
+    while True:
+        job = httpx.get(f"{api_url}/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.5)
+
+
+def forward_latency(model_path: str, n: int) -> float:
+    model = ModelCache(1, 1 << 30).load(model_path)
+    observation = np.zeros((1, 8), dtype=np.float32)
+    with torch.inference_mode():
+        for _ in range(100):
+            model.predict(observation, deterministic=True)
+        start = time.perf_counter()
+        for _ in range(n):
+            model.predict(observation, deterministic=True)
+    return (time.perf_counter() - start) / n
+
+
+async def micro_batched(model_path: str, observations, concurrency: int, n: int) -> float:
+    server = InferenceServer()
+
+    async def client_loop(index: int):
+        for i in range(index, n, concurrency):
+            await server.act(model_path, observations[i % len(observations)][None])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop(i) for i in range(concurrency)))
+    return n / (time.perf_counter() - start)
+
+
+async def concurrent_act(api_url: str, agent_id: str, observations, concurrency: int, duration: float) -> float:
+    completed = 0
+    deadline = time.perf_counter() + duration
+
+    async def client_loop(client: httpx.AsyncClient, index: int):
+        nonlocal completed
+        while time.perf_counter() < deadline:
+            observation = observations[(completed + index) % len(observations)].tolist()
+            response = await client.post(f"/agents/{agent_id}/act", json={"observation": observation})
+            response.raise_for_status()
+            completed += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=api_url, limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, i) for i in range(concurrency)))
+        return completed / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="sequential act requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="act requests in flight")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of concurrent load")
+    parser.add_argument("--batch", type=int, default=256, help="observations per act_batch request")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_act_")
+    os.makedirs(os.path.join(workdir, "trained_models"))
+    server, api_url = common.start_server_process("agent_server:app", common.AGENT_SRC, cwd=workdir, timeout=120,
+                                                  env={"PYTHONPATH": common.SIMULATOR_SRC})
+    try:
+        agent_id = httpx.post(f"{api_url}/agents").json()["agent_id"]
+        job_id = httpx.post(f"{api_url}/agents/{agent_id}/train", json={
+            "agent_id": agent_id, "simulator_id": "local", "simulator_environment": "LunarLander-v3",
+            "api_url": "local://", "total_timesteps": 1000, "filename": "bench_act"}).json()["job_id"]
+        job = wait_for_job(api_url, job_id)
+        if job["status"] != "done":
+            raise RuntimeError(f"Training failed: {job['error_message']}")
+
+        observations = np.random.default_rng(0).normal(size=(4096, 8)).astype(np.float32)
+        model_path = os.path.join(workdir, "trained_models", "bench_act.zip")
+        common.report("forward pass (in-process, 1 obs)", forward_latency(model_path, 2000) * 1e6, "us")
+        for concurrency in (1, args.concurrency):
+            throughput = asyncio.run(micro_batched(model_path, observations, concurrency, 20000))
+            common.report(f"micro-batcher (in-process, {concurrency} concurrent)", throughput, "obs/s")
+
+        latencies = []
+        with httpx.Client(base_url=api_url) as client:
+            for i in range(args.requests + 100):
+                start = time.perf_counter()
+                client.post(f"/agents/{agent_id}/act",
+                            json={"observation": observations[i % len(observations)].tolist()}).raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            latencies = np.array(latencies[100:]) * 1000
+            common.report("act round-trip p50", np.percentile(latencies, 50), "ms")
+            common.report("act round-trip p99", np.percentile(latencies, 99), "ms")
+
+            throughput = asyncio.run(concurrent_act(api_url, agent_id, observations, args.concurrency, args.duration))
+            common.report(f"act, {args.concurrency} concurrent", throughput, "obs/s")
+            models = client.get("/inference/stats").json()["models"]
+            common.report("  mean micro-batch size", models[0]["mean_batch_size"], "obs")
+
+            batch = observations[:args.batch].tolist()
+            n = max(1, args.requests // 20)
+            start = time.perf_counter()
+            for _ in range(n):
+                client.post(f"/agents/{agent_id}/act_batch", json={"observations": batch}).raise_for_status()
+            common.report(f"act_batch ({args.batch} obs)", n * args.batch / (time.perf_counter() - start), "obs/s")
+    finally:
+        common.stop_server_process(server)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Simulator creation throughput and latency under concurrency, without and with the warm env
+pool of the simulator-server (see env_pool.py).
+
+    python benchmarks/bench_create.py --creates 500 --concurrency 16 --workers 2
+
+Every round creates `--creates` simulators from `--concurrency` concurrent clients, as a
+sweep fanning out does, and deletes them afterwards. The first round runs on a fresh server;
+later rounds can reuse the envs of the deleted simulators. Besides the client-side rate and
+latency, the time the server spent creating (the "create" phase of its Server-Timing header)
+is reported, which is what the pool saves and what blocks the event loop with
+SIMULATOR_WORKERS=0.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+import common
+from tracing import TRACE_HEADER, parse_server_timing
+
+CONFIGS = {
+    "pool off": {"SIMULATOR_WARM_ENVS": "0", "SIMULATOR_ENV_POOL_SIZE": "0"},
+    "warm pool": {}
+}
+
+
+async def create_round(api_url: str, creates: int, concurrency: int, config: dict) -> tuple:
+    latencies = []
+    create_times = []
+    simulator_ids = []
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=api_url, limits=limits, timeout=60) as client:
+        queue = asyncio.Queue()
+        for _ in range(creates):
+            queue.put_nowait(None)
+
+        async def run_client():
+            while not queue.empty():
+                queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.post("/simulators", json={"environment": "LunarLander-v3", "config": config},
+                                             headers={TRACE_HEADER: "bench-create"})
+                latencies.append(time.perf_counter() - start)
+                create_times.append(parse_server_timing(response.headers["server-timing"])["create"])
+                simulator_ids.append(response.json()["simulator_id"])
+
+        start = time.perf_counter()
+        await asyncio.gather(*(run_client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+        for simulator_id in simulator_ids:
+            await client.delete(f"/simulators/{simulator_id}")
+    return creates / elapsed, np.array(latencies), np.array(create_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--creates", type=int, default=500, help="simulators created per round")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=0, help="SIMULATOR_WORKERS of the server")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--gravity", type=float, default=-10.0, help="gravity of the created simulators")
+    args = parser.parse_args()
+
+    for name, pool_env in CONFIGS.items():
+        env = {"SIMULATOR_WORKERS": str(args.workers), "SIMULATOR_MAX_SIMULATORS": "0", **pool_env}
+        process, api_url = common.start_server_process("simulator_server:app", common.SIMULATOR_SRC, env=env)
+        try:
+            # let the pool warm up, as it does between the requests of a running server
+            time.sleep(1.0)
+            for i in range(args.rounds):
+                throughput, latencies, create_times = asyncio.run(
+                    create_round(api_url, args.creates, args.concurrency, {"gravity": args.gravity}))
+                label = f"{name}, round {i + 1}"
+                common.report(f"{label} creates", throughput, "creates/s")
+                common.report(f"{label} p50", np.percentile(latencies, 50) * 1000, "ms")
+                common.report(f"{label} p99", np.percentile(latencies, 99) * 1000, "ms")
+                common.report(f"{label} server create p50", np.percentile(create_times, 50) * 1000, "ms")
+                common.report(f"{label} server create p99", np.percentile(create_times, 99) * 1000, "ms")
+            stats = httpx.get(f"{api_url}/env_pool").json()
+            common.report(f"{name} pool hit rate", stats["hit_rate"] * 100, "%")
+        finally:
+            common.stop_server_process(process)
+
+
+if __name__ == "__main__":
+    main()
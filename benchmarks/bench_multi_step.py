@@ -0,0 +1,77 @@
+"""
+Compare simulator steps/sec of the per-step endpoint against the multi-step endpoint.
+
+    python benchmarks/bench_multi_step.py --steps 5000 --chunk 32
+
+Starts simulator-server on localhost unless --api-url points at a running one.
+"""
+import argparse
+import time
+
+import httpx
+import numpy as np
+
+import common
+from simulator_wrapper import LunarLanderSimulatorWrapper
+
+
+def bench_single_step(wrapper, n_steps: int, rng) -> float:
+    wrapper.reset()
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        _, _, terminated, truncated, _ = wrapper.step(rng.integers(4))
+        if terminated or truncated:
+            wrapper.reset()
+    return n_steps / (time.perf_counter() - start)
+
+
+def bench_multi_step(wrapper, n_steps: int, chunk: int, rng) -> float:
+    wrapper.reset()
+    done_steps = 0
+    start = time.perf_counter()
+    while done_steps < n_steps:
+        states, rewards, terminated, truncated, _ = wrapper.step_many(rng.integers(4, size=chunk))
+        done_steps += len(rewards)
+        if terminated[-1] or truncated[-1]:
+            wrapper.reset()
+    return done_steps / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api-url", default=None, help="simulator-server URL (default: start one locally)")
+    parser.add_argument("--steps", type=int, default=5000)
+    parser.add_argument("--chunk", type=int, default=32, help="actions per multi-step request")
+    args = parser.parse_args()
+
+    server = None
+    api_url = args.api_url
+    if api_url is None:
+        import simulator_server
+        server, api_url = common.start_server(simulator_server.app)
+
+    try:
+        with httpx.Client(base_url=api_url) as client:
+            response = client.post("/simulators", json={"environment": "LunarLander-v3"})
+            response.raise_for_status()
+            simulator_id = response.json()["simulator_id"]
+
+        rng = np.random.default_rng(0)
+        wrapper = LunarLanderSimulatorWrapper(api_url=api_url, simulator_id=simulator_id)
+        try:
+            single = bench_single_step(wrapper, args.steps, rng)
+            multi = bench_multi_step(wrapper, args.steps, args.chunk, rng)
+        finally:
+            wrapper.close()
+            httpx.delete(f"{api_url}/simulators/{simulator_id}")
+
+        common.report("per-step POST /step", single, "steps/s")
+        common.report(f"multi-step POST /steps (chunk={args.chunk})", multi, "steps/s")
+        common.report("speedup", multi / single, "x")
+    finally:
+        if server is not None:
+            common.stop_server(server)
+
+
+if __name__ == "__main__":
+    main()
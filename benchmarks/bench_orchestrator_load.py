@@ -0,0 +1,100 @@
+"""
+Requests/sec of the orchestrator proxy routes under concurrency: a baseline proxy that opens
+a new httpx.AsyncClient per request (how the orchestrator used to work), the orchestrator with
+keep-alive to the upstream servers disabled, and the orchestrator with its default pooled clients.
+
+    python benchmarks/bench_orchestrator_load.py --concurrency 32 --duration 10
+
+Starts simulator-server, agent-server and orchestrator-server as separate processes on localhost.
+`POST /services/predict` is called for an unknown agent, so the agent-server answers right away
+and only the proxy path is measured.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from fastapi import FastAPI, Request
+import httpx
+
+import common
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# baseline: the same two routes, with a fresh client per proxied call
+baseline_app = FastAPI()
+
+@baseline_app.get("/health")
+async def baseline_health():
+    return {"status": "healthy"}
+
+@baseline_app.get("/simulators/{simulator_id}")
+async def baseline_get_simulator(simulator_id: str):
+    async with httpx.AsyncClient(base_url=os.environ["SIMULATOR_API_URL"]) as client:
+        response = await client.get(f"/simulators/{simulator_id}")
+    return response.json()
+
+@baseline_app.post("/services/predict")
+async def baseline_predict(request: Request):
+    body = await request.json()
+    async with httpx.AsyncClient(base_url=os.environ["AGENT_API_URL"]) as client:
+        response = await client.post(f"/agents/{body['agent_id']}/predict", json=body)
+    return response.json()
+
+
+async def load(url: str, method: str, path: str, body, concurrency: int, duration: float) -> float:
+    completed = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal completed
+        while time.perf_counter() < deadline:
+            response = await client.request(method, path, json=body)
+            response.raise_for_status()
+            completed += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        return completed / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight against the orchestrator")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per route and configuration")
+    args = parser.parse_args()
+
+    simulator, simulator_url = common.start_server_process("simulator_server:app", common.SIMULATOR_SRC)
+    agent, agent_url = common.start_server_process("agent_server:app", common.AGENT_SRC)
+    try:
+        simulator_id = httpx.post(f"{simulator_url}/simulators",
+                                  json={"environment": "LunarLander-v3"}).json()["simulator_id"]
+        routes = {
+            "GET /simulators/{id}": ("GET", f"/simulators/{simulator_id}", None),
+            "POST /services/predict": ("POST", "/services/predict",
+                                       {"agent_id": "unknown", "simulator_id": simulator_id,
+                                        "simulator_environment": "LunarLander-v3"}),
+        }
+        upstreams = {"SIMULATOR_API_URL": simulator_url, "AGENT_API_URL": agent_url}
+        configurations = {
+            "client per request": ("bench_orchestrator_load:baseline_app", BENCHMARKS_DIR, {}),
+            "no keep-alive": ("orchestrator-server:app", common.ORCHESTRATOR_SRC, {"UPSTREAM_MAX_KEEPALIVE": "0"}),
+            "pooled": ("orchestrator-server:app", common.ORCHESTRATOR_SRC, {}),
+        }
+        for label, (app, src_dir, env) in configurations.items():
+            orchestrator, url = common.start_server_process(app, src_dir, env={**upstreams, **env})
+            try:
+                for route, (method, path, body) in routes.items():
+                    throughput = asyncio.run(load(url, method, path, body, args.concurrency, args.duration))
+                    common.report(f"{route} ({label})", throughput, "req/s")
+            finally:
+                common.stop_server_process(orchestrator)
+    finally:
+        common.stop_server_process(agent)
+        common.stop_server_process(simulator)
+
+
+if __name__ == "__main__":
+    main()
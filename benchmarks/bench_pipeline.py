@@ -0,0 +1,291 @@
+"""
+End-to-end benchmark suite of the three services, written to a JSON file so runs can be compared.
+
+    python benchmarks/bench_pipeline.py --output results.json
+    python benchmarks/bench_pipeline.py --output new.json --compare results.json
+
+Starts simulator-server, agent-server and orchestrator-server as processes on localhost (no
+Docker, no external network) and measures:
+
+* simulator_step: LunarLanderSimulator.step in-process, the ceiling of every other path.
+* wrapper_step: LunarLanderSimulatorWrapper.step against the simulator-server over HTTP and
+  the WebSocket channel.
+* orchestrator: latency and rate of GET /simulators/{id} sent to the simulator-server directly
+  and through the orchestrator at each --concurrency; the difference is the proxy's cost.
+* train: DQN training steps/s of one job on the agent-server, over HTTP and in-process
+  (local://, the learner alone), from the start and end times of the job.
+* scale_simulators / scale_agents: aggregate steps/s of N client processes each stepping its
+  own simulator, and of N agents training at the same time, for each N of --scale.
+
+With --compare every metric found in both files is printed with its change.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+import common
+from simulator import LunarLanderSimulator
+from simulator_wrapper import LunarLanderSimulatorWrapper
+
+# metrics where lower is better, the others are rates
+LOWER_IS_BETTER_UNITS = ("ms", "s")
+
+
+class Results:
+    """Metrics of one run, keyed by "benchmark/metric", printed as they come."""
+    def __init__(self):
+        self.metrics = {}
+
+    def record(self, name: str, value: float, unit: str):
+        common.report(name, value, unit)
+        self.metrics[name] = {"value": float(value), "unit": unit}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=common.REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def step_loop(step, reset, n_steps: int, seed: int) -> float:
+    """Steps/s of n_steps random actions, resetting at the end of each episode."""
+    rng = np.random.default_rng(seed)
+    actions = rng.integers(4, size=n_steps)
+    reset()
+    start = time.perf_counter()
+    for action in actions:
+        _, _, terminated, truncated, _ = step(int(action))
+        if terminated or truncated:
+            reset()
+    return n_steps / (time.perf_counter() - start)
+
+
+def bench_simulator_step(results: Results, n_steps: int):
+    simulator = LunarLanderSimulator(continuous=False, gravity=-10.0, enable_wind=False, wind_power=15.0,
+                                     turbulence_power=1.5)
+    try:
+        results.record("simulator_step/raw", step_loop(simulator.step, simulator.reset, n_steps, 0), "steps/s")
+    finally:
+        simulator.close()
+
+
+def bench_wrapper_step(results: Results, simulator_url: str, n_steps: int):
+    simulator_id = httpx.post(f"{simulator_url}/simulators", json={"environment": "LunarLander-v3"}).json()["simulator_id"]
+    try:
+        for transport in ("http", "websocket"):
+            wrapper = LunarLanderSimulatorWrapper(simulator_url, simulator_id, transport=transport)
+            try:
+                step_loop(wrapper.step, wrapper.reset, min(200, n_steps), 1)  # warm-up
+                results.record(f"wrapper_step/{transport}", step_loop(wrapper.step, wrapper.reset, n_steps, 0), "steps/s")
+            finally:
+                wrapper.close()
+    finally:
+        httpx.delete(f"{simulator_url}/simulators/{simulator_id}")
+
+
+async def load(url: str, path: str, concurrency: int, duration: float) -> tuple:
+    """Latencies of GET path from `concurrency` clients for `duration` seconds, and the request rate."""
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def worker(client: httpx.AsyncClient):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return np.array(latencies), len(latencies) / elapsed
+
+
+def bench_orchestrator(results: Results, simulator_url: str, orchestrator_url: str, concurrencies: list,
+                       duration: float):
+    simulator_id = httpx.post(f"{simulator_url}/simulators", json={"environment": "LunarLander-v3"}).json()["simulator_id"]
+    try:
+        for concurrency in concurrencies:
+            for name, url in (("direct", simulator_url), ("proxied", orchestrator_url)):
+                latencies, rate = asyncio.run(load(url, f"/simulators/{simulator_id}", concurrency, duration))
+                label = f"orchestrator/c={concurrency}/{name}"
+                results.record(f"{label} p50", np.percentile(latencies, 50) * 1000, "ms")
+                results.record(f"{label} p99", np.percentile(latencies, 99) * 1000, "ms")
+                results.record(f"{label} rate", rate, "req/s")
+    finally:
+        httpx.delete(f"{simulator_url}/simulators/{simulator_id}")
+
+
+def wait_for_jobs(agent_url: str, job_ids: list, timeout: float = 3600) -> list:
+    deadline = time.monotonic() + timeout
+    jobs = []
+    for job_id in job_ids:
+        while True:
+            job = httpx.get(f"{agent_url}/jobs/{job_id}").json()
+            if job["finished_at"] is not None:
+                break
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Job {job_id} did not finish within {timeout}s")
+            time.sleep(0.2)
+        if job["status"] != "done":
+            raise RuntimeError(f"Job {job_id} {job['status']}: {job['error_message']}")
+        jobs.append(job)
+    return jobs
+
+
+def train_jobs(orchestrator_url: str, agent_url: str, simulator_url: str, agents: int, total_timesteps: int,
+               api_url: str = None) -> float:
+    """Aggregate steps/s of `agents` agents training at the same time, each on its own simulator."""
+    orchestrator = httpx.Client(base_url=orchestrator_url, timeout=60)
+    agent_ids, simulator_ids, job_ids = [], [], []
+    try:
+        for _ in range(agents):
+            agent_ids.append(orchestrator.post("/agents").json()["agent_id"])
+            simulator_ids.append(orchestrator.post("/simulators", json={"environment": "LunarLander-v3"}).json()["simulator_id"])
+        for i, (agent_id, simulator_id) in enumerate(zip(agent_ids, simulator_ids)):
+            response = orchestrator.post("/services/train", json={
+                "agent_id": agent_id, "simulator_id": simulator_id, "simulator_environment": "LunarLander-v3",
+                "api_url": api_url or simulator_url, "total_timesteps": total_timesteps, "filename": f"bench-pipeline-{i}",
+                "checkpoint_interval_steps": 0})
+            job_ids.append(response.json()["job_id"])
+        jobs = wait_for_jobs(agent_url, job_ids)
+    finally:
+        for agent_id in agent_ids:
+            orchestrator.delete(f"/agents/{agent_id}")
+        for simulator_id in simulator_ids:
+            orchestrator.delete(f"/simulators/{simulator_id}")
+        orchestrator.close()
+    started = min(datetime.datetime.fromisoformat(job["started_at"]) for job in jobs)
+    finished = max(datetime.datetime.fromisoformat(job["finished_at"]) for job in jobs)
+    return agents * total_timesteps / (finished - started).total_seconds()
+
+
+def run_step_client(api_url: str, duration: float, seed: int, results):
+    simulator_id = httpx.post(f"{api_url}/simulators", json={"environment": "LunarLander-v3"},
+                              timeout=60).json()["simulator_id"]
+    wrapper = LunarLanderSimulatorWrapper(api_url, simulator_id)
+    rng = np.random.default_rng(seed)
+    steps = 0
+    wrapper.reset()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        _, _, terminated, truncated, _ = wrapper.step(int(rng.integers(4)))
+        steps += 1
+        if terminated or truncated:
+            wrapper.reset()
+    wrapper.close()
+    httpx.delete(f"{api_url}/simulators/{simulator_id}")
+    results.put(steps)
+
+
+def bench_scale_simulators(results: Results, simulator_url: str, scale: list, duration: float):
+    for clients in scale:
+        # one process per client, so the clients don't share a GIL
+        queue = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=run_step_client, args=(simulator_url, duration, i, queue))
+                     for i in range(clients)]
+        for process in processes:
+            process.start()
+        total = sum(queue.get() for _ in processes)
+        for process in processes:
+            process.join()
+        results.record(f"scale_simulators/n={clients}", total / duration, "steps/s")
+
+
+def compare(metrics: dict, baseline_path: str):
+    with open(baseline_path) as file:
+        baseline = json.load(file)["metrics"]
+    print(f"\nChange against {baseline_path} (+ is better):")
+    for name, metric in metrics.items():
+        if name not in baseline or not baseline[name]["value"]:
+            continue
+        change = metric["value"] / baseline[name]["value"] - 1
+        if metric["unit"] in LOWER_IS_BETTER_UNITS:
+            change = -change
+        print(f"{name:<40} {baseline[name]['value']:>12.1f} -> {metric['value']:>12.1f} {metric['unit']:<8} {change:>+7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench_pipeline.json", help="JSON file the results are written to")
+    parser.add_argument("--compare", default=None, help="results of an earlier run to compare against")
+    parser.add_argument("--steps", type=int, default=5000, help="steps of the step rate benchmarks")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of load per orchestrator and scaling run")
+    parser.add_argument("--concurrency", default="1,8,32", help="concurrent requests of the orchestrator benchmark")
+    parser.add_argument("--train-steps", type=int, default=5000, help="total_timesteps of each training job")
+    parser.add_argument("--scale", default="1,2,4", help="numbers of concurrent simulators and agents")
+    parser.add_argument("--skip", default="", help="benchmarks to leave out, e.g. train,scale_agents")
+    args = parser.parse_args()
+    concurrencies = [int(n) for n in args.concurrency.split(",")]
+    scale = [int(n) for n in args.scale.split(",")]
+    skip = set(filter(None, args.skip.split(",")))
+
+    results = Results()
+    if "simulator_step" not in skip:
+        bench_simulator_step(results, args.steps)
+
+    processes = []
+    # trained models and checkpoints go to a scratch dir
+    workdir = tempfile.TemporaryDirectory(prefix="bench-pipeline-")
+    try:
+        simulator, simulator_url = common.start_server_process("simulator_server:app", common.SIMULATOR_SRC)
+        processes.append(simulator)
+        agent, agent_url = common.start_server_process(
+            "agent_server:app", common.AGENT_SRC, cwd=workdir.name,
+            env={"PYTHONPATH": common.SIMULATOR_SRC, "AGENT_MAX_TRAIN_JOBS": str(max(scale))})
+        processes.append(agent)
+        orchestrator, orchestrator_url = common.start_server_process(
+            "orchestrator-server:app", common.ORCHESTRATOR_SRC,
+            env={"SIMULATOR_API_URL": simulator_url, "AGENT_API_URL": agent_url})
+        processes.append(orchestrator)
+
+        if "wrapper_step" not in skip:
+            bench_wrapper_step(results, simulator_url, args.steps)
+        if "orchestrator" not in skip:
+            bench_orchestrator(results, simulator_url, orchestrator_url, concurrencies, args.duration)
+        if not {"train", "scale_agents"} <= skip:
+            # start the job worker processes (spawn, torch import) before any training is timed
+            train_jobs(orchestrator_url, agent_url, simulator_url, max(scale), 200, "local://")
+        if "train" not in skip:
+            for name, api_url in (("http", None), ("local", "local://")):
+                results.record(f"train/{name}", train_jobs(orchestrator_url, agent_url, simulator_url, 1, args.train_steps, api_url),
+                               "steps/s")
+        if "scale_simulators" not in skip:
+            bench_scale_simulators(results, simulator_url, scale, args.duration)
+        if "scale_agents" not in skip:
+            for agents in scale:
+                results.record(f"scale_agents/n={agents}",
+                               train_jobs(orchestrator_url, agent_url, simulator_url, agents, args.train_steps), "steps/s")
+    finally:
+        for process in processes:
+            common.stop_server_process(process)
+        workdir.cleanup()
+
+    with open(args.output, "w") as file:
+        json.dump({
+            "meta": {"time": datetime.datetime.now().isoformat(), "commit": git_commit(),
+                     "python": platform.python_version(), "platform": platform.platform(),
+                     "cpus": os.cpu_count(), "args": vars(args)},
+            "metrics": results.metrics
+        }, file, indent=2)
+    print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(results.metrics, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Transitions/sec of the shared-memory ring buffer transport vs. the network transports.
+
+    python benchmarks/bench_shm_ring.py --steps 5000 --chunk 64
+
+Starts simulator-server as a separate process on localhost (SIMULATOR_WORKERS is passed through).
+"""
+import argparse
+import os
+import time
+
+import httpx
+import numpy as np
+
+import common
+from simulator_wrapper import LunarLanderSimulatorWrapper
+
+
+def transitions_per_sec(wrapper, n_steps: int, chunk: int, rng) -> float:
+    wrapper.reset()
+    done_steps = 0
+    start = time.perf_counter()
+    while done_steps < n_steps:
+        if chunk == 1:
+            _, _, terminated, truncated, _ = wrapper.step(rng.integers(4))
+            done_steps += 1
+        else:
+            _, rewards, terminated, truncated, _ = wrapper.step_many(rng.integers(4, size=chunk))
+            done_steps += len(rewards)
+            terminated, truncated = terminated[-1], truncated[-1]
+        if terminated or truncated:
+            wrapper.reset()
+    return done_steps / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=5000)
+    parser.add_argument("--chunk", type=int, default=64, help="actions per multi-step call")
+    args = parser.parse_args()
+
+    server, api_url = common.start_server_process("simulator_server:app", common.SIMULATOR_SRC,
+                                                  env={"SIMULATOR_WORKERS": os.getenv("SIMULATOR_WORKERS", "0")})
+    try:
+        simulator_id = httpx.post(f"{api_url}/simulators",
+                                  json={"environment": "LunarLander-v3"}).json()["simulator_id"]
+        shm_simulator_id = httpx.post(f"{api_url}/simulators",
+                                      json={"environment": "LunarLander-v3",
+                                            "config": {"transport": "shm"}}).json()["simulator_id"]
+        transports = {
+            "http/binary": (api_url, simulator_id, {"wire_format": "binary"}),
+            "websocket": (api_url, simulator_id, {"transport": "websocket"}),
+            "shm": (api_url, shm_simulator_id, {"transport": "shm"}),
+            "local (in-process)": ("local://", "local", {}),
+        }
+        for name, (url, target_id, kwargs) in transports.items():
+            wrapper = LunarLanderSimulatorWrapper(url, target_id, **kwargs)
+            try:
+                for chunk in (1, args.chunk):
+                    throughput = transitions_per_sec(wrapper, args.steps, chunk, np.random.default_rng(0))
+                    common.report(f"{name} (chunk={chunk})", throughput, "transitions/s")
+            finally:
+                wrapper.close()
+    finally:
+        common.stop_server_process(server)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Per-step latency histogram (p50/p99) of the HTTP transport vs. the WebSocket step channel.
+
+    python benchmarks/bench_step_latency.py --steps 5000
+
+Starts simulator-server on localhost unless --api-url points at a running one.
+"""
+import argparse
+import time
+
+import httpx
+import numpy as np
+
+import common
+from simulator_wrapper import LunarLanderSimulatorWrapper
+
+
+def measure_latencies(wrapper, n_steps: int, rng) -> np.ndarray:
+    latencies = np.empty(n_steps)
+    wrapper.reset()
+    for i in range(n_steps):
+        start = time.perf_counter()
+        _, _, terminated, truncated, _ = wrapper.step(rng.integers(4))
+        latencies[i] = time.perf_counter() - start
+        if terminated or truncated:
+            wrapper.reset()
+    return latencies * 1e6  # microseconds
+
+
+def print_histogram(name: str, latencies_us: np.ndarray, bins: int = 12, width: int = 50):
+    p50, p90, p99 = np.percentile(latencies_us, [50, 90, 99])
+    print(f"\n{name}: p50={p50:.0f}us p90={p90:.0f}us p99={p99:.0f}us max={latencies_us.max():.0f}us")
+
+    # log-spaced bins so the tail stays visible next to the bulk
+    edges = np.geomspace(latencies_us.min(), latencies_us.max() * 1.0001, bins + 1)
+    counts, _ = np.histogram(latencies_us, bins=edges)
+    for count, low, high in zip(counts, edges[:-1], edges[1:]):
+        bar = "#" * int(round(width * count / counts.max()))
+        print(f"  {low:>8.0f} - {high:>8.0f} us | {bar} {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api-url", default=None, help="simulator-server URL (default: start one locally)")
+    parser.add_argument("--steps", type=int, default=5000)
+    args = parser.parse_args()
+
+    server = None
+    api_url = args.api_url
+    if api_url is None:
+        import simulator_server
+        server, api_url = common.start_server(simulator_server.app)
+
+    try:
+        simulator_id = httpx.post(f"{api_url}/simulators", json={"environment": "LunarLander-v3"}).json()["simulator_id"]
+        try:
+            for name, kwargs in (("http/json", {"transport": "http"}),
+                                 ("http/binary", {"transport": "http", "wire_format": "binary"}),
+                                 ("websocket", {"transport": "websocket"})):
+                wrapper = LunarLanderSimulatorWrapper(api_url, simulator_id, **kwargs)
+                try:
+                    measure_latencies(wrapper, min(200, args.steps), np.random.default_rng(1))  # warm-up
+                    print_histogram(name, measure_latencies(wrapper, args.steps, np.random.default_rng(0)))
+                finally:
+                    wrapper.close()
+        finally:
+            httpx.delete(f"{api_url}/simulators/{simulator_id}")
+    finally:
+        if server is not None:
+            common.stop_server(server)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compare JSON and binary (application/x-rlops-frame) responses on the step paths.
+
+    python benchmarks/bench_wire_format.py --steps 3000 --chunk 256 --num-envs 32
+
+Starts simulator-server on localhost unless --api-url points at a running one.
+"""
+import argparse
+import time
+
+import httpx
+import numpy as np
+
+import common
+from simulator_wrapper import LunarLanderSimulatorWrapper
+from vec_simulator_wrapper import LunarLanderVecSimulatorWrapper
+
+
+def bench_step(wrapper, n_steps: int, rng) -> float:
+    wrapper.reset()
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        _, _, terminated, truncated, _ = wrapper.step(rng.integers(4))
+        if terminated or truncated:
+            wrapper.reset()
+    return n_steps / (time.perf_counter() - start)
+
+
+def bench_step_many(wrapper, n_steps: int, chunk: int, rng) -> float:
+    wrapper.reset()
+    done_steps = 0
+    start = time.perf_counter()
+    while done_steps < n_steps:
+        _, rewards, terminated, truncated, _ = wrapper.step_many(rng.integers(4, size=chunk))
+        done_steps += len(rewards)
+        if terminated[-1] or truncated[-1]:
+            wrapper.reset()
+    return done_steps / (time.perf_counter() - start)
+
+
+def bench_vector_step(vec_env, n_steps: int, rng) -> float:
+    vec_env.reset()
+    n_requests = max(1, n_steps // vec_env.num_envs)
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        vec_env.step(rng.integers(4, size=vec_env.num_envs))
+    return n_requests * vec_env.num_envs / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api-url", default=None, help="simulator-server URL (default: start one locally)")
+    parser.add_argument("--steps", type=int, default=3000)
+    parser.add_argument("--chunk", type=int, default=256, help="actions per multi-step request")
+    parser.add_argument("--num-envs", type=int, default=32, help="sub-envs of the vector simulator")
+    args = parser.parse_args()
+
+    server = None
+    api_url = args.api_url
+    if api_url is None:
+        import simulator_server
+        server, api_url = common.start_server(simulator_server.app)
+
+    try:
+        with httpx.Client(base_url=api_url) as client:
+            simulator_id = client.post("/simulators", json={"environment": "LunarLander-v3"}).json()["simulator_id"]
+            vector_id = client.post("/vector_simulators", json={"environment": "LunarLander-v3",
+                                                                "num_envs": args.num_envs}).json()["simulator_id"]
+        try:
+            for wire_format in ("json", "binary"):
+                rng = np.random.default_rng(0)
+                wrapper = LunarLanderSimulatorWrapper(api_url, simulator_id, wire_format=wire_format)
+                vec_env = LunarLanderVecSimulatorWrapper(api_url, vector_id, wire_format=wire_format)
+                try:
+                    common.report(f"{wire_format}: POST /step", bench_step(wrapper, args.steps, rng), "steps/s")
+                    common.report(f"{wire_format}: POST /steps (chunk={args.chunk})",
+                                  bench_step_many(wrapper, args.steps * 10, args.chunk, rng), "steps/s")
+                    common.report(f"{wire_format}: vector step (num_envs={args.num_envs})",
+                                  bench_vector_step(vec_env, args.steps * 10, rng), "steps/s")
+                finally:
+                    wrapper.close()
+                    vec_env.close()
+        finally:
+            httpx.delete(f"{api_url}/simulators/{simulator_id}")
+            httpx.delete(f"{api_url}/vector_simulators/{vector_id}")
+    finally:
+        if server is not None:
+            common.stop_server(server)
+
+
+if __name__ == "__main__":
+    main()
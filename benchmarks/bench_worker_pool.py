@@ -0,0 +1,70 @@
+"""
+Aggregate step throughput of many concurrent agents, with simulators in the API process
+(SIMULATOR_WORKERS=0) vs. sharded across a pool of worker processes.
+
+    python benchmarks/bench_worker_pool.py --clients 8 --workers 4
+
+Each client is a separate process that owns one simulator and drives it with
+multi-step requests, so the server side is the bottleneck.
+"""
+import argparse
+import multiprocessing
+import time
+
+import httpx
+import numpy as np
+
+import common
+from simulator_wrapper import LunarLanderSimulatorWrapper
+
+
+def run_client(api_url: str, duration: float, chunk: int, seed: int, results):
+    simulator_id = httpx.post(f"{api_url}/simulators", json={"environment": "LunarLander-v3"},
+                              timeout=60).json()["simulator_id"]
+    wrapper = LunarLanderSimulatorWrapper(api_url, simulator_id, wire_format="binary")
+    rng = np.random.default_rng(seed)
+    steps = 0
+    wrapper.reset()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        _, rewards, terminated, truncated, _ = wrapper.step_many(rng.integers(4, size=chunk))
+        steps += len(rewards)
+        if terminated[-1] or truncated[-1]:
+            wrapper.reset()
+    wrapper.close()
+    httpx.delete(f"{api_url}/simulators/{simulator_id}")
+    results.put(steps)
+
+
+def measure(api_url: str, clients: int, duration: float, chunk: int) -> float:
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=run_client, args=(api_url, duration, chunk, i, results))
+                 for i in range(clients)]
+    for process in processes:
+        process.start()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of stepping per configuration")
+    parser.add_argument("--chunk", type=int, default=64, help="actions per multi-step request")
+    args = parser.parse_args()
+
+    for workers in (0, args.workers):
+        process, api_url = common.start_server_process("simulator_server:app", common.SIMULATOR_SRC,
+                                                       env={"SIMULATOR_WORKERS": str(workers)})
+        try:
+            throughput = measure(api_url, args.clients, args.duration, args.chunk)
+        finally:
+            common.stop_server_process(process)
+        common.report(f"SIMULATOR_WORKERS={workers}, {args.clients} clients", throughput, "steps/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Check that predict jobs run to completion through the agent-server job scheduler.
+
+    python benchmarks/check_predict_job.py
+
+Trains a small model, then runs predict jobs (a single simulator, parallel episodes on
+simulators provisioned for the evaluation, a derived seed set over the WebSocket channel)
+and checks that each job ends as "done" with a result, the agent is idle again and the
+provisioned simulators were deleted. Exits non-zero if any check fails.
+"""
+import argparse
+import sys
+import tempfile
+import time
+
+import httpx
+
+import common
+
+
+def run_job(agent: httpx.Client, agent_id: str, route: str, body: dict, timeout: float = 600) -> dict:
+    job_id = agent.post(f"/agents/{agent_id}/{route}", json={"agent_id": agent_id, **body}).json()["job_id"]
+    deadline = time.monotonic() + timeout
+    while True:
+        job = agent.get(f"/jobs/{job_id}").json()
+        if job["finished_at"] is not None:
+            return job
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Job {job_id} did not finish within {timeout}s")
+        time.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-steps", type=int, default=500)
+    args = parser.parse_args()
+
+    processes = []
+    # the trained model goes to a scratch dir
+    workdir = tempfile.TemporaryDirectory(prefix="check-predict-")
+    failures = []
+    try:
+        simulator, simulator_url = common.start_server_process("simulator_server:app", common.SIMULATOR_SRC)
+        processes.append(simulator)
+        agent_server, agent_url = common.start_server_process("agent_server:app", common.AGENT_SRC, cwd=workdir.name,
+                                                              env={"AGENT_CHECKPOINT_INTERVAL_STEPS": "0"})
+        processes.append(agent_server)
+        simulators = httpx.Client(base_url=simulator_url, timeout=60)
+        agent = httpx.Client(base_url=agent_url, timeout=60)
+
+        simulator_id = simulators.post("/simulators", json={"environment": "LunarLander-v3"}).json()["simulator_id"]
+        agent_id = agent.post("/agents").json()["agent_id"]
+        job = run_job(agent, agent_id, "train", {"simulator_id": simulator_id, "simulator_environment": "LunarLander-v3",
+                                                 "api_url": simulator_url, "total_timesteps": args.train_steps})
+        if job["status"] != "done":
+            sys.exit(f"FAIL training: {job['status']} {job['error_message']}")
+
+        simulators.post("/seed_sets", json={"name": "check", "count": 3, "base_seed": 0}).raise_for_status()
+        simulator_count = len(simulators.get("/simulators").json()["simulators"])
+        cases = {
+            "single simulator": {"eval_episodes": 2},
+            "parallel, provisioned simulators": {"eval_episodes": 4, "parallelism": 2, "seed": 0},
+            "seed set over websocket": {"seed_set": "check", "transport": "websocket"},
+        }
+        for name, kwargs in cases.items():
+            job = run_job(agent, agent_id, "predict", {"simulator_id": simulator_id, "simulator_environment": "LunarLander-v3",
+                                                       "api_url": simulator_url, **kwargs})
+            status = agent.get(f"/agents/{agent_id}").json()
+            leftover = len(simulators.get("/simulators").json()["simulators"]) - simulator_count
+            if job["status"] != "done" or not (status["result_message"] or "").startswith("Mean reward"):
+                failures.append(f"{name}: job {job['status']}, error {job['error_message']}")
+            elif status["status"] != "idle":
+                failures.append(f"{name}: agent is {status['status']} after the job")
+            elif leftover:
+                failures.append(f"{name}: {leftover} provisioned simulators were not deleted")
+            else:
+                print(f"OK   {name}: {status['result_message']}")
+    finally:
+        for process in processes:
+            common.stop_server_process(process)
+        workdir.cleanup()
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
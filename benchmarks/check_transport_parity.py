@@ -0,0 +1,88 @@
+"""
+Check that every simulator transport produces identical trajectories for a fixed seed.
+
+    python benchmarks/check_transport_parity.py --seed 42 --steps 500
+
+Runs the same seeded reset and action sequence through the HTTP (json and binary),
+WebSocket, shared-memory and in-process (local://) transports and compares states, rewards and done
+flags exactly. Exits non-zero on the first mismatch.
+"""
+import argparse
+import sys
+
+import httpx
+import numpy as np
+
+import common
+from simulator_wrapper import LunarLanderSimulatorWrapper
+
+
+def rollout(wrapper, seed: int, actions):
+    states, rewards, dones = [], [], []
+    state, _ = wrapper.reset(seed=seed)
+    states.append(state)
+    episode = 0
+    for action in actions:
+        state, reward, terminated, truncated, _ = wrapper.step(action)
+        states.append(state)
+        rewards.append(reward)
+        dones.append((terminated, truncated))
+        if terminated or truncated:
+            # later episodes get their own seed so the whole run stays deterministic
+            episode += 1
+            state, _ = wrapper.reset(seed=seed + episode)
+            states.append(state)
+    return np.array(states), np.array(rewards), np.array(dones)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--enable-wind", action="store_true")
+    args = parser.parse_args()
+
+    config = {"enable_wind": args.enable_wind}
+    actions = np.random.default_rng(args.seed).integers(4, size=args.steps).tolist()
+
+    # a separate server process, like in a deployment (the shm segment must not share our resource tracker)
+    server, api_url = common.start_server_process("simulator_server:app", common.SIMULATOR_SRC)
+    try:
+        simulator_id = httpx.post(f"{api_url}/simulators",
+                                  json={"environment": "LunarLander-v3", "config": config}).json()["simulator_id"]
+        shm_simulator_id = httpx.post(f"{api_url}/simulators",
+                                      json={"environment": "LunarLander-v3",
+                                            "config": {**config, "transport": "shm"}}).json()["simulator_id"]
+        local_url = f"local://?enable_wind={str(args.enable_wind).lower()}"
+        transports = {
+            "http/json": (api_url, {"transport": "http"}),
+            "http/binary": (api_url, {"transport": "http", "wire_format": "binary"}),
+            "websocket": (api_url, {"transport": "websocket"}),
+            "local": (local_url, {}),
+            "shm": (api_url, {"transport": "shm"}),
+        }
+
+        results = {}
+        for name, (url, kwargs) in transports.items():
+            target_id = shm_simulator_id if name == "shm" else simulator_id
+            wrapper = LunarLanderSimulatorWrapper(url, target_id, **kwargs)
+            try:
+                results[name] = rollout(wrapper, args.seed, actions)
+            finally:
+                wrapper.close()
+        httpx.delete(f"{api_url}/simulators/{simulator_id}")
+        httpx.delete(f"{api_url}/simulators/{shm_simulator_id}")
+    finally:
+        common.stop_server_process(server)
+
+    reference_name, reference = next(iter(results.items()))
+    ok = True
+    for name, result in results.items():
+        same = all(np.array_equal(a, b) for a, b in zip(reference, result))
+        print(f"{name:<12} {'identical' if same else 'MISMATCH'} to {reference_name}")
+        ok = ok and same
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import uvicorn
+
+# make the service sources importable the same way they are inside their containers
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIMULATOR_SRC = os.path.join(REPO_ROOT, "simulator-server", "src")
+AGENT_SRC = os.path.join(REPO_ROOT, "agent-server", "src")
+ORCHESTRATOR_SRC = os.path.join(REPO_ROOT, "orchestrator-server", "src")
+
+for path in (SIMULATOR_SRC, AGENT_SRC, ORCHESTRATOR_SRC):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app, port: int = None, timeout: float = 10.0):
+    """
+    Run a FastAPI app with uvicorn on localhost in a daemon thread.
+    Returns (server, base_url); call server.should_exit = True to stop it.
+    """
+    port = port or free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+
+    deadline = time.monotonic() + timeout
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Server on port {port} did not start within {timeout}s")
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def stop_server(server):
+    server.should_exit = True
+
+
+def start_server_process(app: str, src_dir: str, port: int = None, env: dict = None, timeout: float = 30.0,
+                         cwd: str = None):
+    """
+    Run `uvicorn <app>` from a service's src directory in a subprocess, e.g. to apply
+    environment variables that are read at import time. Returns (process, base_url).
+    With cwd the server runs from that directory instead (e.g. a scratch dir for the
+    agent-server's trained_models/) and imports its sources through PYTHONPATH.
+    """
+    port = port or free_port()
+    env = {**os.environ, **(env or {})}
+    if cwd is not None:
+        env["PYTHONPATH"] = os.pathsep.join(path for path in (src_dir, env.get("PYTHONPATH")) if path)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=cwd or src_dir, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(f"{base_url}/health").raise_for_status()
+            return process, base_url
+        except httpx.HTTPError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError(f"{app} did not start on port {port}")
+            time.sleep(0.1)
+
+
+def stop_server_process(process, timeout: float = 10.0):
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def report(name: str, value: float, unit: str):
+    print(f"{name:<40} {value:>12.1f} {unit}")
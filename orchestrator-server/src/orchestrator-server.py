@@ -1,14 +1,140 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 import uvicorn
-from typing import Dict, Any, Optional
+from typing import Annotated, Dict, Any, List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import collections
 import httpx
 import os
+import time
+import uuid
+from prometheus_client import Gauge, Histogram
+
+from metrics import LATENCY_BUCKETS, RouteMetricsMiddleware, metrics_response
+from tracing import TracingMiddleware, trace_headers
 
 SIMULATOR_API_URL = os.getenv("SIMULATOR_API_URL")
 AGENT_API_URL = os.getenv("AGENT_API_URL")
 
-app = FastAPI()
+# settings of the pooled clients to the upstream servers
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))      # open connections per upstream
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))           # idle connections kept open, 0 disables keep-alive
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))   # seconds an idle connection is kept
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "false").lower() in ("1", "true", "yes")
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "30"))                    # read/write/pool timeout in seconds
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))                        # retries of failed connection attempts
+UPSTREAM_MAX_OTHER_CLIENTS = int(os.getenv("UPSTREAM_MAX_OTHER_CLIENTS", "4"))    # clients kept for upstream urls passed by callers
+
+# base url -> long-lived pooled client of SIMULATOR_API_URL and AGENT_API_URL, closed on shutdown
+clients: Dict[str, httpx.AsyncClient] = {}
+# clients of the other upstream urls callers pass (e.g. agent_api_url), least recently used first
+other_clients: Dict[str, httpx.AsyncClient] = collections.OrderedDict()
+# task -> client evicted from other_clients it closes
+closing_tasks: Dict[asyncio.Task, httpx.AsyncClient] = {}
+
+UPSTREAM_LATENCY = Histogram("orchestrator_upstream_request_duration_seconds",
+                             "Time until the response headers of the upstream servers arrive",
+                             ["upstream", "method", "status"], buckets=LATENCY_BUCKETS)
+
+
+class TimedTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps the pooled transport of an upstream: records the latency of every request and
+    passes the trace id of the request being served on to the upstream.
+    """
+    def __init__(self, transport: httpx.AsyncBaseTransport, upstream: str):
+        self.transport = transport
+        self.upstream = upstream  # metric label: "simulator", "agent" or "other", never a caller-supplied url
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.headers.update(trace_headers())
+        start = time.perf_counter()
+        status = "error"  # connection failures and timeouts
+        try:
+            response = await self.transport.handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            UPSTREAM_LATENCY.labels(self.upstream, request.method, status).observe(time.perf_counter() - start)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def upstream_label(base_url: str) -> str:
+    if base_url == SIMULATOR_API_URL:
+        return "simulator"
+    if base_url == AGENT_API_URL:
+        return "agent"
+    return "other"
+
+
+def make_client(base_url: str) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=UPSTREAM_MAX_CONNECTIONS,
+                          max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+                          keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY)
+    # only connection failures are retried, so non-idempotent requests are never sent twice
+    transport = httpx.AsyncHTTPTransport(limits=limits, http2=UPSTREAM_HTTP2, retries=UPSTREAM_RETRIES)
+    return httpx.AsyncClient(base_url=base_url, transport=TimedTransport(transport, upstream_label(base_url)),
+                             timeout=httpx.Timeout(UPSTREAM_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT))
+
+
+async def close_later(client: httpx.AsyncClient):
+    # requests sent before the eviction get the time of a request to finish
+    await asyncio.sleep(UPSTREAM_TIMEOUT)
+    await client.aclose()
+
+
+def upstream(base_url: str) -> httpx.AsyncClient:
+    """
+    Return the pooled client for an upstream server, creating it on first use. Only the
+    configured servers keep theirs; other urls share at most UPSTREAM_MAX_OTHER_CLIENTS clients
+    and the least recently used one is closed when a new url comes.
+    """
+    client = clients.get(base_url)
+    if client is not None:
+        return client
+    if base_url in (SIMULATOR_API_URL, AGENT_API_URL):
+        client = clients[base_url] = make_client(base_url)
+        return client
+
+    client = other_clients.get(base_url)
+    if client is not None:
+        other_clients.move_to_end(base_url)
+        return client
+    client = other_clients[base_url] = make_client(base_url)
+    while len(other_clients) > UPSTREAM_MAX_OTHER_CLIENTS:
+        _, evicted = other_clients.popitem(last=False)
+        task = asyncio.get_running_loop().create_task(close_later(evicted))
+        closing_tasks[task] = evicted
+        task.add_done_callback(lambda task: closing_tasks.pop(task, None))
+    return client
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for base_url in (SIMULATOR_API_URL, AGENT_API_URL):
+        if base_url:
+            upstream(base_url)
+    yield
+    tasks = list(sweep_tasks.values())
+    for task in tasks:
+        task.cancel()
+    # let the cancelled sweeps release their runs' resources before the clients close
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for task in closing_tasks:
+        task.cancel()
+    for client in list(clients.values()) + list(other_clients.values()) + list(closing_tasks.values()):
+        await client.aclose()
+    clients.clear()
+    other_clients.clear()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RouteMetricsMiddleware)
 
 @app.get("/")
 def read_root():
@@ -16,8 +142,7 @@ def read_root():
 
 @app.post("/agents")
 async def create_agent(agent_api_url: str = AGENT_API_URL):
-    async with httpx.AsyncClient(base_url=agent_api_url) as client:
-        response = await client.post("/agents")
+    response = await upstream(agent_api_url).post("/agents")
     return response.json()
 
 
@@ -27,45 +152,131 @@ class SimulatorConfig(BaseModel):
 
 @app.post("/simulators")
 async def create_simulator(simulator_config: SimulatorConfig, simulator_api_url: str = SIMULATOR_API_URL):
-    async with httpx.AsyncClient(base_url=simulator_api_url) as client:
-        response = await client.post("/simulators", json=simulator_config.model_dump())
+    response = await upstream(simulator_api_url).post("/simulators", json=simulator_config.model_dump())
     return response.json()
 
 
 @app.get("/simulators")
 async def list_simulators(simulator_api_url: str = SIMULATOR_API_URL):
-    async with httpx.AsyncClient(base_url=simulator_api_url) as client:
-        response = await client.get("/simulators")
+    response = await upstream(simulator_api_url).get("/simulators")
     return response.json()
 
 @app.get("/agents")
 async def list_agents(agent_api_url: str = AGENT_API_URL):
-    async with httpx.AsyncClient(base_url=agent_api_url) as client:
-        response = await client.get("/agents")
+    response = await upstream(agent_api_url).get("/agents")
     return response.json()
 
 @app.get("/simulators/{simulator_id}")
 async def get_simulator(simulator_id: str, simulator_api_url: str = SIMULATOR_API_URL):
-    async with httpx.AsyncClient(base_url=simulator_api_url) as client:
-        response = await client.get(f"/simulators/{simulator_id}")
+    response = await upstream(simulator_api_url).get(f"/simulators/{simulator_id}")
     return response.json()
 
 @app.get("/agents/{agent_id}")
 async def get_agent(agent_id: str, agent_api_url: str = AGENT_API_URL):
-    async with httpx.AsyncClient(base_url=agent_api_url) as client:
-        response = await client.get(f"/agents/{agent_id}")
+    response = await upstream(agent_api_url).get(f"/agents/{agent_id}")
     return response.json()
 
+@app.get("/agents/{agent_id}/profile")
+async def get_agent_profile(agent_id: str, format: str = "json", agent_api_url: str = AGENT_API_URL):
+    response = await upstream(agent_api_url).get(f"/agents/{agent_id}/profile", params={"format": format})
+    if response.headers.get("content-type", "").startswith("text/plain"):
+        return PlainTextResponse(response.text)
+    return response.json()
+
+async def proxy_event_stream(base_url: str, path: str, params: dict = None) -> StreamingResponse:
+    """Relay a Server-Sent Events stream of an upstream as it comes; the stream holds one pooled connection."""
+    client = upstream(base_url)
+    # no read timeout: the upstream sends keep-alive comments while there are no events
+    request = client.build_request("GET", path, params=params,
+                                   timeout=httpx.Timeout(UPSTREAM_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT, read=None))
+    response = await client.send(request, stream=True)
+    if response.status_code != 200:
+        await response.aread()
+        await response.aclose()
+        raise HTTPException(status_code=response.status_code, detail=response.json().get("detail"))
+
+    async def relay():
+        try:
+            async for chunk in response.aiter_raw():
+                yield chunk
+        finally:
+            await response.aclose()
+    return StreamingResponse(relay(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/agents/{agent_id}/events")
+async def agent_events(agent_id: str, agent_api_url: str = AGENT_API_URL):
+    return await proxy_event_stream(agent_api_url, f"/agents/{agent_id}/events")
+
+@app.get("/events")
+async def agent_server_events(agent_id: Optional[List[str]] = Query(None), agent_api_url: str = AGENT_API_URL):
+    return await proxy_event_stream(agent_api_url, "/events", {"agent_id": agent_id} if agent_id else None)
+
 @app.delete("/simulators/{simulator_id}")
 async def delete_simulator(simulator_id: str, simulator_api_url: str = SIMULATOR_API_URL):
-    async with httpx.AsyncClient(base_url=simulator_api_url) as client:
-        response = await client.delete(f"/simulators/{simulator_id}")
+    response = await upstream(simulator_api_url).delete(f"/simulators/{simulator_id}")
     return response.json()
 
 @app.delete("/agents/{agent_id}")
 async def delete_agent(agent_id: str, agent_api_url: str = AGENT_API_URL):
-    async with httpx.AsyncClient(base_url=agent_api_url) as client:
-        response = await client.delete(f"/agents/{agent_id}")
+    response = await upstream(agent_api_url).delete(f"/agents/{agent_id}")
+    return response.json()
+
+class VectorSimulatorConfig(BaseModel):
+    environment: str                        # name of the environment
+    num_envs: int = 4                       # number of sub-envs stepped together
+    asynchronous: bool = False              # run each sub-env in its own process
+    config: Optional[Dict[str, Any]] = None # optional config parameters
+
+@app.post("/vector_simulators")
+async def create_vector_simulator(simulator_config: VectorSimulatorConfig, simulator_api_url: str = SIMULATOR_API_URL):
+    response = await upstream(simulator_api_url).post("/vector_simulators", json=simulator_config.model_dump())
+    return response.json()
+
+@app.get("/vector_simulators")
+async def list_vector_simulators(simulator_api_url: str = SIMULATOR_API_URL):
+    response = await upstream(simulator_api_url).get("/vector_simulators")
+    return response.json()
+
+@app.get("/vector_simulators/{simulator_id}")
+async def get_vector_simulator(simulator_id: str, simulator_api_url: str = SIMULATOR_API_URL):
+    response = await upstream(simulator_api_url).get(f"/vector_simulators/{simulator_id}")
+    return response.json()
+
+@app.delete("/vector_simulators/{simulator_id}")
+async def delete_vector_simulator(simulator_id: str, simulator_api_url: str = SIMULATOR_API_URL):
+    response = await upstream(simulator_api_url).delete(f"/vector_simulators/{simulator_id}")
+    return response.json()
+
+# bounds of the simulator-server's seed sets
+MAX_SEED = 2**31 - 1
+MAX_SEED_SET_SIZE = 10000
+
+class SeedSetConfig(BaseModel):
+    name: str
+    seeds: Optional[List[Annotated[int, Field(ge=0, le=MAX_SEED)]]] = None
+    count: Optional[int] = Field(None, ge=1, le=MAX_SEED_SET_SIZE)
+    base_seed: Optional[int] = Field(0, ge=0)
+    config: Optional[Dict[str, Any]] = None
+
+@app.post("/seed_sets")
+async def create_seed_set(seed_set_config: SeedSetConfig, simulator_api_url: str = SIMULATOR_API_URL):
+    response = await upstream(simulator_api_url).post("/seed_sets", json=seed_set_config.model_dump())
+    return response.json()
+
+@app.get("/seed_sets")
+async def list_seed_sets(simulator_api_url: str = SIMULATOR_API_URL):
+    response = await upstream(simulator_api_url).get("/seed_sets")
+    return response.json()
+
+@app.get("/seed_sets/{name}")
+async def get_seed_set(name: str, simulator_api_url: str = SIMULATOR_API_URL):
+    response = await upstream(simulator_api_url).get(f"/seed_sets/{name}")
+    return response.json()
+
+@app.delete("/seed_sets/{name}")
+async def delete_seed_set(name: str, simulator_api_url: str = SIMULATOR_API_URL):
+    response = await upstream(simulator_api_url).delete(f"/seed_sets/{name}")
     return response.json()
 
 class TrainRequest(BaseModel):
@@ -75,12 +286,38 @@ class TrainRequest(BaseModel):
     api_url: Optional[str] = SIMULATOR_API_URL
     total_timesteps: Optional[int] = 20000
     filename: Optional[str] = None
+    action_repeat: Optional[int] = 1
+    vectorized: Optional[bool] = False
+    wire_format: Optional[str] = "json"
+    transport: Optional[str] = "http"
+    actor_learner: Optional[bool] = False
+    actors: Optional[int] = 1
+    simulator_ids: Optional[List[str]] = None
+    replay_ratio: Optional[float] = 0.25
+    checkpoint_interval_steps: Optional[int] = None
+    checkpoint_interval_seconds: Optional[float] = None
+    keep_checkpoints: Optional[int] = None
+    resume_from: Optional[str] = None
+    profile: Optional[bool] = False
+    priority: Optional[int] = 0
 
 @app.post("/services/train")
 async def train_agent(request: TrainRequest):
     # send the request to the agent server
-    async with httpx.AsyncClient(base_url=AGENT_API_URL) as client:
-        response = await client.post(f"/agents/{request.agent_id}/train", json=request.model_dump())
+    response = await upstream(AGENT_API_URL).post(f"/agents/{request.agent_id}/train", json=request.model_dump())
+    return response.json()
+
+class ExperienceBatch(BaseModel):
+    observations: List[List[float]]
+    actions: List[int]
+    rewards: List[float]
+    next_observations: List[List[float]]
+    terminated: List[bool]
+    truncated: Optional[List[bool]] = None
+
+@app.post("/agents/{agent_id}/experience")
+async def add_experience(agent_id: str, batch: ExperienceBatch, agent_api_url: str = AGENT_API_URL):
+    response = await upstream(agent_api_url).post(f"/agents/{agent_id}/experience", json=batch.model_dump())
     return response.json()
 
 class PredictRequest(BaseModel):
@@ -90,14 +327,223 @@ class PredictRequest(BaseModel):
     api_url: Optional[str] = SIMULATOR_API_URL
     eval_episodes: Optional[int] = 10
     save_filename: Optional[str] = None
+    action_repeat: Optional[int] = 1
+    vectorized: Optional[bool] = False
+    wire_format: Optional[str] = "json"
+    transport: Optional[str] = "http"
+    parallelism: Optional[int] = 1
+    simulator_ids: Optional[List[str]] = None
+    seed: Optional[int] = None
+    seed_set: Optional[str] = None
+    profile: Optional[bool] = False
+    priority: Optional[int] = 0
 
 @app.post("/services/predict")
 async def predict_agent(request: PredictRequest):
     # send the request to the agent server
-    async with httpx.AsyncClient(base_url=AGENT_API_URL) as client:
-        response = await client.post(f"/agents/{request.agent_id}/predict", json=request.model_dump())
+    response = await upstream(AGENT_API_URL).post(f"/agents/{request.agent_id}/predict", json=request.model_dump())
     return response.json()
 
+# global variables to hold the sweep jobs (job id -> job) and their background tasks
+sweep_jobs = {}
+sweep_tasks = {}
+Gauge("orchestrator_sweeps_running", "Sweeps still running").set_function(lambda: len(sweep_tasks))
+
+# upper bound on the number of agent-simulator pairs in one sweep
+MAX_SWEEP_RUNS = 256
+
+class SweepRequest(BaseModel):
+    simulator_environment: str = "LunarLander-v3"
+    simulator_configs: List[Dict[str, Any]]  # one agent-simulator pair is created and trained per config
+    api_url: Optional[str] = SIMULATOR_API_URL
+    total_timesteps: Optional[int] = 20000
+    filename_prefix: Optional[str] = None    # the model of run i is saved as {filename_prefix}_{i}, default sweep-{job_id}
+    eval_episodes: Optional[int] = 0         # evaluate each trained agent on its simulator, 0 skips evaluation
+    eval_seed_set: Optional[str] = None      # evaluate every run on the episodes of this seed set instead
+    action_repeat: Optional[int] = 1
+    wire_format: Optional[str] = "json"
+    transport: Optional[str] = "http"
+    priority: Optional[int] = 0              # priority of the train/predict jobs on the agent-server
+    max_parallel: Optional[int] = 4          # runs in flight at the same time
+    poll_interval: Optional[float] = 2.0     # seconds between agent status checks
+    keep_resources: Optional[bool] = False   # keep the simulator and agent of each run, deleted once it ends by default
+
+
+def sweep_summary(job: dict) -> dict:
+    counts = {}
+    for run in job["runs"]:
+        counts[run["status"]] = counts.get(run["status"], 0) + 1
+    return {**job, "counts": counts}
+
+
+async def wait_until_idle(agent_id: str, poll_interval: float) -> dict:
+    while True:
+        response = await upstream(AGENT_API_URL).get(f"/agents/{agent_id}")
+        response.raise_for_status()
+        agent = response.json()
+        if agent["status"] == "idle":
+            return agent
+        await asyncio.sleep(poll_interval)
+
+
+async def release_run(request: SweepRequest, run: dict):
+    """Delete the agent and simulator of a sweep run; the trained model stays in its file."""
+    resources = []
+    if run["agent_id"] is not None:
+        resources.append((AGENT_API_URL, f"/agents/{run['agent_id']}"))
+    if run["simulator_id"] is not None:
+        resources.append((request.api_url, f"/simulators/{run['simulator_id']}"))
+    released = True
+    for base_url, path in resources:
+        try:
+            response = await upstream(base_url).delete(path)
+            # 404: already gone, e.g. reaped as idle; 400: the agent is still busy
+            released = released and response.status_code in (200, 404)
+        except httpx.HTTPError:
+            released = False
+    run["released"] = released
+
+
+async def train_sweep_entry(request: SweepRequest, run: dict):
+    """One sweep run: its simulator and agent, training and the optional evaluation."""
+    run["status"] = "creating"
+    response = await upstream(request.api_url).post(
+        "/simulators", json={"environment": request.simulator_environment, "config": run["config"]})
+    response.raise_for_status()
+    run["simulator_id"] = response.json()["simulator_id"]
+
+    response = await upstream(AGENT_API_URL).post("/agents")
+    response.raise_for_status()
+    run["agent_id"] = response.json()["agent_id"]
+
+    run["status"] = "training"
+    train_request = TrainRequest(
+        agent_id=run["agent_id"],
+        simulator_id=run["simulator_id"],
+        simulator_environment=request.simulator_environment,
+        api_url=request.api_url,
+        total_timesteps=request.total_timesteps,
+        filename=run["filename"],
+        action_repeat=request.action_repeat,
+        wire_format=request.wire_format,
+        transport=request.transport,
+        priority=request.priority
+    )
+    response = await upstream(AGENT_API_URL).post(f"/agents/{run['agent_id']}/train", json=train_request.model_dump())
+    response.raise_for_status()
+    agent = await wait_until_idle(run["agent_id"], request.poll_interval)
+    run["result_message"], run["error_message"] = agent["result_message"], agent["error_message"]
+    if agent["error_message"]:
+        run["status"] = "failed"
+        return
+
+    if request.eval_episodes or request.eval_seed_set:
+        run["status"] = "evaluating"
+        predict_request = PredictRequest(
+            agent_id=run["agent_id"],
+            simulator_id=run["simulator_id"],
+            simulator_environment=request.simulator_environment,
+            api_url=request.api_url,
+            eval_episodes=request.eval_episodes,
+            seed_set=request.eval_seed_set,
+            action_repeat=request.action_repeat,
+            wire_format=request.wire_format,
+            transport=request.transport,
+            priority=request.priority
+        )
+        response = await upstream(AGENT_API_URL).post(f"/agents/{run['agent_id']}/predict", json=predict_request.model_dump())
+        response.raise_for_status()
+        agent = await wait_until_idle(run["agent_id"], request.poll_interval)
+        run["eval_message"], run["error_message"] = agent["result_message"], agent["error_message"]
+        if agent["error_message"]:
+            run["status"] = "failed"
+            return
+
+    run["status"] = "done"
+
+
+async def run_sweep_entry(request: SweepRequest, run: dict, semaphore: asyncio.Semaphore):
+    """
+    Create a simulator and an agent for one config, train the agent and optionally evaluate it.
+    The run's simulator and agent are deleted when it ends, unless the sweep keeps its resources.
+    """
+    try:
+        async with semaphore:
+            try:
+                await train_sweep_entry(request, run)
+            finally:
+                if not request.keep_resources:
+                    await release_run(request, run)
+    except asyncio.CancelledError:
+        run["status"] = "cancelled"
+        raise
+    except httpx.HTTPStatusError as e:
+        run["status"] = "failed"
+        run["error_message"] = f"{e.request.method} {e.request.url.path} returned {e.response.status_code}: {e.response.text}"
+    except Exception as e:
+        # connection errors and anything unexpected fail this run only, not the whole sweep
+        run["status"] = "failed"
+        run["error_message"] = f"{type(e).__name__}: {e}"
+
+
+async def run_sweep(job: dict, request: SweepRequest):
+    semaphore = asyncio.Semaphore(request.max_parallel)
+    status = "cancelled"  # unless gather returns or raises
+    try:
+        await asyncio.gather(*(run_sweep_entry(request, run, semaphore) for run in job["runs"]))
+        status = "finished"
+    except Exception as e:
+        status = "failed"
+        job["error_message"] = f"{type(e).__name__}: {e}"
+    finally:
+        job["status"] = status
+        del sweep_tasks[job["job_id"]]
+
+
+@app.post("/services/sweep")
+async def start_sweep(request: SweepRequest):
+    if not 0 < len(request.simulator_configs) <= MAX_SWEEP_RUNS:
+        raise HTTPException(status_code=400, detail=f"Number of simulator configs must be between 1 and {MAX_SWEEP_RUNS}")
+    if request.max_parallel < 1:
+        raise HTTPException(status_code=400, detail="max_parallel must be >= 1")
+    if request.api_url is None or request.api_url.startswith("local://"):
+        # the runs create their simulators over HTTP
+        raise HTTPException(status_code=400, detail="A sweep needs the URL of a simulator-server as api_url, not local://")
+
+    job_id = str(uuid.uuid4())
+    # distinct model files per run, the agent-server default name only has a one-second timestamp
+    filename_prefix = request.filename_prefix or f"sweep-{job_id}"
+    job = {
+        "job_id": job_id,
+        "status": "running",
+        "error_message": None,
+        "runs": [
+            {"index": i, "config": config, "status": "pending", "filename": f"{filename_prefix}_{i}",
+             "simulator_id": None, "agent_id": None, "released": False,
+             "result_message": None, "eval_message": None, "error_message": None}
+            for i, config in enumerate(request.simulator_configs)
+        ]
+    }
+    sweep_jobs[job_id] = job
+    sweep_tasks[job_id] = asyncio.create_task(run_sweep(job, request))
+    return {"message": "Sweep started", "job_id": job_id, "runs": len(job["runs"])}
+
+@app.get("/services/sweep")
+async def list_sweeps():
+    return {"jobs": [{"job_id": job["job_id"], "status": job["status"]} for job in sweep_jobs.values()]}
+
+@app.get("/services/sweep/{job_id}")
+async def get_sweep(job_id: str):
+    job = sweep_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Sweep job not found")
+    return sweep_summary(job)
+
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
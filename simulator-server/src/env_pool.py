@@ -0,0 +1,147 @@
+import collections
+import os
+import threading
+
+from gymnasium.utils import seeding
+
+from simulator import LunarLanderSimulator
+
+# warm simulators kept ready per config in use, built in the background; 0 disables the warm pool
+SIMULATOR_WARM_ENVS = int(os.getenv("SIMULATOR_WARM_ENVS", "4"))
+# configs the warm pool keeps simulators for, the least recently created from are dropped first
+SIMULATOR_WARM_CONFIGS = int(os.getenv("SIMULATOR_WARM_CONFIGS", "8"))
+# closed simulator envs kept per process for reuse; 0 disables the reuse
+SIMULATOR_ENV_POOL_SIZE = int(os.getenv("SIMULATOR_ENV_POOL_SIZE", "16"))
+
+# simulator config keys that change the env, in the order of LunarLanderSimulator's arguments
+CONFIG_KEYS = ("continuous", "gravity", "enable_wind", "wind_power", "turbulence_power")
+
+# config of a simulator created without one, warmed from the start
+DEFAULT_CONFIG = {"continuous": False, "gravity": -10.0, "enable_wind": False, "wind_power": 15.0, "turbulence_power": 1.5}
+
+
+class EnvPool:
+    """
+    Simulators built ahead of the create requests of one process, keyed by their config tuple.
+
+    Building a simulator costs gym.make plus the first reset, which generates the Box2D
+    terrain. A background thread keeps `warm` ready (already reset) simulators for each of the
+    `max_configs` configs created from most recently, so a create only takes one from the pool.
+    The envs of deleted simulators (at most `max_idle`) are kept as well and rebuilt into
+    ready simulators before new envs are made. On a miss the simulator is built inline.
+    """
+    def __init__(self, warm: int = SIMULATOR_WARM_ENVS, max_configs: int = SIMULATOR_WARM_CONFIGS,
+                 max_idle: int = SIMULATOR_ENV_POOL_SIZE):
+        self.warm = warm
+        self.max_configs = max_configs
+        self.max_idle = max_idle
+        self.ready = collections.OrderedDict()     # config tuple -> ready simulators, most recently used last
+        self.idle = collections.defaultdict(list)  # config tuple -> envs of deleted simulators
+        self.idle_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        if warm > 0 and max_configs > 0:
+            self.ready[self.key(DEFAULT_CONFIG)] = []
+            self._thread = threading.Thread(target=self._refill, name="env-pool", daemon=True)
+            self._thread.start()
+            self._wake.set()
+
+    @staticmethod
+    def key(config: dict) -> tuple:
+        return tuple(config[name] for name in CONFIG_KEYS)
+
+    def acquire(self, config: dict) -> LunarLanderSimulator:
+        """A simulator with this config: a ready one if the pool has one, built now otherwise."""
+        key = self.key(config)
+        simulator = None
+        env = None
+        with self.lock:
+            if self._thread is not None:
+                self._track(key)
+                if self.ready[key]:
+                    simulator = self.ready[key].pop()
+                self._wake.set()
+            if simulator is not None:
+                self.hits += 1
+                return simulator
+            self.misses += 1
+            if self.idle.get(key):
+                env = self.idle[key].pop()
+                self.idle_size -= 1
+        return LunarLanderSimulator(**config, env=env)
+
+    def release(self, config: dict, env):
+        """Keep the env of a deleted simulator, or close it if the pool is full."""
+        # fresh entropy, so a simulator backed by a reused env doesn't continue the previous user's seeded rng
+        env.unwrapped.np_random, _ = seeding.np_random()
+        with self.lock:
+            if self.idle_size < self.max_idle:
+                self.idle[self.key(config)].append(env)
+                self.idle_size += 1
+                self._wake.set()
+                return
+        env.close()
+
+    def _track(self, key: tuple):
+        # called with the lock held: key becomes the most recently used config
+        if key in self.ready:
+            self.ready.move_to_end(key)
+            return
+        self.ready[key] = []
+        while len(self.ready) > self.max_configs:
+            _, simulators = self.ready.popitem(last=False)
+            for simulator in simulators:
+                simulator.close()
+
+    def _missing(self):
+        """Config of a tracked config that is short of ready simulators, with an idle env for it if any."""
+        with self.lock:
+            for key in reversed(self.ready):
+                if len(self.ready[key]) < self.warm:
+                    env = None
+                    if self.idle.get(key):
+                        env = self.idle[key].pop()
+                        self.idle_size -= 1
+                    return key, env
+        return None, None
+
+    def _refill(self):
+        while not self._stop.is_set():
+            key, env = self._missing()
+            if key is None:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            # built outside the lock, creates keep being served meanwhile
+            simulator = LunarLanderSimulator(*key, env=env)
+            with self.lock:
+                if key in self.ready and len(self.ready[key]) < self.warm:
+                    self.ready[key].append(simulator)
+                    simulator = None
+            if simulator is not None:
+                simulator.close()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "ready": sum(len(simulators) for simulators in self.ready.values()), "idle": self.idle_size}
+
+    def close(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+        with self.lock:
+            for simulators in self.ready.values():
+                for simulator in simulators:
+                    simulator.close()
+            for envs in self.idle.values():
+                for env in envs:
+                    env.close()
+            self.ready.clear()
+            self.idle.clear()
+            self.idle_size = 0
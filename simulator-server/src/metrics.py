@@ -0,0 +1,53 @@
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+from starlette.responses import Response
+
+# Prometheus metrics common to the services, exposed on GET /metrics.
+#
+# Requests are labelled with their route template (e.g. /simulators/{simulator_id}/step),
+# not the raw path, so the number of time series stays bounded however many ids exist.
+#
+# This module is kept identical in simulator-server, agent-server and orchestrator-server.
+
+# latency buckets in seconds, from a local step round trip up to a long training request
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Latency of the HTTP requests served, by route",
+                            ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+
+
+class RouteMetricsMiddleware:
+    """
+    ASGI middleware that times every HTTP request. A plain ASGI middleware rather than
+    BaseHTTPMiddleware, which would add a task and a memory stream to every request.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500  # if the app raises before responding
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # the router stores the matched route in the scope
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(scope["method"], getattr(route, "path", "unmatched"), str(status)).observe(
+                time.perf_counter() - start)
+
+
+def metrics_response() -> Response:
+    """Current values of every registered metric in the Prometheus text format."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,217 @@
+import threading
+import time
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Shared-memory ring buffer for exchanging actions and transitions between processes on one host.
+#
+# Layout of the segment:
+#   header   int64[4]: request seq (written by the client), response seq (written by the server),
+#            capacity, closed flag (set by the server when the simulator goes away)
+#   slots    capacity * SLOT_DTYPE, slot (seq - 1) % capacity belongs to request number seq
+#
+# The client fills the slots of its requests and then publishes them by bumping the request seq;
+# the server answers in order, writing the transition into the same slot and bumping the response
+# seq. The sequence counters are the doorbell: both sides poll them with a short spin followed by
+# an exponential sleep backoff, so an idle channel costs almost no CPU.
+#
+# This module is kept identical in simulator-server and agent-server.
+
+OBS_DIM = 8
+
+OP_RESET = 0
+OP_STEP = 1
+
+FLAG_BATCH_END = 1      # last action of a batch; a batch stops early when its episode ends
+STATUS_OK = 0
+STATUS_SKIPPED = 1      # step not run because the episode ended earlier in the batch
+
+SLOT_DTYPE = np.dtype([
+    ("op", "<i4"),
+    ("action", "<i4"),
+    ("seed", "<i8"),     # reset seed, -1 for none
+    ("flags", "<i4"),
+    ("status", "<i4"),
+    ("state", "<f4", (OBS_DIM,)),
+    ("reward", "<f8"),
+    ("terminated", "u1"),
+    ("truncated", "u1"),
+    ("_pad", "u1", (6,)),
+])
+
+_REQUEST_SEQ, _RESPONSE_SEQ, _CAPACITY, _CLOSED = range(4)
+_HEADER_BYTES = 4 * 8
+
+
+class Backoff:
+    """Spin briefly, then sleep with exponentially growing intervals up to max_sleep."""
+    def __init__(self, spin: float = 50e-6, max_sleep: float = 1e-3):
+        self.spin = spin
+        self.max_sleep = max_sleep
+        self.reset()
+
+    def reset(self):
+        self.started = None
+        self.sleep = 1e-6
+
+    def wait(self):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now
+        if now - self.started < self.spin:
+            return
+        time.sleep(self.sleep)
+        self.sleep = min(self.sleep * 2, self.max_sleep)
+
+
+class ShmRing:
+    """Numpy views over the header and slots of a ring segment."""
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self.shm = shm
+        self.name = shm.name
+        self.header = np.ndarray((4,), dtype="<i8", buffer=shm.buf)
+        self.capacity = int(self.header[_CAPACITY])
+        self.slots = np.ndarray((self.capacity,), dtype=SLOT_DTYPE, buffer=shm.buf, offset=_HEADER_BYTES)
+
+    @classmethod
+    def create(cls, capacity: int):
+        shm = shared_memory.SharedMemory(name=f"rlops_{uuid.uuid4().hex[:16]}", create=True,
+                                         size=_HEADER_BYTES + capacity * SLOT_DTYPE.itemsize)
+        np.ndarray((4,), dtype="<i8", buffer=shm.buf)[:] = (0, 0, capacity, 0)
+        return cls(shm)
+
+    @classmethod
+    def attach(cls, name: str):
+        # the segment belongs to the server; keep this process' resource tracker from unlinking it at exit
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm)
+
+    def close(self):
+        # drop the numpy views before closing, the buffer cannot be released while they exist
+        self.header = None
+        self.slots = None
+        self.shm.close()
+
+
+class ShmRingServer:
+    """Serves a simulator over a ring segment from a background thread."""
+    def __init__(self, simulator, capacity: int = 64):
+        self.simulator = simulator
+        self.ring = ShmRing.create(capacity)
+        self.name = self.ring.name
+        self.steps = 0   # served over the ring, for the simulator-server metrics
+        self.resets = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name=f"shm-ring-{self.name}", daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        ring = self.ring
+        processed = 0
+        skipping = False
+        backoff = Backoff()
+        while not self._stop.is_set():
+            requested = int(ring.header[_REQUEST_SEQ])
+            if requested == processed:
+                backoff.wait()
+                continue
+            backoff.reset()
+
+            for seq in range(processed + 1, requested + 1):
+                slot = ring.slots[(seq - 1) % ring.capacity]
+                if slot["op"] == OP_RESET:
+                    seed = int(slot["seed"])
+                    state, _ = self.simulator.reset(seed if seed >= 0 else None)
+                    slot["state"] = state
+                    slot["reward"] = 0.0
+                    slot["terminated"] = slot["truncated"] = 0
+                    slot["status"] = STATUS_OK
+                    skipping = False
+                    self.resets += 1
+                elif skipping:
+                    slot["status"] = STATUS_SKIPPED
+                else:
+                    state, reward, terminated, truncated, _ = self.simulator.step(int(slot["action"]))
+                    slot["state"] = state
+                    slot["reward"] = reward
+                    slot["terminated"] = terminated
+                    slot["truncated"] = truncated
+                    slot["status"] = STATUS_OK
+                    skipping = bool(terminated or truncated)
+                    self.steps += 1
+
+                if slot["flags"] & FLAG_BATCH_END:
+                    skipping = False
+                ring.header[_RESPONSE_SEQ] = seq
+            processed = requested
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.ring.header[_CLOSED] = 1
+        shm = self.ring.shm
+        self.ring.close()
+        shm.unlink()
+
+
+class ShmRingClient:
+    """Client side of a ring segment: submits actions and waits for their transitions."""
+    def __init__(self, name: str, timeout: float = 30.0):
+        self.ring = ShmRing.attach(name)
+        self.timeout = timeout
+        self._seq = int(self.ring.header[_REQUEST_SEQ])
+
+    def _submit(self, requests) -> range:
+        ring = self.ring
+        first = self._seq + 1
+        for i, (op, action, seed, flags) in enumerate(requests):
+            slot = ring.slots[(first + i - 1) % ring.capacity]
+            slot["op"] = op
+            slot["action"] = action
+            slot["seed"] = seed
+            slot["flags"] = flags
+        self._seq += len(requests)
+        # publishing the new request seq rings the doorbell
+        ring.header[_REQUEST_SEQ] = self._seq
+        return range(first, self._seq + 1)
+
+    def _wait(self, seq: int):
+        ring = self.ring
+        backoff = Backoff()
+        deadline = time.monotonic() + self.timeout
+        while ring.header[_RESPONSE_SEQ] < seq:
+            if ring.header[_CLOSED]:
+                raise RuntimeError("Shared-memory channel was closed by the simulator server")
+            if time.monotonic() > deadline:
+                raise TimeoutError("No response on the shared-memory channel")
+            backoff.wait()
+
+    def reset(self, seed: int = None):
+        seq = self._submit([(OP_RESET, 0, -1 if seed is None else seed, FLAG_BATCH_END)])[-1]
+        self._wait(seq)
+        return self.ring.slots[(seq - 1) % self.ring.capacity]["state"].copy()
+
+    def step_many(self, actions):
+        """Run actions in order (in batches of at most `capacity`); returns the slots of the steps that ran."""
+        results = []
+        capacity = self.ring.capacity
+        for start in range(0, len(actions), capacity):
+            batch = actions[start:start + capacity]
+            seqs = self._submit([(OP_STEP, int(a), -1, FLAG_BATCH_END if i == len(batch) - 1 else 0)
+                                 for i, a in enumerate(batch)])
+            self._wait(seqs[-1])
+            slots = self.ring.slots[[(seq - 1) % capacity for seq in seqs]]
+            slots = slots[slots["status"] == STATUS_OK]  # fancy indexing copies out of the ring
+            results.append(slots)
+            if len(slots) < len(batch) or slots["terminated"][-1] or slots["truncated"][-1]:
+                break
+        return np.concatenate(results)
+
+    def close(self):
+        self.ring.close()
@@ -1,11 +1,50 @@
 import gymnasium as gym
+from gymnasium.utils import seeding
+from gymnasium.wrappers import TimeLimit
 import uuid
 import numpy as np # Import numpy
 
+
+def serialize_info(value):
+    """Convert an env info dict (numpy arrays and scalars included) to plain JSON-compatible values."""
+    if isinstance(value, dict):
+        return {str(key): serialize_info(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [serialize_info(item) for item in value]
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    return value
+
+def _body_state(body) -> dict:
+    return {
+        "position": tuple(body.position),
+        "angle": body.angle,
+        "linear_velocity": tuple(body.linearVelocity),
+        "angular_velocity": body.angularVelocity,
+        "awake": body.awake
+    }
+
+def _set_body_state(body, state: dict):
+    body.position = state["position"]
+    body.angle = state["angle"]
+    body.linearVelocity = state["linear_velocity"]
+    body.angularVelocity = state["angular_velocity"]
+    body.awake = state["awake"]
+
+def _generator(bit_generator_state: dict) -> np.random.Generator:
+    generator = np.random.Generator(np.random.PCG64())
+    generator.bit_generator.state = bit_generator_state
+    return generator
+
+def make_env(continuous: bool, gravity: float, enable_wind: bool, wind_power: float, turbulence_power: float):
+    return gym.make("LunarLander-v3", continuous=continuous, gravity=gravity,
+                    enable_wind=enable_wind, wind_power=wind_power, turbulence_power=turbulence_power)
+
 class LunarLanderSimulator:
-    def __init__(self, continuous: bool, gravity: float, enable_wind: bool, wind_power: float, turbulence_power: float):
-        self.env = gym.make("LunarLander-v3", continuous=continuous, gravity=gravity,
-                            enable_wind=enable_wind, wind_power=wind_power, turbulence_power=turbulence_power)
+    def __init__(self, continuous: bool, gravity: float, enable_wind: bool, wind_power: float, turbulence_power: float,
+                 env=None):
+        # env: an env built by make_env with the same config, e.g. from an EnvPool; a new one is made otherwise
+        self.env = env if env is not None else make_env(continuous, gravity, enable_wind, wind_power, turbulence_power)
         
         self.id = str(uuid.uuid4()) 
         self.env_name = "LunarLander-v3" 
@@ -24,12 +63,20 @@ class LunarLanderSimulator:
         self.enable_wind = enable_wind
         self.wind_power = wind_power
         self.turbulence_power = turbulence_power
+
+        # rng state right before the last reset, the terrain is rebuilt from it on restore
+        self.reset_rng_state = None
         
         # Initialize state by resetting once
         self.reset()
 
-    def reset(self):
+    def reset(self, seed: int = None):
         self.step_count = 0
+        lander = self.env.unwrapped
+        if seed is not None:
+            # same generator env.reset(seed=seed) would create, set here so its state can be kept
+            lander.np_random, _ = seeding.np_random(seed)
+        self.reset_rng_state = lander.np_random.bit_generator.state
         self.state, self.info = self.env.reset()
         return self.state, self.info
 
@@ -38,6 +85,100 @@ class LunarLanderSimulator:
         self.state, self.reward, self.terminated, self.truncated, self.info = self.env.step(action)
         return self.state, self.reward, self.terminated, self.truncated, self.info
 
+    def step_many(self, actions):
+        # apply the actions in order, stopping early once the episode ends
+        states, rewards, terminated, truncated, infos = [], [], [], [], []
+        for action in actions:
+            state, reward, term, trunc, info = self.step(action)
+            states.append(state)
+            rewards.append(reward)
+            terminated.append(term)
+            truncated.append(trunc)
+            infos.append(info)
+            if term or trunc:
+                break
+        return (np.array(states, dtype=np.float32).reshape(len(states), -1),
+                np.array(rewards, dtype=np.float64),
+                np.array(terminated, dtype=bool),
+                np.array(truncated, dtype=bool),
+                infos)
+
+    def config(self) -> dict:
+        return {
+            "continuous": self.continuous,
+            "gravity": self.gravity,
+            "enable_wind": self.enable_wind,
+            "wind_power": self.wind_power,
+            "turbulence_power": self.turbulence_power
+        }
+
+    def _time_limit(self) -> TimeLimit:
+        env = self.env
+        while not isinstance(env, TimeLimit):
+            env = env.env
+        return env
+
+    def snapshot(self) -> dict:
+        """
+        Capture the full simulation state as a picklable dict: the rng state the terrain was
+        built from, the lander and leg bodies, contact flags, wind indices, the current rng
+        state and the step counters.
+        """
+        lander = self.env.unwrapped
+        return {
+            "environment": self.env_name,
+            "config": self.config(),
+            "reset_rng_state": self.reset_rng_state,
+            "rng_state": lander.np_random.bit_generator.state,
+            "bodies": [_body_state(body) for body in [lander.lander] + lander.legs],
+            "ground_contact": [leg.ground_contact for leg in lander.legs],
+            "game_over": lander.game_over,
+            "prev_shaping": lander.prev_shaping,
+            "wind_idx": getattr(lander, "wind_idx", None),
+            "torque_idx": getattr(lander, "torque_idx", None),
+            "elapsed_steps": self._time_limit()._elapsed_steps,
+            "step_count": self.step_count,
+            "state": self.state.copy(),
+            "reward": self.reward,
+            "terminated": self.terminated,
+            "truncated": self.truncated
+        }
+
+    def restore(self, snapshot: dict):
+        """
+        Put the simulator into the state of a snapshot taken from a simulator with the same config.
+        Box2D can't copy a world, so the terrain is rebuilt by resetting from the recorded rng
+        state and the bodies are moved into place. The solver's warm-start impulses are not
+        restored, so later steps match the original run up to float rounding.
+        """
+        if snapshot["config"] != self.config():
+            raise ValueError("Snapshot was taken from a simulator with a different config")
+
+        lander = self.env.unwrapped
+        lander.np_random = _generator(snapshot["reset_rng_state"])
+        self.env.reset()
+
+        for body, state in zip([lander.lander] + lander.legs, snapshot["bodies"]):
+            _set_body_state(body, state)
+        for leg, ground_contact in zip(lander.legs, snapshot["ground_contact"]):
+            leg.ground_contact = ground_contact
+        lander.game_over = snapshot["game_over"]
+        lander.prev_shaping = snapshot["prev_shaping"]
+        if snapshot["wind_idx"] is not None:
+            lander.wind_idx = snapshot["wind_idx"]
+            lander.torque_idx = snapshot["torque_idx"]
+        lander.np_random = _generator(snapshot["rng_state"])
+        self._time_limit()._elapsed_steps = snapshot["elapsed_steps"]
+
+        self.reset_rng_state = snapshot["reset_rng_state"]
+        self.step_count = snapshot["step_count"]
+        self.state = snapshot["state"].copy()
+        self.reward = snapshot["reward"]
+        self.terminated = snapshot["terminated"]
+        self.truncated = snapshot["truncated"]
+        self.info = {}
+        return self.state, self.info
+
     def close(self):
         self.env.close()
 
@@ -46,7 +187,7 @@ class LunarLanderSimulator:
         if isinstance(self.state, np.ndarray):
             serializable_state = self.state.tolist()
             
-        serializable_info = {}
+        serializable_info = serialize_info(self.info)
 
         return {
             "id": self.id,
@@ -57,11 +198,5 @@ class LunarLanderSimulator:
             "truncated": self.truncated,
             "step_count": self.step_count,
             "info": serializable_info,
-            "config": {
-                "continuous": self.continuous,
-                "gravity": self.gravity,
-                "enable_wind": self.enable_wind,
-                "wind_power": self.wind_power,
-                "turbulence_power": self.turbulence_power
-            }
+            "config": self.config()
         }
\ No newline at end of file
@@ -0,0 +1,204 @@
+import collections
+import time
+from typing import Optional
+
+import numpy as np
+
+from env_pool import EnvPool
+from simulator import serialize_info
+from shm_ring import ShmRingServer
+from vector_simulator import LunarLanderVectorSimulator
+
+# kinds of simulators a registry can hold
+SIMULATOR = "simulator"
+VECTOR_SIMULATOR = "vector_simulator"
+
+
+class SimulatorRegistry:
+    """
+    Owns the simulators and vector simulators of one process.
+
+    Every public method is an operation of the simulator API and only takes/returns
+    picklable values, so the same registry runs in the API process or inside a worker
+    process (see worker_pool.py). Unknown ids raise KeyError, invalid input ValueError.
+    """
+    def __init__(self):
+        self.simulators = {}
+        self.vector_simulators = {}
+        self.shm_channels = {}  # simulator id -> ShmRingServer, for simulators created with transport "shm"
+        # env steps/resets served so far, by kind; shm channels count their own until they are closed
+        self.counts = collections.Counter()
+        self.env_pool = EnvPool()
+        self.last_access = {}    # simulator id -> time.monotonic() of the last call on it
+        self.channel_steps = {}  # simulator id -> steps+resets of its shm channel when last checked for activity
+
+    def create_simulator(self, config_dict: dict) -> str:
+        config = {
+            "continuous": config_dict.get("continuous", False),
+            "gravity": config_dict.get("gravity", -10.0),
+            "enable_wind": config_dict.get("enable_wind", False),
+            "wind_power": config_dict.get("wind_power", 15.0),
+            "turbulence_power": config_dict.get("turbulence_power", 1.5)
+        }
+        simulator = self.env_pool.acquire(config)
+        self.simulators[simulator.id] = simulator
+        self.last_access[simulator.id] = time.monotonic()
+        if config_dict.get("transport") == "shm":
+            self.shm_channels[simulator.id] = ShmRingServer(simulator, config_dict.get("shm_capacity", 64))
+        return simulator.id
+
+    def create_vector_simulator(self, num_envs: int, asynchronous: bool, config_dict: dict) -> str:
+        simulator = LunarLanderVectorSimulator(
+            num_envs,
+            asynchronous,
+            config_dict.get("continuous", False),
+            config_dict.get("gravity", -10.0),
+            config_dict.get("enable_wind", False),
+            config_dict.get("wind_power", 15.0),
+            config_dict.get("turbulence_power", 1.5)
+        )
+        self.vector_simulators[simulator.id] = simulator
+        self.last_access[simulator.id] = time.monotonic()
+        return simulator.id
+
+    def _get(self, simulator_id: str, kind: str = SIMULATOR):
+        simulators = self.simulators if kind == SIMULATOR else self.vector_simulators
+        simulator = simulators[simulator_id]
+        self.last_access[simulator_id] = time.monotonic()
+        return simulator
+
+    def to_json(self, simulator_id: str, kind: str = SIMULATOR) -> dict:
+        data = self._get(simulator_id, kind).to_json()
+        channel = self.shm_channels.get(simulator_id)
+        if channel is not None:
+            data["config"]["transport"] = "shm"
+            data["shm_name"] = channel.name
+        return data
+
+    def delete(self, simulator_id: str, kind: str = SIMULATOR):
+        simulators = self.simulators if kind == SIMULATOR else self.vector_simulators
+        simulator = simulators.pop(simulator_id)
+        del self.last_access[simulator_id]
+        self.channel_steps.pop(simulator_id, None)
+        channel = self.shm_channels.pop(simulator_id, None)
+        if channel is not None:
+            channel.close()
+            self._count_channel(channel)
+        if kind == SIMULATOR:
+            # the Box2D world is rebuilt on the next reset, so the env can back another simulator
+            self.env_pool.release(simulator.config(), simulator.env)
+        else:
+            simulator.close()
+
+    def idle(self, ttl: float) -> list:
+        """[simulator id, kind] of the simulators not accessed for more than ttl seconds."""
+        now = time.monotonic()
+        # shm clients step without calling the registry, the channel counters show they are still active
+        for simulator_id, channel in self.shm_channels.items():
+            served = channel.steps + channel.resets
+            if self.channel_steps.get(simulator_id) != served:
+                self.channel_steps[simulator_id] = served
+                self.last_access[simulator_id] = now
+        return [[simulator_id, SIMULATOR if simulator_id in self.simulators else VECTOR_SIMULATOR]
+                for simulator_id, last_access in self.last_access.items() if now - last_access > ttl]
+
+    def reset(self, simulator_id: str, seed: Optional[int] = None) -> dict:
+        state, info = self._get(simulator_id).reset(seed)
+        self.counts[SIMULATOR, "resets"] += 1
+        return {
+            "state": state,
+            "info": serialize_info(info)
+        }
+
+    def step(self, simulator_id: str, action: int) -> dict:
+        state, reward, terminated, truncated, info = self._get(simulator_id).step(action)
+        self.counts[SIMULATOR, "steps"] += 1
+        return {
+            "state": state,
+            "reward": reward,
+            "terminated": terminated,
+            "truncated": truncated,
+            "info": serialize_info(info)
+        }
+
+    def step_many(self, simulator_id: str, actions) -> dict:
+        # the rollout stops early when the episode ends, so fewer transitions than actions may come back
+        states, rewards, terminated, truncated, infos = self._get(simulator_id).step_many(actions)
+        self.counts[SIMULATOR, "steps"] += len(rewards)
+        return {
+            "steps": len(rewards),
+            "states": states,
+            "rewards": rewards,
+            "terminated": terminated,
+            "truncated": truncated,
+            "infos": serialize_info(infos)
+        }
+
+    def reset_many(self, simulator_id: str, seeds) -> dict:
+        # the initial state of every seed, e.g. to record the start states of a seed set
+        simulator = self._get(simulator_id)
+        self.counts[SIMULATOR, "resets"] += len(seeds)
+        return {"states": np.array([simulator.reset(int(seed))[0] for seed in seeds], dtype=np.float32)}
+
+    def snapshot(self, simulator_id: str) -> dict:
+        return self._get(simulator_id).snapshot()
+
+    def restore(self, simulator_id: str, snapshot: dict) -> dict:
+        state, info = self._get(simulator_id).restore(snapshot)
+        return {
+            "state": state,
+            "info": serialize_info(info)
+        }
+
+    def vector_reset(self, simulator_id: str, seeds=None) -> dict:
+        simulator = self._get(simulator_id, VECTOR_SIMULATOR)
+        if seeds is not None and len(seeds) != simulator.num_envs:
+            raise ValueError(f"Expected {simulator.num_envs} seeds, got {len(seeds)}")
+        self.counts[VECTOR_SIMULATOR, "resets"] += simulator.num_envs
+        return {"states": simulator.reset(seeds)}
+
+    def vector_step(self, simulator_id: str, actions) -> dict:
+        simulator = self._get(simulator_id, VECTOR_SIMULATOR)
+        if len(actions) != simulator.num_envs:
+            raise ValueError(f"Expected {simulator.num_envs} actions, got {len(actions)}")
+
+        states, rewards, terminated, truncated, final_states = simulator.step(actions)
+        self.counts[VECTOR_SIMULATOR, "steps"] += simulator.num_envs
+        return {
+            "states": states,
+            "rewards": rewards,
+            "terminated": terminated,
+            "truncated": truncated,
+            "final_states": [s.tolist() if s is not None else None for s in final_states]
+        }
+
+    def _count_channel(self, channel):
+        self.counts[SIMULATOR, "steps"] += channel.steps
+        self.counts[SIMULATOR, "resets"] += channel.resets
+
+    def env_counts(self) -> dict:
+        """Env steps and resets served so far: {kind: {"steps": n, "resets": n}}, over every transport."""
+        counts = self.counts.copy()
+        for channel in self.shm_channels.values():
+            counts[SIMULATOR, "steps"] += channel.steps
+            counts[SIMULATOR, "resets"] += channel.resets
+        return {kind: {"steps": counts[kind, "steps"], "resets": counts[kind, "resets"]}
+                for kind in (SIMULATOR, VECTOR_SIMULATOR)}
+
+    def pool_stats(self) -> dict:
+        return self.env_pool.stats()
+
+    def stats(self) -> dict:
+        return {"simulators": len(self.simulators), "vector_simulators": len(self.vector_simulators),
+                "env_counts": self.env_counts(), "env_pool": self.pool_stats()}
+
+    def close(self):
+        for channel in self.shm_channels.values():
+            channel.close()
+            self._count_channel(channel)
+        self.shm_channels.clear()
+        for simulators in (self.simulators, self.vector_simulators):
+            for simulator in simulators.values():
+                simulator.close()
+            simulators.clear()
+        self.env_pool.close()
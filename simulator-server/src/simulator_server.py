@@ -1,19 +1,194 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
 import uvicorn
-from typing import Dict, Any, Optional
-from pydantic import BaseModel
+from typing import Annotated, Dict, Any, List, Optional
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+import asyncio
+import collections
+import os
+import time
+import uuid
 
-from simulator import LunarLanderSimulator
+import numpy as np
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from metrics import LATENCY_BUCKETS, RouteMetricsMiddleware, metrics_response
+from simulator_registry import SIMULATOR, VECTOR_SIMULATOR
+from tracing import TracingMiddleware, record_phase
+from worker_pool import create_backend
+import wire
+
+# number of worker processes the simulators are sharded across; 0 keeps them in the API process
+SIMULATOR_WORKERS = int(os.getenv("SIMULATOR_WORKERS", "0"))
+
+# snapshots kept in memory; beyond this the oldest ones are dropped
+SIMULATOR_MAX_SNAPSHOTS = int(os.getenv("SIMULATOR_MAX_SNAPSHOTS", "10000"))
+
+# simulators (single and vector) alive at once; creates beyond this are rejected with 429, 0 disables the limit
+SIMULATOR_MAX_SIMULATORS = int(os.getenv("SIMULATOR_MAX_SIMULATORS", "1024"))
+
+# simulators not accessed for this many seconds are deleted; 0 disables the reaper
+SIMULATOR_IDLE_TTL = float(os.getenv("SIMULATOR_IDLE_TTL", "3600"))
+SIMULATOR_REAP_INTERVAL = float(os.getenv("SIMULATOR_REAP_INTERVAL", "60"))  # seconds between two idle checks
+
+# global backend that owns the simulator envs (see worker_pool.py)
+backend = None
+
+# global snapshot store: snapshot id -> simulator state (see LunarLanderSimulator.snapshot).
+# Kept in the API process, so a snapshot can be restored into a simulator on any worker.
+snapshots = collections.OrderedDict()
+
+# global named evaluation seed sets: name -> {"name", "seeds", "config", "start_states"}
+seed_sets = {}
+
+# simulators being created right now, counted against SIMULATOR_MAX_SIMULATORS (see admit)
+creating = 0
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global backend
+    backend = create_backend(SIMULATOR_WORKERS)
+    await backend.start()
+    reaper = asyncio.create_task(reap_idle()) if SIMULATOR_IDLE_TTL > 0 else None
+    yield
+    if reaper is not None:
+        reaper.cancel()
+    backend.close()
 
 # Server to manage simulator envs
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RouteMetricsMiddleware)
+
+
+# metrics of the simulator server, on top of the per-route latencies of metrics.py
+SIMULATOR_CALL_LATENCY = Histogram("simulator_call_duration_seconds",
+                                   "Time of the simulator operations (env work plus the hop to the worker process)",
+                                   ["method"], buckets=LATENCY_BUCKETS)
+LIVE_SIMULATORS = Gauge("simulator_live", "Simulators currently alive", ["kind"])
+LIVE_SIMULATORS.labels(SIMULATOR).set_function(lambda: len(backend.list(SIMULATOR)) if backend else 0)
+LIVE_SIMULATORS.labels(VECTOR_SIMULATOR).set_function(lambda: len(backend.list(VECTOR_SIMULATOR)) if backend else 0)
+Gauge("simulator_snapshots", "Snapshots kept in memory").set_function(lambda: len(snapshots))
+SIMULATOR_CREATE_LATENCY = Histogram("simulator_create_duration_seconds", "Time to create a simulator",
+                                     ["kind"], buckets=LATENCY_BUCKETS)
+SIMULATORS_REAPED = Counter("simulator_reaped", "Simulators deleted after SIMULATOR_IDLE_TTL without access", ["kind"])
+SIMULATORS_REJECTED = Counter("simulator_rejected", "Creates rejected because SIMULATOR_MAX_SIMULATORS were alive")
+
+# env steps/resets and env pool counters as counted by the registries, refreshed on every scrape (see /metrics)
+env_counts = {}
+pool_stats = {}
+
+class EnvCountCollector:
+    """Exposes env_counts and pool_stats; counted where the envs live, so shm channels and workers are included."""
+    def collect(self):
+        steps = CounterMetricFamily("simulator_env_steps", "Env steps served, over every transport", labels=["kind"])
+        resets = CounterMetricFamily("simulator_env_resets", "Env resets served, over every transport", labels=["kind"])
+        for kind, counts in env_counts.items():
+            steps.add_metric([kind], counts["steps"])
+            resets.add_metric([kind], counts["resets"])
+        yield steps
+        yield resets
+        yield CounterMetricFamily("simulator_env_pool_hits", "Simulators taken ready from the warm pools",
+                                  value=pool_stats.get("hits", 0))
+        yield CounterMetricFamily("simulator_env_pool_misses", "Simulators built on the request path",
+                                  value=pool_stats.get("misses", 0))
+        size = GaugeMetricFamily("simulator_env_pool_size", "Simulators ready in the warm pools and idle envs kept for reuse",
+                                 labels=["state"])
+        size.add_metric(["ready"], pool_stats.get("ready", 0))
+        size.add_metric(["idle"], pool_stats.get("idle", 0))
+        yield size
+
+REGISTRY.register(EnvCountCollector())
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the simulator API!"}
 
-# global variables to hold the current simulator env and state
-simulator_list = {}
+# upper bound on the number of steps a single multi-step request may run
+MAX_STEPS_PER_REQUEST = 10000
+
+# upper bound on the number of sub-envs in one vector simulator
+MAX_VECTOR_ENVS = 64
+
+# upper bound on the number of simulators forked from a snapshot in one request
+MAX_CLONES_PER_REQUEST = 256
+
+# upper bound on the number of seeds in a seed set
+MAX_SEED_SET_SIZE = 10000
+
+
+def encode_response(request: Request, payload: dict):
+    """
+    Encode a step/reset payload: JSON by default, or the compact binary frame (see wire.py)
+    when the client sends `Accept: application/x-rlops-frame`. The JSON is rendered here too,
+    so the "encode" phase of a traced request covers all of it.
+    """
+    start = time.perf_counter()
+    if wire.accepts_frame(request.headers.get("accept")):
+        response = Response(content=wire.encode_frame(payload), media_type=wire.MEDIA_TYPE)
+    else:
+        response = JSONResponse({key: value.tolist() if hasattr(value, "tolist") else value for key, value in payload.items()})
+    record_phase("encode", start)
+    return response
+
+
+async def timed_call(simulator_id: str, method: str, *args):
+    start = time.perf_counter()
+    try:
+        return await backend.call(simulator_id, method, *args)
+    finally:
+        SIMULATOR_CALL_LATENCY.labels(method).observe(time.perf_counter() - start)
+        record_phase("env", start)
+
+
+@asynccontextmanager
+async def admit(count: int = 1):
+    """Reserve room for count new simulators under SIMULATOR_MAX_SIMULATORS, 429 if there is none."""
+    global creating
+    if SIMULATOR_MAX_SIMULATORS > 0 and len(backend.kinds) + creating + count > SIMULATOR_MAX_SIMULATORS:
+        SIMULATORS_REJECTED.inc()
+        raise HTTPException(status_code=429, detail=f"Simulator limit reached ({SIMULATOR_MAX_SIMULATORS} simulators)")
+    creating += count
+    try:
+        yield
+    finally:
+        creating -= count
+
+
+async def timed_create(kind: str, *args) -> str:
+    start = time.perf_counter()
+    simulator_id = await backend.create(kind, *args)
+    SIMULATOR_CREATE_LATENCY.labels(kind).observe(time.perf_counter() - start)
+    record_phase("create", start)
+    return simulator_id
+
+
+async def reap_idle():
+    """Delete the simulators nobody accessed for SIMULATOR_IDLE_TTL seconds, e.g. those of crashed agents."""
+    while True:
+        await asyncio.sleep(min(SIMULATOR_REAP_INTERVAL, SIMULATOR_IDLE_TTL))
+        try:
+            for simulator_id, kind in await backend.idle(SIMULATOR_IDLE_TTL):
+                try:
+                    await backend.delete(simulator_id, kind)
+                except KeyError:
+                    continue  # deleted in the meantime
+                SIMULATORS_REAPED.labels(kind).inc()
+                print(f"Reaped idle {kind} {simulator_id}")
+        except Exception as e:
+            print(f"Reaping idle simulators failed: {e}")
+
+
+async def call_simulator(simulator_id: str, method: str, *args, not_found: str = "Simulator not found"):
+    """Run a registry operation on the simulator, mapping unknown ids to 404 and bad input to 400."""
+    try:
+        return await timed_call(simulator_id, method, *args)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=not_found)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 class SimulatorConfig(BaseModel):
@@ -22,79 +197,316 @@ class SimulatorConfig(BaseModel):
 
 @app.post("/simulators")
 async def create_simulator(config: SimulatorConfig):
-    global simulator_list
-
     if config.environment == "LunarLander-v3":   
         config_dict = config.config if config.config is not None else {}
-        simulator = LunarLanderSimulator(
-            config_dict.get("continuous", False), 
-            config_dict.get("gravity", -10.0),
-            config_dict.get("enable_wind", False), 
-            config_dict.get("wind_power", 15.0),
-            config_dict.get("turbulence_power", 1.5)
-        )
-        simulator_list[simulator.id] = simulator
-        return {"message": "Created simulator", "simulator_id": simulator.id}
+        async with admit():
+            simulator_id = await timed_create(SIMULATOR, config_dict)
+        return {"message": "Created simulator", "simulator_id": simulator_id}
     else:
         raise HTTPException(status_code=400, detail="Invalid environment")
 
 
 @app.get("/simulators")
 async def list_simulators():
-    return {"simulators": list(simulator_list.keys())}
+    return {"simulators": backend.list(SIMULATOR)}
 
 
 @app.get("/simulators/{simulator_id}")
 async def get_simulator(simulator_id: str):
-    simulator = simulator_list.get(simulator_id)
-    if simulator:
-        return simulator.to_json()
-    else:
-        raise HTTPException(status_code=404, detail="Simulator not found")
+    return await call_simulator(simulator_id, "to_json")
 
 
 @app.delete("/simulators/{simulator_id}")
 async def delete_simulator(simulator_id: str):
-    global simulator_list
-    simulator = simulator_list.get(simulator_id)
-    if simulator:
-        simulator.close()
-        del simulator_list[simulator_id]
-        return {"message": f"Deleted simulator {simulator_id}"}
-    else:
+    try:
+        await backend.delete(simulator_id, SIMULATOR)
+    except KeyError:
         raise HTTPException(status_code=404, detail="Simulator not found")
+    return {"message": f"Deleted simulator {simulator_id}"}
 
 
+class ResetRequest(BaseModel):
+    seed: Optional[int] = Field(None, ge=0, le=wire.MAX_SEED) # reseed the environment before resetting
+
 @app.post("/simulators/{simulator_id}/reset")
-async def reset_simulator(simulator_id: str):
-    simulator = simulator_list.get(simulator_id)
-    if simulator:
-        state, info = simulator.reset()
-        return {
-            "state": state.tolist(),
-            "info": info
-        }
-    else:
-        raise HTTPException(status_code=404, detail="Simulator not found")
+async def reset_simulator(simulator_id: str, request: Request, reset_request: Optional[ResetRequest] = None):
+    seed = reset_request.seed if reset_request is not None else None
+    return encode_response(request, await call_simulator(simulator_id, "reset", seed))
 
 
 class StepAction(BaseModel):
     action: int
 
 @app.post("/simulators/{simulator_id}/step")
-async def step_simulator(simulator_id: str, step_action: StepAction):
-    simulator = simulator_list.get(simulator_id)
-    if simulator:
-        state, reward, terminated, truncated, info = simulator.step(step_action.action)
-        return {
-            "state": state.tolist(),
-            "reward": reward,
-            "terminated": terminated,
-            "truncated": truncated,
-            "info": info
-        }
+async def step_simulator(simulator_id: str, step_action: StepAction, request: Request):
+    return encode_response(request, await call_simulator(simulator_id, "step", step_action.action))
+
+
+class MultiStepAction(BaseModel):
+    actions: Optional[List[int]] = None # actions applied in order, one per step
+    action: Optional[int] = None        # or a single action repeated `repeat` times (frame skip)
+    repeat: int = Field(1, ge=1)
+
+@app.post("/simulators/{simulator_id}/steps")
+async def multi_step_simulator(simulator_id: str, step_actions: MultiStepAction, request: Request):
+    if step_actions.actions is not None:
+        actions = step_actions.actions
+    elif step_actions.action is not None:
+        actions = [step_actions.action] * step_actions.repeat
     else:
-        raise HTTPException(status_code=404, detail="Simulator not found")
+        raise HTTPException(status_code=400, detail="Either 'actions' or 'action' must be provided")
+
+    if len(actions) == 0 or len(actions) > MAX_STEPS_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"Number of steps must be between 1 and {MAX_STEPS_PER_REQUEST}")
+
+    return encode_response(request, await call_simulator(simulator_id, "step_many", actions))
+
+
+def snapshot_summary(snapshot_id: str, snapshot: dict) -> dict:
+    return {
+        "snapshot_id": snapshot_id,
+        "environment": snapshot["environment"],
+        "config": snapshot["config"],
+        "step_count": snapshot["step_count"],
+        "state": snapshot["state"].tolist(),
+        "terminated": snapshot["terminated"],
+        "truncated": snapshot["truncated"]
+    }
+
+def get_snapshot(snapshot_id: str) -> dict:
+    snapshot = snapshots.get(snapshot_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return snapshot
+
+@app.post("/simulators/{simulator_id}/snapshot")
+async def snapshot_simulator(simulator_id: str):
+    snapshot = await call_simulator(simulator_id, "snapshot")
+    snapshot_id = str(uuid.uuid4())
+    snapshots[snapshot_id] = snapshot
+    while len(snapshots) > SIMULATOR_MAX_SNAPSHOTS:
+        snapshots.popitem(last=False)
+    return snapshot_summary(snapshot_id, snapshot)
+
+
+class RestoreRequest(BaseModel):
+    snapshot_id: str
+
+@app.post("/simulators/{simulator_id}/restore")
+async def restore_simulator(simulator_id: str, restore_request: RestoreRequest, request: Request):
+    snapshot = get_snapshot(restore_request.snapshot_id)
+    return encode_response(request, await call_simulator(simulator_id, "restore", snapshot))
+
+
+@app.get("/snapshots")
+async def list_snapshots():
+    return {"snapshots": list(snapshots.keys())}
+
+@app.get("/snapshots/{snapshot_id}")
+async def get_snapshot_info(snapshot_id: str):
+    return snapshot_summary(snapshot_id, get_snapshot(snapshot_id))
+
+@app.delete("/snapshots/{snapshot_id}")
+async def delete_snapshot(snapshot_id: str):
+    get_snapshot(snapshot_id)
+    del snapshots[snapshot_id]
+    return {"message": f"Deleted snapshot {snapshot_id}"}
+
+
+class CloneRequest(BaseModel):
+    count: int = 1                          # number of simulators to fork from the snapshot
+    config: Optional[Dict[str, Any]] = None # extra creation options of the clones, e.g. {"transport": "shm"}
+
+@app.post("/snapshots/{snapshot_id}/clone")
+async def clone_snapshot(snapshot_id: str, clone_request: CloneRequest):
+    snapshot = get_snapshot(snapshot_id)
+    if clone_request.count < 1 or clone_request.count > MAX_CLONES_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {MAX_CLONES_PER_REQUEST}")
+
+    config_dict = {**(clone_request.config or {}), **snapshot["config"]}
+
+    async def clone():
+        simulator_id = await timed_create(SIMULATOR, config_dict)
+        await backend.call(simulator_id, "restore", snapshot)
+        return simulator_id
+
+    # with worker processes the clones are created on several workers at once
+    async with admit(clone_request.count):
+        simulator_ids = await asyncio.gather(*(clone() for _ in range(clone_request.count)))
+    return {"message": "Created simulators", "simulator_ids": simulator_ids}
+
+
+class SeedSetRequest(BaseModel):
+    name: str
+    seeds: Optional[List[Annotated[int, Field(ge=0, le=wire.MAX_SEED)]]] = None # explicit seeds, or
+    count: Optional[int] = Field(None, ge=1, le=MAX_SEED_SET_SIZE) # number of seeds derived from base_seed
+    base_seed: Optional[int] = Field(0, ge=0)
+    config: Optional[Dict[str, Any]] = None # simulator config to record the start state of every seed for
+
+@app.post("/seed_sets")
+async def create_seed_set(seed_set_request: SeedSetRequest):
+    if seed_set_request.name in seed_sets:
+        raise HTTPException(status_code=409, detail=f"Seed set {seed_set_request.name} already exists")
+
+    if seed_set_request.seeds is not None:
+        seeds = seed_set_request.seeds
+    elif seed_set_request.count is not None:
+        # a fixed function of (base_seed, count), so a set can be recreated anywhere
+        seeds = (np.random.SeedSequence(seed_set_request.base_seed).generate_state(seed_set_request.count)
+                 & wire.MAX_SEED).tolist()
+    else:
+        raise HTTPException(status_code=400, detail="Either 'seeds' or 'count' must be provided")
+    if len(seeds) == 0 or len(seeds) > MAX_SEED_SET_SIZE:
+        raise HTTPException(status_code=400, detail=f"Number of seeds must be between 1 and {MAX_SEED_SET_SIZE}")
+
+    start_states = None
+    if seed_set_request.config is not None:
+        async with admit():
+            simulator_id = await timed_create(SIMULATOR, seed_set_request.config)
+        try:
+            start_states = (await backend.call(simulator_id, "reset_many", seeds))["states"].tolist()
+        finally:
+            await backend.delete(simulator_id, SIMULATOR)
+
+    seed_sets[seed_set_request.name] = {
+        "name": seed_set_request.name,
+        "seeds": seeds,
+        "config": seed_set_request.config,
+        "start_states": start_states
+    }
+    return {"message": "Created seed set", "name": seed_set_request.name, "size": len(seeds)}
+
+@app.get("/seed_sets")
+async def list_seed_sets():
+    return {"seed_sets": [{"name": name, "size": len(seed_set["seeds"])} for name, seed_set in seed_sets.items()]}
+
+@app.get("/seed_sets/{name}")
+async def get_seed_set(name: str):
+    seed_set = seed_sets.get(name)
+    if seed_set is None:
+        raise HTTPException(status_code=404, detail="Seed set not found")
+    return seed_set
+
+@app.delete("/seed_sets/{name}")
+async def delete_seed_set(name: str):
+    if seed_sets.pop(name, None) is None:
+        raise HTTPException(status_code=404, detail="Seed set not found")
+    return {"message": f"Deleted seed set {name}"}
+
+
+@app.websocket("/simulators/{simulator_id}/ws")
+async def simulator_channel(websocket: WebSocket, simulator_id: str):
+    """
+    Long-lived step channel: every binary message is a command (see wire.pack_command),
+    every reply is a binary frame with the same payload as the matching HTTP endpoint.
+    """
+    if backend.kinds.get(simulator_id) != SIMULATOR:
+        await websocket.close(code=wire.WS_CLOSE_NOT_FOUND)
+        return
+
+    await websocket.accept()
+    try:
+        while True:
+            op, actions = wire.unpack_command(await websocket.receive_bytes())
+
+            if op == wire.OP_RESET:
+                # an optional single "action" carries the seed
+                method, args = "reset", (int(actions[0]) if len(actions) == 1 else None,)
+            elif op == wire.OP_STEP and len(actions) == 1:
+                method, args = "step", (int(actions[0]),)
+            elif op == wire.OP_STEPS and 0 < len(actions) <= MAX_STEPS_PER_REQUEST:
+                method, args = "step_many", (actions.tolist(),)
+            else:
+                await websocket.close(code=wire.WS_CLOSE_BAD_COMMAND)
+                return
+
+            try:
+                payload = await timed_call(simulator_id, method, *args)
+            except KeyError:
+                # the simulator was deleted while the channel was open
+                await websocket.close(code=wire.WS_CLOSE_NOT_FOUND)
+                return
+            await websocket.send_bytes(wire.encode_frame(payload))
+    except WebSocketDisconnect:
+        pass
+
+
+class VectorSimulatorConfig(BaseModel):
+    environment: str                        # name of the environment
+    num_envs: int = 4                       # number of sub-envs stepped together
+    asynchronous: bool = False              # run each sub-env in its own process
+    config: Optional[Dict[str, Any]] = None # optional config parameters, shared by all sub-envs
+
+@app.post("/vector_simulators")
+async def create_vector_simulator(config: VectorSimulatorConfig):
+    if config.environment != "LunarLander-v3":
+        raise HTTPException(status_code=400, detail="Invalid environment")
+    if config.num_envs < 1 or config.num_envs > MAX_VECTOR_ENVS:
+        raise HTTPException(status_code=400, detail=f"num_envs must be between 1 and {MAX_VECTOR_ENVS}")
+
+    config_dict = config.config if config.config is not None else {}
+    async with admit():
+        simulator_id = await timed_create(VECTOR_SIMULATOR, config.num_envs, config.asynchronous, config_dict)
+    return {"message": "Created vector simulator", "simulator_id": simulator_id, "num_envs": config.num_envs}
+
+
+@app.get("/vector_simulators")
+async def list_vector_simulators():
+    return {"simulators": backend.list(VECTOR_SIMULATOR)}
+
+
+@app.get("/vector_simulators/{simulator_id}")
+async def get_vector_simulator(simulator_id: str):
+    return await call_simulator(simulator_id, "to_json", VECTOR_SIMULATOR, not_found="Vector simulator not found")
+
+
+@app.delete("/vector_simulators/{simulator_id}")
+async def delete_vector_simulator(simulator_id: str):
+    try:
+        await backend.delete(simulator_id, VECTOR_SIMULATOR)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Vector simulator not found")
+    return {"message": f"Deleted vector simulator {simulator_id}"}
+
+
+class VectorResetRequest(BaseModel):
+    # one seed per sub-env (null leaves that sub-env unseeded)
+    seeds: Optional[List[Optional[Annotated[int, Field(ge=0, le=wire.MAX_SEED)]]]] = None
+
+@app.post("/vector_simulators/{simulator_id}/reset")
+async def reset_vector_simulator(simulator_id: str, request: Request, reset_request: Optional[VectorResetRequest] = None):
+    seeds = reset_request.seeds if reset_request is not None else None
+    payload = await call_simulator(simulator_id, "vector_reset", seeds, not_found="Vector simulator not found")
+    return encode_response(request, payload)
+
+
+class VectorStepAction(BaseModel):
+    actions: List[int] # one action per sub-env
+
+@app.post("/vector_simulators/{simulator_id}/step")
+async def step_vector_simulator(simulator_id: str, step_actions: VectorStepAction, request: Request):
+    payload = await call_simulator(simulator_id, "vector_step", step_actions.actions,
+                                   not_found="Vector simulator not found")
+    return encode_response(request, payload)
+
+
+@app.get("/workers")
+async def worker_stats():
+    return backend.stats()
+
+
+@app.get("/env_pool")
+async def env_pool_stats():
+    stats = await backend.pool_stats()
+    created = stats.get("hits", 0) + stats.get("misses", 0)
+    return {**stats, "hit_rate": stats.get("hits", 0) / created if created else 0.0}
+
+
+@app.get("/metrics")
+async def metrics():
+    global env_counts, pool_stats
+    env_counts, pool_stats = await asyncio.gather(backend.env_counts(), backend.pool_stats())
+    return metrics_response()
 
 
 @app.get("/health")
@@ -0,0 +1,85 @@
+import contextvars
+import time
+
+# Opt-in request tracing. A request that carries an X-Trace-Id header is traced: the id is
+# passed on to the upstream requests made while serving it, and the response gets the id
+# back plus a Server-Timing header (https://www.w3.org/TR/server-timing/) with the phases
+# the handler recorded through record_phase and the total time until the response started.
+# Requests without the header skip all of it.
+#
+# This module is kept identical in simulator-server, agent-server and orchestrator-server.
+
+TRACE_HEADER = "x-trace-id"
+SERVER_TIMING_HEADER = "server-timing"
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+_phases = contextvars.ContextVar("phases", default=None)
+
+
+def current_trace_id():
+    """Trace id of the request being served, None if it is not traced."""
+    return _trace_id.get()
+
+
+def trace_headers() -> dict:
+    """Headers that pass the current trace on to an upstream request."""
+    trace_id = _trace_id.get()
+    return {TRACE_HEADER: trace_id} if trace_id is not None else {}
+
+
+def record_phase(name: str, start: float):
+    """Add the time since start (a time.perf_counter() value) to a phase of the traced request."""
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+
+
+def format_server_timing(phases: dict) -> str:
+    # durations in milliseconds, as the header specifies
+    return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in phases.items())
+
+
+def parse_server_timing(header: str) -> dict:
+    """Phase name -> seconds from a Server-Timing header."""
+    phases = {}
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                phases[name] = float(value) / 1000
+    return phases
+
+
+class TracingMiddleware:
+    """ASGI middleware that sets up the trace of requests with an X-Trace-Id header."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace_id = next((value.decode("latin-1") for key, value in scope["headers"] if key == TRACE_HEADER.encode()), None)
+        if trace_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        phases = {}
+        trace_token = _trace_id.set(trace_id)
+        phases_token = _phases.set(phases)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timing = format_server_timing({**phases, "total": time.perf_counter() - start})
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (TRACE_HEADER.encode(), trace_id.encode("latin-1")),
+                                                  (SERVER_TIMING_HEADER.encode(), timing.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _trace_id.reset(trace_token)
+            _phases.reset(phases_token)
@@ -0,0 +1,88 @@
+import gymnasium as gym
+import uuid
+import numpy as np
+from functools import partial
+
+class LunarLanderVectorSimulator:
+    """
+    A group of LunarLander envs stepped together with one batched action array.
+
+    Sub-envs reset automatically in the same step their episode ends; the last
+    observation of the finished episode is kept in `final_states`.
+    """
+    def __init__(self, num_envs: int, asynchronous: bool, continuous: bool, gravity: float, enable_wind: bool,
+                 wind_power: float, turbulence_power: float):
+        make_env = partial(gym.make, "LunarLander-v3", continuous=continuous, gravity=gravity,
+                           enable_wind=enable_wind, wind_power=wind_power, turbulence_power=turbulence_power)
+        # AsyncVectorEnv runs every sub-env in its own process, SyncVectorEnv steps them in a loop
+        vector_env_class = gym.vector.AsyncVectorEnv if asynchronous else gym.vector.SyncVectorEnv
+        self.env = vector_env_class([make_env for _ in range(num_envs)],
+                                    autoreset_mode=gym.vector.AutoresetMode.SAME_STEP)
+
+        self.id = str(uuid.uuid4())
+        self.env_name = "LunarLander-v3"
+        self.num_envs = num_envs
+        self.asynchronous = asynchronous
+
+        # state variables
+        self.states = None
+        self.rewards = np.zeros(num_envs, dtype=np.float64)
+        self.terminated = np.zeros(num_envs, dtype=bool)
+        self.truncated = np.zeros(num_envs, dtype=bool)
+        self.step_count = 0
+        self.episode_count = 0
+
+        # Configuration parameters
+        self.continuous = continuous
+        self.gravity = gravity
+        self.enable_wind = enable_wind
+        self.wind_power = wind_power
+        self.turbulence_power = turbulence_power
+
+        # Initialize state by resetting once
+        self.reset()
+
+    def reset(self, seeds=None):
+        self.step_count = 0
+        self.states, _ = self.env.reset(seed=seeds)
+        return self.states
+
+    def step(self, actions):
+        self.step_count += 1
+        self.states, rewards, terminated, truncated, infos = self.env.step(np.asarray(actions))
+        self.rewards = rewards.astype(np.float64)
+        self.terminated = terminated
+        self.truncated = truncated
+
+        # terminal observations of the sub-envs that were reset in this step, None for the others
+        final_states = [None] * self.num_envs
+        if "final_obs" in infos:
+            for i in np.flatnonzero(infos["_final_obs"]):
+                final_states[i] = infos["final_obs"][i]
+        self.episode_count += int(np.count_nonzero(terminated | truncated))
+
+        return self.states, self.rewards, self.terminated, self.truncated, final_states
+
+    def close(self):
+        self.env.close()
+
+    def to_json(self):
+        return {
+            "id": self.id,
+            "environment": self.env_name,
+            "num_envs": self.num_envs,
+            "asynchronous": self.asynchronous,
+            "states": self.states.tolist() if isinstance(self.states, np.ndarray) else None,
+            "rewards": self.rewards.tolist(),
+            "terminated": self.terminated.tolist(),
+            "truncated": self.truncated.tolist(),
+            "step_count": self.step_count,
+            "episode_count": self.episode_count,
+            "config": {
+                "continuous": self.continuous,
+                "gravity": self.gravity,
+                "enable_wind": self.enable_wind,
+                "wind_power": self.wind_power,
+                "turbulence_power": self.turbulence_power
+            }
+        }
@@ -0,0 +1,113 @@
+import json
+import struct
+import numpy as np
+
+# Compact binary encoding of step/reset payloads, negotiated through the Accept header.
+#
+# Frame layout (little endian):
+#   header   4s magic | H number of arrays | I length of the JSON meta section
+#   arrays   B name length | name | 3s numpy dtype str (e.g. "<f4") | B ndim | I * ndim shape |
+#            zero padding to an 8 byte boundary | raw array bytes
+#   meta     UTF-8 JSON object with every field that is not numeric (e.g. info dicts)
+#
+# Commands on the WebSocket step channel are a <BI header (op, number of actions)
+# followed by the actions as little endian int32. A reset may carry its seed as the only action.
+#
+# This module is kept identical in simulator-server and agent-server.
+
+MEDIA_TYPE = "application/x-rlops-frame"
+# largest reset seed, the command frames carry it as int32
+MAX_SEED = 2**31 - 1
+MAGIC = b"RLF1"
+
+_HEADER = struct.Struct("<4sHI")
+_ALIGNMENT = 8
+
+OP_RESET = 0
+OP_STEP = 1
+OP_STEPS = 2
+
+_COMMAND = struct.Struct("<BI")
+
+# application close codes of the step channel
+WS_CLOSE_NOT_FOUND = 4404
+WS_CLOSE_BAD_COMMAND = 4400
+
+
+def accepts_frame(accept_header) -> bool:
+    return accept_header is not None and MEDIA_TYPE in accept_header
+
+
+def _as_array(value):
+    # numeric fields go into the binary section, everything else into the JSON meta section
+    if isinstance(value, np.ndarray) and value.dtype.kind in "biuf":
+        return np.ascontiguousarray(value)
+    if isinstance(value, (bool, int, float, np.bool_, np.integer, np.floating)):
+        return np.asarray(value)
+    return None
+
+
+def encode_frame(payload: dict) -> bytes:
+    arrays = []
+    meta = {}
+    for name, value in payload.items():
+        array = _as_array(value)
+        if array is None:
+            meta[name] = value
+        else:
+            arrays.append((name, array))
+    meta_bytes = json.dumps(meta).encode() if meta else b""
+
+    parts = [_HEADER.pack(MAGIC, len(arrays), len(meta_bytes))]
+    offset = _HEADER.size
+    for name, array in arrays:
+        name_bytes = name.encode()
+        dtype_str = array.dtype.str.encode()
+        descriptor = struct.pack(f"<B{len(name_bytes)}s3sB{array.ndim}I", len(name_bytes), name_bytes,
+                                 dtype_str, array.ndim, *array.shape)
+        offset += len(descriptor)
+        padding = -offset % _ALIGNMENT
+        offset += padding + array.nbytes
+        parts.extend((descriptor, b"\0" * padding, array.tobytes()))
+    parts.append(meta_bytes)
+    return b"".join(parts)
+
+
+def decode_frame(buffer) -> dict:
+    """Decode a frame; arrays are read-only views into `buffer` (no copy)."""
+    magic, n_arrays, meta_len = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a rlops frame")
+
+    payload = {}
+    offset = _HEADER.size
+    for _ in range(n_arrays):
+        name_len = buffer[offset]
+        offset += 1
+        name = bytes(buffer[offset:offset + name_len]).decode()
+        offset += name_len
+        dtype_str, ndim = struct.unpack_from("<3sB", buffer, offset)
+        offset += 4
+        shape = struct.unpack_from(f"<{ndim}I", buffer, offset)
+        offset += 4 * ndim
+        offset += -offset % _ALIGNMENT
+
+        dtype = np.dtype(dtype_str.decode())
+        count = int(np.prod(shape)) if ndim else 1
+        payload[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(shape)
+        offset += count * dtype.itemsize
+
+    if meta_len:
+        payload.update(json.loads(bytes(buffer[offset:offset + meta_len])))
+    return payload
+
+
+def pack_command(op: int, actions=()) -> bytes:
+    actions = np.asarray(actions, dtype="<i4")
+    return _COMMAND.pack(op, actions.size) + actions.tobytes()
+
+
+def unpack_command(message: bytes):
+    op, count = _COMMAND.unpack_from(message, 0)
+    actions = np.frombuffer(message, dtype="<i4", count=count, offset=_COMMAND.size)
+    return op, actions
@@ -0,0 +1,229 @@
+import asyncio
+import collections
+import multiprocessing
+import signal
+
+from simulator_registry import SimulatorRegistry
+
+# exceptions that keep their type when raised inside a worker; anything else becomes a RuntimeError
+_FORWARDED_ERRORS = {"KeyError": KeyError, "ValueError": ValueError}
+
+
+class LocalBackend:
+    """Runs every simulator inside the API process (SIMULATOR_WORKERS=0)."""
+    def __init__(self):
+        self.registry = SimulatorRegistry()
+        self.kinds = {}  # simulator id -> kind
+
+    async def start(self):
+        pass
+
+    async def create(self, kind: str, *args) -> str:
+        simulator_id = getattr(self.registry, f"create_{kind}")(*args)
+        self.kinds[simulator_id] = kind
+        return simulator_id
+
+    async def call(self, simulator_id: str, method: str, *args):
+        """Run SimulatorRegistry.<method>(simulator_id, *args)."""
+        return getattr(self.registry, method)(simulator_id, *args)
+
+    async def delete(self, simulator_id: str, kind: str):
+        self.registry.delete(simulator_id, kind)
+        del self.kinds[simulator_id]
+
+    def list(self, kind: str):
+        return [simulator_id for simulator_id, k in self.kinds.items() if k == kind]
+
+    async def env_counts(self) -> dict:
+        return self.registry.env_counts()
+
+    async def pool_stats(self) -> dict:
+        return self.registry.pool_stats()
+
+    async def idle(self, ttl: float) -> list:
+        return self.registry.idle(ttl)
+
+    def stats(self) -> dict:
+        return {"workers": 0, "simulators": len(self.kinds)}
+
+    def close(self):
+        self.registry.close()
+
+
+def _worker_main(conn):
+    """Entry point of a worker process: serve registry calls from the pipe until told to stop."""
+    # shutdown is driven by the API process, not by the terminal's Ctrl-C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    registry = SimulatorRegistry()
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                break
+            if request is None:
+                break
+
+            method, args = request
+            try:
+                conn.send((True, getattr(registry, method)(*args)))
+            except Exception as e:
+                conn.send((False, (type(e).__name__, str(e))))
+    finally:
+        registry.close()
+
+
+class _Worker:
+    """API-process handle of one worker: a pipe plus the futures of the requests in flight."""
+    def __init__(self, ctx, index: int):
+        self.index = index
+        self.conn, child_conn = ctx.Pipe()
+        # not a daemon: asynchronous vector simulators start processes of their own
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), name=f"simulator-worker-{index}")
+        self.process.start()
+        child_conn.close()
+
+        # the worker answers in order, so responses resolve the oldest pending future
+        self.pending = collections.deque()
+        self.num_simulators = 0
+        self.loop = None
+
+    def attach(self, loop):
+        self.loop = loop
+        loop.add_reader(self.conn.fileno(), self._on_readable)
+
+    def _on_readable(self):
+        try:
+            while self.conn.poll():
+                ok, result = self.conn.recv()
+                future = self.pending.popleft()
+                if future.cancelled():
+                    continue
+                if ok:
+                    future.set_result(result)
+                else:
+                    error_name, message = result
+                    future.set_exception(_FORWARDED_ERRORS.get(error_name, RuntimeError)(message))
+        except (EOFError, OSError):
+            self._fail(RuntimeError(f"Simulator worker {self.index} exited"))
+
+    def _fail(self, error: Exception):
+        self.loop.remove_reader(self.conn.fileno())
+        while self.pending:
+            future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    def request(self, method: str, args) -> asyncio.Future:
+        if not self.process.is_alive():
+            raise RuntimeError(f"Simulator worker {self.index} is not running")
+        future = self.loop.create_future()
+        self.pending.append(future)
+        self.conn.send((method, args))
+        return future
+
+    def close(self, timeout: float = 5.0):
+        if self.loop is not None and self.process.is_alive():
+            self.loop.remove_reader(self.conn.fileno())
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class ProcessPoolBackend:
+    """
+    Shards simulators across a pool of worker processes, each owning its envs.
+    Calls are forwarded to the owning worker over a pipe, so env.step runs outside the
+    event loop and simulators on different workers step in parallel.
+    """
+    def __init__(self, num_workers: int):
+        # spawn keeps the workers free of the API process' threads and sockets
+        ctx = multiprocessing.get_context("spawn")
+        self.workers = [_Worker(ctx, i) for i in range(num_workers)]
+        self.owners = {}  # simulator id -> worker
+        self.kinds = {}   # simulator id -> kind
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        for worker in self.workers:
+            worker.attach(loop)
+        # wait until every worker has imported gymnasium and answers, so the first requests don't time out
+        await asyncio.gather(*(worker.request("stats", ()) for worker in self.workers))
+
+    async def create(self, kind: str, *args) -> str:
+        # place the new simulator on the least loaded worker
+        worker = min(self.workers, key=lambda w: (w.num_simulators, len(w.pending)))
+        worker.num_simulators += 1
+        try:
+            simulator_id = await worker.request(f"create_{kind}", args)
+        except Exception:
+            worker.num_simulators -= 1
+            raise
+        self.owners[simulator_id] = worker
+        self.kinds[simulator_id] = kind
+        return simulator_id
+
+    async def call(self, simulator_id: str, method: str, *args):
+        """Run SimulatorRegistry.<method>(simulator_id, *args) on the owning worker."""
+        worker = self.owners[simulator_id]
+        return await worker.request(method, (simulator_id, *args))
+
+    async def delete(self, simulator_id: str, kind: str):
+        worker = self.owners[simulator_id]
+        await worker.request("delete", (simulator_id, kind))
+        del self.owners[simulator_id]
+        del self.kinds[simulator_id]
+        worker.num_simulators -= 1
+
+    def list(self, kind: str):
+        return [simulator_id for simulator_id, k in self.kinds.items() if k == kind]
+
+    async def _gather(self, method: str, *args) -> list:
+        """Results of a registry method on every worker that is still running, failed workers left out."""
+        workers = [w for w in self.workers if w.process.is_alive()]
+        results = await asyncio.gather(*(w.request(method, args) for w in workers), return_exceptions=True)
+        return [result for result in results if not isinstance(result, Exception)]
+
+    async def env_counts(self) -> dict:
+        """Env steps/resets summed over the workers."""
+        total = {}
+        for counts in await self._gather("env_counts"):
+            for kind, values in counts.items():
+                for key, value in values.items():
+                    total.setdefault(kind, {}).setdefault(key, 0)
+                    total[kind][key] += value
+        return total
+
+    async def pool_stats(self) -> dict:
+        """Env pool counters summed over the workers."""
+        total = collections.Counter()
+        for stats in await self._gather("pool_stats"):
+            total.update(stats)
+        return dict(total)
+
+    async def idle(self, ttl: float) -> list:
+        return [entry for idle in await self._gather("idle", ttl) for entry in idle]
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self.workers),
+            "simulators": len(self.kinds),
+            "per_worker": [
+                {"worker": w.index, "alive": w.process.is_alive(), "simulators": w.num_simulators,
+                 "pending_requests": len(w.pending)}
+                for w in self.workers
+            ]
+        }
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+
+def create_backend(num_workers: int):
+    return ProcessPoolBackend(num_workers) if num_workers > 0 else LocalBackend()